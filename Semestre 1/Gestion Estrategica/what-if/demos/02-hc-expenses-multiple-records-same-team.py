@@ -25,8 +25,10 @@ from what_if.brute_force_general import optimize
 # We read the data from the original source. Here, the data set is "tidy",
 # meaning that every combination of (Team Name, City) leads to a unique record.
 # Note that the parameters choice means that the optimization routine will
-# select *one city* to apply every records to. Having different parameters value
-# for each of the records in the policy is a planned improvement.
+# select *one city* to apply every records to. To let every record of the
+# policy pick its own city, pass `record_parameters=["City"]` with a separable
+# cost (`what_if.cost_functions.separable`) and move the capacity check to the
+# `feasible` argument of `optimize()`.
 my_df = (
     pd.read_csv("./data/sample_HC_data.csv")
 )
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""Test cases for the time-budgeted (anytime) optimization."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.anytime import Budget
+from what_if.anytime import cheapest_first
+from what_if.brute_force_general import enumerate_present_parameters
+from what_if.brute_force_general import optimize
+from what_if.cost_functions import separable
+
+
+@pytest.fixture
+def trips():
+  """The destination drives the price, the dates add some noise."""
+  rows = product(["NYC", "CHI", "SEA"], ["LAX", "MIA", "DEN", "BOS", "AUS"], range(8), range(8, 12))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from", "date_to"])
+  base = df["destination"].map({"LAX": 900, "MIA": 300, "DEN": 700, "BOS": 500, "AUS": 100})
+  noise = np.random.default_rng(3).uniform(0, 150, size=len(df)).round(2)
+  df["total_price"] = base + noise
+  return df
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 4}, {"origin": "CHI", "travelers": 2},
+          {"origin": "SEA", "travelers": 1}]
+
+
+PARAMETERS = ["destination", "date_from", "date_to"]
+COST = separable(lambda s: s["total_price"] * s["travelers"])
+
+
+def test_bounds_are_lower_bounds(trips, policy):
+  space = enumerate_present_parameters(trips, policy, PARAMETERS)
+
+  ordered, bounds = cheapest_first(trips, policy, space, COST)
+
+  assert sorted(ordered.indices) == list(space.indices)
+  assert list(bounds) == sorted(bounds)
+  for index, bound in zip(ordered.indices[::17], bounds[::17]):
+    scenario = space.scenario(int(index))
+    rows = trips.merge(pd.DataFrame([pol | scenario for pol in policy]))
+    assert bound <= (rows["total_price"] * rows["travelers"]).sum() + 1e-9
+
+
+def test_large_budget_is_proven_optimal_early(trips, policy):
+  expected = optimize(trips, PARAMETERS, policy, {}, COST, 3, engine="loop")
+
+  results, stats = optimize(trips, PARAMETERS, policy, {}, COST, 3, block_size=16,
+                            max_evaluations=10**6, return_stats=True)
+
+  assert [x for _, x in results] == pytest.approx([x for _, x in expected])
+  assert stats.proven_optimal and stats.remaining == 0
+  assert stats.evaluated < len(enumerate_present_parameters(trips, policy, PARAMETERS)) / 2
+
+
+@pytest.mark.parametrize("engine", ["loop", "vectorized"])
+@pytest.mark.parametrize("keep_ties", [False, True])
+def test_unbounded_budget_keeps_the_ties_of_a_full_run(trips, policy, engine, keep_ties):
+  """Visited cheapest first, the ties must still be those of enumeration order."""
+  # BOS on the 9th costs AUS on the 8th, with a lower bound: it is visited first.
+  trips["total_price"] = trips["destination"].map({"LAX": 5, "MIA": 3, "DEN": 4, "BOS": 1,
+                                                   "AUS": 2}) + trips["date_to"] - 8
+  expected = optimize(trips, PARAMETERS, policy, {}, COST, 12, engine=engine,
+                      keep_ties=keep_ties)
+
+  results, stats = optimize(trips, PARAMETERS, policy, {}, COST, 12, engine=engine,
+                            keep_ties=keep_ties, max_evaluations=10**6, return_stats=True)
+
+  assert stats.proven_optimal
+  assert [x for _, x in results] == [x for _, x in expected]
+  for (scenario, _), (expected_scenario, _) in zip(results, expected):
+    pd.testing.assert_frame_equal(scenario, expected_scenario)
+
+
+def test_small_budget_returns_the_best_found_so_far(trips, policy):
+  expected = optimize(trips, PARAMETERS, policy, {}, COST, 1, engine="loop")
+
+  results, stats = optimize(trips, PARAMETERS, policy, {}, COST, 1, engine="loop",
+                            max_evaluations=20, return_stats=True)
+
+  assert stats.evaluated == 20
+  assert not stats.proven_optimal
+  assert stats.remaining == 5 * 8 * 4 - 20
+  # The cheapest destination comes first.
+  assert results[0][0]["destination"].unique().tolist() == ["AUS"]
+  assert results[0][1] >= expected[0][1]
+
+
+def test_deadline_with_any_cost_function(trips, policy):
+  results, stats = optimize(trips, PARAMETERS, policy, {},
+                            lambda s: (s["total_price"] * s["travelers"]).sum(), 3,
+                            deadline=1e-9, return_stats=True)
+
+  assert results == [] and not stats.proven_optimal and stats.remaining == 160
+
+
+def test_budget_validation():
+  with pytest.raises(ValueError):
+    Budget(deadline=0)
+  with pytest.raises(ValueError):
+    Budget(max_evaluations=-1)
+  budget = Budget(max_evaluations=10)
+  budget.spend(8)
+  assert budget.allowance(5) == 2
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+"""Test cases for the benchmark suite and its synthetic data."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+import pandas as pd
+
+from what_if.benchmarks import synthetic
+from what_if.benchmarks.run import compare
+from what_if.benchmarks.run import run_case
+
+
+def test_synthetic_data_has_the_shape_of_the_samples():
+  tne = synthetic.tne_data(origins=3, destinations=4, days=5, max_nights=2)
+  hc = synthetic.hc_data(cities=3, teams=10)
+
+  sample_tne = pd.read_csv("./data/sample_tne_data_flights_and_hotel_combined.csv",
+                           encoding="utf-8-sig", nrows=5)
+  sample_hc = pd.read_csv("./data/sample_HC_data.csv", nrows=5)
+  assert list(tne.columns) == list(sample_tne.columns)
+  assert list(hc.columns) == list(sample_hc.columns)
+  assert len(tne) == (3 * 4 - 3) * 5 * 2 * 2
+  assert len(hc) == 30 and hc["Team Name"].nunique() == 10
+  assert (tne["date_to"] > tne["date_from"]).all()
+
+
+def test_synthetic_data_is_reproducible():
+  pd.testing.assert_frame_equal(synthetic.tne_data(seed=3), synthetic.tne_data(seed=3))
+
+
+def test_run_case_reports_every_stage():
+  case = {"kind": "hc", "size": {"cities": 3, "teams": 4}, "policies": 2,
+          "engines": ("vectorized",)}
+
+  result = run_case(case, repeat=1)
+
+  assert result["scenarios"] == 3
+  assert set(result["stages"]) == {"keep_only_relevant_records", "keep_only_filters",
+                                   "enumerate_scenarios", "keep_n", "optimize[vectorized]"}
+  assert result["stages"]["optimize[vectorized]"]["scenarios_per_sec"] > 0
+
+
+def test_compare_reports_regressions():
+  baseline = {"cases": {"a": {"stages": {"x": {"seconds": 1.0, "peak_mb": 10.0}}}}}
+  results = {"a": {"stages": {"x": {"seconds": 2.0, "peak_mb": 10.0},
+                              "y": {"seconds": 5.0, "peak_mb": 1.0}}},
+             "b": {"stages": {"x": {"seconds": 9.0, "peak_mb": 1.0}}}}
+
+  assert compare(results, baseline, tolerance=0.5) == ["a x: seconds 2 vs baseline 1"]
+  assert not compare(results, baseline, tolerance=1.5)
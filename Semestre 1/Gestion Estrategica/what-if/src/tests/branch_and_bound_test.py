@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+"""Test cases for the branch-and-bound engine."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.branch_and_bound import branch_and_bound
+from what_if.brute_force_general import enumerate_present_parameters
+from what_if.brute_force_general import optimize
+from what_if.cost_functions import separable
+from what_if.keep_n import KeepN
+
+
+@pytest.fixture
+def trips():
+  """Origins x destinations x departure x return days, with a few holes and
+  repeated prices."""
+  rows = product(["NYC", "CHI", "SEA"], ["LAX", "MIA", "DEN", "BOS"], range(6), range(6, 10))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from", "date_to"])
+  df["total_price"] = (df.index * 37) % 101
+  return df.drop(index=range(0, len(df), 7)).reset_index(drop=True)
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 4}, {"origin": "CHI", "travelers": 8},
+          {"origin": "SEA", "travelers": 4}]
+
+
+@pytest.mark.parametrize("top_n", [1, 5, 40])
+def test_branch_and_bound_matches_brute_force(trips, policy, top_n):
+  parameters = ["destination", "date_from", "date_to"]
+  cost = separable(lambda s: s["total_price"] * s["travelers"])
+
+  brute_force = optimize(trips, parameters, policy, {}, cost, top_n, engine="loop")
+  pruned = optimize(trips, parameters, policy, {}, cost, top_n, engine="branch_and_bound")
+
+  assert [x for _, x in pruned] == [x for _, x in brute_force]
+  for (pruned_df, _), (brute_force_df, _) in zip(pruned, brute_force):
+    pd.testing.assert_frame_equal(pruned_df, brute_force_df, check_dtype=False)
+
+
+def test_branch_and_bound_prunes_subtrees(trips, policy):
+  """With a cost driven by the destination, only the cheapest destination
+  subtree should be explored below its first level."""
+  trips["total_price"] = trips["destination"].map({"LAX": 10, "MIA": 500, "DEN": 700, "BOS": 900})
+  trips["total_price"] += trips["date_from"] + trips["date_to"]
+  space = enumerate_present_parameters(trips, policy, ["destination", "date_from", "date_to"])
+  cost = separable(lambda s: s["total_price"] * s["travelers"])
+  keep = KeepN(2)
+  added = []
+  original = keep.add_item
+  keep.add_item = lambda item: added.append(item) or original(item)
+
+  branch_and_bound(trips, policy, space, cost, keep)
+
+  assert {space.scenario(i)["destination"] for i, _ in added} == {"LAX"}
+  assert len(added) < len(space) / 4
+
+
+def test_separable_cost_keeps_the_row_wise_contract():
+  df = pd.DataFrame({"total_price": [10.0, 20.0], "travelers": [2, 3]})
+  cost = separable(lambda s: s["total_price"] * s["travelers"])
+
+  assert cost(df) == 80.0
+  assert separable("total_price")(df) == 30.0
+  assert np.array_equal(cost.row_costs(df), [20.0, 60.0])
+
+
+def test_branch_and_bound_requires_a_separable_cost(trips, policy):
+  with pytest.raises(ValueError):
+    optimize(trips, ["destination"], policy, {}, lambda s: 0.0, engine="branch_and_bound")
+
+
+@pytest.mark.parametrize("keep_ties", [False, True])
+def test_branch_and_bound_matches_brute_force_with_float_prices(trips, policy, keep_ties):
+  """The groupby sums are compensated: the costs kept must still be those of the
+  other engines, to the last bit."""
+  trips["total_price"] = np.random.default_rng(3).uniform(50, 500, len(trips)).round(1)
+  parameters = ["destination", "date_from", "date_to"]
+  cost = separable(lambda s: s["total_price"] * s["travelers"] / 3)
+
+  results = [optimize(trips, parameters, policy, {}, cost, 20, engine=x, keep_ties=keep_ties)
+             for x in ("loop", "vectorized", "branch_and_bound")]
+
+  costs = [[x for _, x in result] for result in results]
+  assert costs[2] == costs[0]
+  assert costs[2] == costs[1]
@@ -14,6 +14,7 @@ from what_if.brute_force_general import apply_cost_function
 from what_if.brute_force_general import enumerate_over_all_parameters
 from what_if.brute_force_general import merge_scenario_parameter_with_policy
 from what_if.brute_force_general import enumerate_scenarios
+from what_if.brute_force_general import enumerate_present_parameters
 
 
 @pytest.fixture
@@ -182,6 +183,25 @@ def test_empty_keep_only_relevant_records (sample_data, policies_not_existent):
 
   assert relevant_records.empty, "The DataFrame should be empty when no records match the policy criteria"
 
+def test_keep_only_relevant_records_mixed_policy_columns():
+  """
+  Tests keep_only_relevant_records with policy records setting different subsets
+  of columns: every matching row is kept once, in the order of the data.
+  """
+  df = pd.DataFrame({
+    'Origin': ['NYC', 'NYC', 'CHI', 'CHI', 'SEA'],
+    'Destination': ['LAX', 'MIA', 'LAX', 'MIA', 'LAX'],
+    'Price': [1, 2, 3, 4, 5],
+  })
+  policies = [{'Origin': 'NYC', 'travelers': 2},
+              {'Origin': 'CHI', 'Destination': 'MIA', 'travelers': 1},
+              {'Origin': 'NYC', 'Destination': 'LAX', 'travelers': 4}]
+
+  relevant_records = keep_only_relevant_records(df, policies)
+
+  assert relevant_records['Price'].tolist() == [1, 2, 4]
+
+
 def test_keep_only_filters(sample_data, filters):
   """
   Tests the keep_only_filters function to confirm that it accurately applies 
@@ -335,3 +355,45 @@ def test_merge_scenario_parameter_with_policy(policy):
   result = merge_scenario_parameter_with_policy(scenario_parameter, policy)
 
   assert result == expected_output
+
+
+def test_enumerate_present_parameters(setup_data):
+  """
+  This test function verifies that 'enumerate_present_parameters' only keeps the
+  combinations of parameters that have a record for every policy record, and that
+  the skipped combinations can be counted from the returned space.
+  """
+  df, _, _ = setup_data
+  policy_ = [{'origin': 'NYC', 'travelers': 4}, {'origin': 'Chicago', 'travelers': 4}]
+  parameters = ['destination', 'date_from', 'date_to']
+
+  results = enumerate_present_parameters(df, policy_, parameters)
+
+  assert list(results) == [{'destination': 'Seattle', 'date_from': '2024-01-10', 'date_to': '2024-01-16'}]
+  assert results.size - len(results) == 1, "The 2024-01-12 departure only exists for NYC."
+
+
+def test_loop_engine_calls_the_cost_function_once_per_scenario():
+  """
+  The loop engine keeps compact (scenario, cost) records: the cost function runs
+  once per scenario, and only the scenarios returned are rebuilt as data frames.
+  """
+  df = pd.DataFrame({
+      'origin': ['NYC', 'CHI'] * 3,
+      'destination': ['LAX', 'LAX', 'MIA', 'MIA', 'DEN', 'DEN'],
+      'price': [300, 200, 150, 250, 400, 100]
+  })
+  policy = [{'origin': 'NYC', 'travelers': 2}, {'origin': 'CHI', 'travelers': 1}]
+  calls = []
+
+  def cost(scenario):
+    calls.append(len(scenario))
+    return (scenario['price'] * scenario['travelers']).sum()
+
+  results = optimize(df, ['destination'], policy, {}, cost, 2, engine="loop")
+
+  assert len(calls) == 3
+  assert [x for _, x in results] == [550, 800]
+  best = results[0][0]
+  assert list(best['origin']) == ['NYC', 'CHI']
+  assert list(best['total_cost']) == [550, 550]
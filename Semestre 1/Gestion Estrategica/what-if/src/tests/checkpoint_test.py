@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+"""Test cases for the checkpoints of the optimization routine."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.constraints import AggregateCap
+from what_if.cost_functions import vectorized
+
+
+@pytest.fixture
+def trips():
+  rows = product(["NYC", "CHI"], ["LAX", "MIA", "DEN", "BOS"], range(5))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from"])
+  df["total_price"] = (df.index * 37) % 101
+  return df
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 2}, {"origin": "CHI", "travelers": 3}]
+
+
+def interrupted_after(calls):
+  """Row-wise cost function failing after `calls` evaluations, as an evicted job would."""
+  state = {"calls": 0}
+
+  def cost(s):
+    state["calls"] += 1
+    if state["calls"] > calls:
+      raise RuntimeError("evicted")
+    return (s["total_price"] * s["travelers"]).sum()
+  return cost
+
+
+def test_resume_from_checkpoint(trips, policy, tmp_path):
+  parameters = ["destination", "date_from"]
+  path = tmp_path / "run.ckpt"
+  expected = optimize(trips, parameters, policy, {}, interrupted_after(10**6), 3, engine="loop")
+
+  with pytest.raises(ValueError):
+    optimize(trips, parameters, policy, {}, interrupted_after(13), 3, engine="loop",
+             checkpoint=path, checkpoint_every=4)
+  assert path.exists()
+
+  calls = interrupted_after(10**6)
+  resumed = optimize(trips, parameters, policy, {}, calls, 3, engine="loop",
+                     checkpoint=path, checkpoint_every=4)
+
+  assert [x for _, x in resumed] == [x for _, x in expected]
+  for (resumed_df, _), (expected_df, _) in zip(resumed, expected):
+    pd.testing.assert_frame_equal(resumed_df, expected_df)
+
+
+def test_completed_checkpoint_returns_the_results(trips, policy, tmp_path):
+  parameters = ["destination", "date_from"]
+  path = tmp_path / "run.ckpt"
+  cost = vectorized(lambda c: (c["total_price"] * c["travelers"]).sum(axis=0))
+
+  def unexpected(columns):
+    raise AssertionError("No scenario should be evaluated again")
+
+  first = optimize(trips, parameters, policy, {}, cost, 3, checkpoint=path, checkpoint_every=7)
+  second = optimize(trips, parameters, policy, {}, vectorized(unexpected), 3, checkpoint=path)
+
+  assert [x for _, x in second] == [x for _, x in first]
+
+
+def test_checkpoint_refused_when_inputs_change(trips, policy, tmp_path):
+  path = tmp_path / "run.ckpt"
+  cost = vectorized(lambda c: (c["total_price"] * c["travelers"]).sum(axis=0))
+  optimize(trips, ["destination", "date_from"], policy, {}, cost, 3, checkpoint=path)
+
+  trips.loc[0, "total_price"] += 1
+  with pytest.raises(ValueError, match="different data"):
+    optimize(trips, ["destination", "date_from"], policy, {}, cost, 3, checkpoint=path)
+
+
+def test_checkpoint_refused_when_constraints_change(trips, policy, tmp_path):
+  path = tmp_path / "run.ckpt"
+  cost = vectorized(lambda c: (c["total_price"] * c["travelers"]).sum(axis=0))
+  capped = [AggregateCap("destination", "travelers", 5)]
+  optimize(trips, ["destination", "date_from"], policy, {}, cost, 3, checkpoint=path,
+           constraints=capped)
+  optimize(trips, ["destination", "date_from"], policy, {}, cost, 3, checkpoint=path,
+           constraints=[AggregateCap("destination", "travelers", 5)])
+
+  with pytest.raises(ValueError, match="different data"):
+    optimize(trips, ["destination", "date_from"], policy, {}, cost, 3, checkpoint=path,
+             constraints=[AggregateCap("destination", "travelers", 4)])
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+
+"""Test cases for the declarative constraints."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.constraints import AggregateCap
+from what_if.constraints import AllowedValues
+from what_if.constraints import ColumnComparison
+from what_if.constraints import scenario_mask
+from what_if.cost_functions import separable
+
+
+@pytest.fixture
+def offices():
+  """Cities x teams, with the seats still free in every office."""
+  cities = ["Chicago", "NYC", "Seattle", "Austin", "Denver"]
+  teams = ["Alpha", "Beta", "Gamma"]
+  rng = np.random.default_rng(7)
+  df = pd.DataFrame([(c, t) for c in cities for t in teams], columns=["City", "Team Name"])
+  df["Headquarter Capacity"] = rng.integers(150, 250, size=len(df))
+  df["Utilized Seats"] = df["Headquarter Capacity"] - rng.integers(0, 30, size=len(df))
+  df["Free Seats"] = rng.integers(10, 40, size=len(df))
+  df["REWS Cost"] = rng.integers(5, 40, size=len(df)) * 1000
+  return df
+
+
+@pytest.fixture
+def policy():
+  return [{"Team Name": "Alpha", "quantity": 12}, {"Team Name": "Beta", "quantity": 9},
+          {"Team Name": "Gamma", "quantity": 7}]
+
+
+def capacity(s):
+  """The cost function of the HC demo: rejection through an infinite cost."""
+  if not (s["Headquarter Capacity"] >= s["Utilized Seats"] + s["quantity"]).all():
+    return float("inf")
+  if s["quantity"].sum() > s["Free Seats"].min():
+    return float("inf")
+  return (s["REWS Cost"] * s["quantity"]).sum()
+
+
+CONSTRAINTS = [
+  ColumnComparison("Headquarter Capacity", ">=", ["Utilized Seats", "quantity"]),
+  AggregateCap("City", "quantity", "Free Seats"),
+]
+
+
+# Smaller teams than `policy`: Seattle and Austin fit, Chicago and NYC break the
+# record-level constraint and Denver the aggregate one.
+SMALL_TEAMS = [{"Team Name": "Alpha", "quantity": 6}, {"Team Name": "Beta", "quantity": 5},
+               {"Team Name": "Gamma", "quantity": 4}]
+
+
+# Cost function calls: one per feasible scenario in the loop engine, one per block
+# in the vectorized engine, one for the record costs in branch-and-bound.
+@pytest.mark.parametrize("engine, expected_calls",
+                         [("loop", 2), ("vectorized", 1), ("branch_and_bound", 1)])
+def test_constraints_match_infinite_costs(offices, engine, expected_calls):
+  expected = optimize(offices, ["City"], SMALL_TEAMS, {}, capacity, 5, engine="loop")
+
+  calls = []
+  def cost(s):
+    calls.append(1)
+    return s["REWS Cost"] * s["quantity"]
+
+  results = optimize(offices, ["City"], SMALL_TEAMS, {}, separable(cost), 5, engine=engine,
+                     constraints=CONSTRAINTS)
+
+  assert [x["City"].iloc[0] for x, _ in expected] == ["Seattle", "Austin"]
+  assert [x for _, x in results] == [x for _, x in expected]
+  assert [x["City"].iloc[0] for x, _ in results] == ["Seattle", "Austin"]
+  assert len(calls) == expected_calls
+
+
+def test_allowed_values_are_applied_before_enumeration(offices, policy):
+  seen = set()
+  def cost(s):
+    seen.update(s["City"])
+    return (s["REWS Cost"] * s["quantity"]).sum()
+
+  optimize(offices, ["City"], policy, {}, cost, 5, engine="loop",
+           constraints=[AllowedValues("City", ["NYC", "Austin"])])
+
+  assert seen <= {"NYC", "Austin"}
+
+
+def test_aggregate_cap_on_a_block_of_scenarios():
+  columns = {
+    "City": np.array([["A", "A", "B"], ["A", "B", "B"]]),
+    "quantity": np.array([[5, 5, 5], [6, 6, 6]]),
+    "Free Seats": np.array([[10, 10, 20], [12, 30, 10]]),
+  }
+
+  mask = scenario_mask(columns, [AggregateCap("City", "quantity", "Free Seats")], 3)
+
+  assert mask.tolist() == [False, True, False]
+
+
+def test_record_parameters_with_constraints(offices, policy):
+  cost = separable(lambda s: s["REWS Cost"] * s["quantity"])
+
+  def feasible(s):
+    seats = s.groupby("City").agg({"quantity": "sum", "Free Seats": "min"})
+    return bool((seats["quantity"] <= seats["Free Seats"]).all())
+
+  expected = optimize(offices, ["City"], policy, {}, cost, 4, record_parameters=["City"],
+                      feasible=feasible)
+  results = optimize(offices, ["City"], policy, {}, cost, 4, record_parameters=["City"],
+                     constraints=[AggregateCap("City", "quantity", "Free Seats")])
+
+  assert [x for _, x in results] == [x for _, x in expected]
+
+
+def test_unknown_comparison():
+  with pytest.raises(ValueError):
+    ColumnComparison("a", "=>", "b")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+"""Test cases for the persistent cache of the costs."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.cost_cache import CostCache, cost_fingerprint
+from what_if.cost_functions import separable, vectorized
+from what_if.parallel import fork_available
+
+
+@pytest.fixture
+def trips():
+  rows = product(["NYC", "CHI"], ["LAX", "MIA", "DEN", "BOS"], range(5))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from"])
+  df["total_price"] = (df.index * 37) % 101 + 1.0
+  return df
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 2}, {"origin": "CHI", "travelers": 3}]
+
+
+PARAMETERS = ["destination", "date_from"]
+# Tariff read by `taxed()`, a global variable part of its fingerprint.
+TAX = 1.0
+
+
+def counting(s):
+  """Row-wise cost function counting its calls in `counting.calls`, an attribute
+  left out of its fingerprint (unlike its closure and the globals it reads)."""
+  counting.calls += 1
+  return (s["total_price"] * s["travelers"]).sum()
+
+
+counting.calls = 0
+
+
+def taxed(s):
+  return s["total_price"] * s["travelers"] * TAX
+
+
+def test_cost_fingerprint():
+  def make(factor):
+    return lambda s: s["total_price"] * factor
+
+  assert cost_fingerprint(make(2)) == cost_fingerprint(make(2))
+  assert cost_fingerprint(make(2)) != cost_fingerprint(make(3))
+  assert cost_fingerprint(separable("total_price")) != cost_fingerprint(
+    vectorized(lambda c: c["total_price"].sum(axis=0)))
+  assert cost_fingerprint(separable(lambda s: s["a"])) != cost_fingerprint(
+    separable(lambda s: s["b"]))
+
+
+def test_large_closed_over_values_are_fingerprinted_by_content(trips, policy, tmp_path):
+  def make(weights):
+    return separable(lambda s: weights[s["date_from"]] * s["travelers"])
+
+  weights = np.ones(2000)
+  changed = weights.copy()
+  changed[1000] = -1
+  changed[3] = -1
+  frame = pd.DataFrame({"w": np.ones(2000)})
+  other = frame.copy()
+  other.loc[1000, "w"] = 2
+
+  assert cost_fingerprint(make(weights)) != cost_fingerprint(make(changed))
+  assert cost_fingerprint(make(frame)) != cost_fingerprint(make(other))
+  assert cost_fingerprint(make(weights)) == cost_fingerprint(make(weights.copy()))
+  cache = CostCache(tmp_path / "costs.sqlite")
+  optimize(trips, PARAMETERS, policy, {}, make(weights), 1, cache=cache)
+  results = optimize(trips, PARAMETERS, policy, {}, make(changed), 1, cache=cache)
+  assert results[0][1] == -5.0
+
+
+def test_values_without_a_stable_description_are_not_cached(trips, policy, tmp_path):
+  opaque = object()
+  cost = separable(lambda s: s["total_price"] * (opaque is not None))
+
+  with pytest.raises(ValueError):
+    cost_fingerprint(cost)
+  with pytest.raises(ValueError):
+    optimize(trips, PARAMETERS, policy, {}, cost, 1, cache=CostCache(tmp_path / "costs.sqlite"))
+
+
+def test_globals_read_are_part_of_the_fingerprint(trips, policy, tmp_path, monkeypatch):
+  cache = CostCache(tmp_path / "costs.sqlite")
+  cost = separable(taxed)
+  optimize(trips, PARAMETERS, policy, {}, cost, 3, cache=cache)
+
+  monkeypatch.setattr(f"{__name__}.TAX", 2.0)
+  results, stats = optimize(trips, PARAMETERS, policy, {}, cost, 3, cache=cache,
+                            return_stats=True)
+
+  assert (stats.cache_hits, stats.cache_misses) == (0, 20)
+  assert [x for _, x in results] == [x for _, x in optimize(trips, PARAMETERS, policy, {},
+                                                           cost, 3)]
+
+
+def test_globals_without_a_stable_description_are_reported(caplog):
+  cost = separable(lambda s: s["total_price"] * (OPAQUE is not None))
+
+  with caplog.at_level("WARNING"):
+    assert cost_fingerprint(cost) == cost_fingerprint(cost)
+
+  assert "OPAQUE" in caplog.text
+
+
+OPAQUE = object()
+
+
+def test_get_put_and_lru_eviction(tmp_path):
+  cache = CostCache(tmp_path / "costs.sqlite", max_entries=3)
+  cache.put([b"a", b"b", b"c"], [1.0, float("inf"), float("nan")])
+
+  costs, found = cache.get([b"a", b"b", b"c", b"d"])
+  assert list(found) == [True, True, True, False]
+  assert costs[0] == 1.0 and np.isinf(costs[1]) and np.isnan(costs[2])
+
+  cache.get([b"a"])
+  cache.put([b"d"], [4.0])
+  _, found = cache.get([b"a", b"b", b"c", b"d"])
+  assert list(found) == [True, False, True, True]
+  assert cache.stats() == {"hits": 7, "misses": 2, "hit_rate": 7 / 9, "evictions": 1,
+                           "entries": 3}
+
+  reopened = CostCache(tmp_path / "costs.sqlite", max_entries=3)
+  assert len(reopened) == 3
+  reopened.clear()
+  assert len(reopened) == 0
+
+
+@pytest.mark.parametrize("engine", ["loop", "vectorized"])
+def test_second_run_hits_the_cache(trips, policy, tmp_path, engine):
+  cost = counting
+  if engine == "vectorized":
+    cost = separable(lambda s: s["total_price"] * s["travelers"])
+  cache = CostCache(tmp_path / "costs.sqlite")
+  expected = optimize(trips, PARAMETERS, policy, {}, cost, 3, engine=engine)
+
+  first, stats = optimize(trips, PARAMETERS, policy, {}, cost, 3, engine=engine, cache=cache,
+                          return_stats=True)
+  assert (stats.cache_hits, stats.cache_misses) == (0, 20)
+  counting.calls = 0
+  second, stats = optimize(trips, PARAMETERS, policy, {"date_from": [0, 1, 2]}, cost, 5,
+                           engine=engine, cache=cache, return_stats=True)
+
+  assert (stats.cache_hits, stats.cache_misses, stats.evaluated) == (12, 0, 12)
+  assert stats.cost_calls == 0 and counting.calls == 0
+  assert [x for _, x in first] == [x for _, x in expected]
+  assert [x for _, x in second] == [x for _, x in optimize(
+    trips, PARAMETERS, policy, {"date_from": [0, 1, 2]}, cost, 5, engine=engine)]
+
+
+def test_cache_is_shared_between_engines_and_invalidated_by_changes(trips, policy, tmp_path):
+  cache = CostCache(tmp_path / "costs.sqlite")
+  cost = separable(lambda s: s["total_price"] * s["travelers"])
+  optimize(trips, PARAMETERS, policy, {}, cost, 3, engine="vectorized", cache=cache)
+
+  _, stats = optimize(trips, PARAMETERS, policy, {}, cost, 3, engine="loop", cache=cache,
+                      return_stats=True)
+  assert stats.cache_hits == 20
+
+  changed = trips.assign(total_price=trips["total_price"].where(trips["date_from"] != 0, 0.5))
+  _, stats = optimize(changed, PARAMETERS, policy, {}, cost, 3, cache=cache, return_stats=True)
+  assert (stats.cache_hits, stats.cache_misses) == (16, 4)
+
+  other = [{"origin": "NYC", "travelers": 1}, {"origin": "CHI", "travelers": 3}]
+  _, stats = optimize(trips, PARAMETERS, other, {}, cost, 3, cache=cache, return_stats=True)
+  assert stats.cache_hits == 0
+
+  _, stats = optimize(trips, PARAMETERS, policy, {},
+                      separable(lambda s: s["total_price"] * s["travelers"] + 1), 3,
+                      cache=cache, return_stats=True)
+  assert stats.cache_hits == 0
+
+
+@pytest.mark.skipif(not fork_available(), reason="requires fork")
+def test_cache_with_worker_processes(trips, policy, tmp_path):
+  cache = CostCache(tmp_path / "costs.sqlite")
+  cost = vectorized(lambda c: (c["total_price"] * c["travelers"]).sum(axis=0))
+  expected = optimize(trips, PARAMETERS, policy, {}, cost, 3, block_size=4, n_jobs=2,
+                      cache=cache)
+
+  results, stats = optimize(trips, PARAMETERS, policy, {}, cost, 3, block_size=4, n_jobs=2,
+                            cache=cache, return_stats=True)
+
+  assert stats.cache_hits == 20
+  assert [x for _, x in results] == [x for _, x in expected]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""Test cases for the decomposition solver of per-record parameters."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.cost_functions import separable
+from what_if.decomposition import k_best_sums
+
+
+@pytest.fixture
+def trips():
+  """Origins x destinations x departure days, with a few holes."""
+  rows = product(["NYC", "CHI", "SEA"], ["LAX", "MIA", "DEN", "BOS"], range(3))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from"])
+  df["total_price"] = np.random.default_rng(1).uniform(100, 500, size=len(df)).round(2)
+  return df.drop(index=[5, 17]).reset_index(drop=True)
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 4}, {"origin": "CHI", "travelers": 2},
+          {"origin": "SEA", "travelers": 1}]
+
+
+def row_cost(scenario):
+  return scenario["total_price"] * scenario["travelers"]
+
+
+def brute_force(trips, policy, feasible, top_n, cost=row_cost):
+  """Every date shared by the records, every destination per record."""
+  costs = []
+  for date in sorted(set(trips["date_from"])):
+    options = [trips[(trips["origin"] == pol["origin"]) & (trips["date_from"] == date)]
+               for pol in policy]
+    for rows in product(*[x.index for x in options]):
+      scenario = trips.loc[list(rows)].reset_index(drop=True)
+      scenario["travelers"] = [pol["travelers"] for pol in policy]
+      if feasible is None or feasible(scenario):
+        costs.append(cost(scenario).sum())
+  return sorted(costs)[:top_n]
+
+
+def test_k_best_sums_enumerates_every_choice_once_by_increasing_sum():
+  lists = [np.array([1.0, 4.0, 6.0]), np.array([0.0, 2.0]), np.array([3.0, 3.5, 9.0])]
+
+  found = list(k_best_sums(lists))
+
+  assert sorted(x for _, x in found) == sorted(product(range(3), range(2), range(3)))
+  assert [x for x, _ in found] == sorted(x for x, _ in found)
+  assert found[0] == (4.0, (0, 0, 0))
+
+
+@pytest.mark.parametrize("top_n", [1, 4])
+def test_record_parameters_match_brute_force(trips, policy, top_n):
+  cost = separable(lambda s: s["total_price"] * s["travelers"])
+
+  results = optimize(trips, ["destination", "date_from"], policy, {}, cost, top_n,
+                     record_parameters=["destination"])
+
+  assert [x for _, x in results] == brute_force(trips, policy, None, top_n)
+  best, best_cost = results[0]
+  assert best["origin"].tolist() == ["NYC", "CHI", "SEA"]
+  assert best["date_from"].nunique() == 1
+  assert best["total_cost"].tolist() == [best_cost] * 3
+
+
+def test_record_parameters_keep_the_exact_costs(trips, policy):
+  """The sums ordering the combinations are updated incrementally; the costs
+  kept must be the sums of the record costs."""
+  def third(scenario):
+    return scenario["total_price"] * scenario["travelers"] / 3
+
+  results = optimize(trips, ["destination", "date_from"], policy, {}, separable(third), 40,
+                     record_parameters=["destination"])
+
+  assert [x for _, x in results] == brute_force(trips, policy, None, 40, third)
+
+
+def test_record_parameters_with_coupling_constraint(trips, policy):
+  """Every record must fly to a different destination."""
+  cost = separable(lambda s: s["total_price"] * s["travelers"])
+
+  def different(scenario):
+    return scenario["destination"].is_unique
+
+  results = optimize(trips, ["destination", "date_from"], policy, {}, cost, 4,
+                     record_parameters=["destination"], feasible=different)
+
+  assert [x for _, x in results] == brute_force(trips, policy, different, 4)
+  assert all(x["destination"].is_unique for x, _ in results)
+
+
+def test_record_parameters_require_a_separable_cost(trips, policy):
+  with pytest.raises(ValueError):
+    optimize(trips, ["destination"], policy, {}, lambda s: 0.0,
+             record_parameters=["destination"])
+  with pytest.raises(ValueError):
+    optimize(trips, ["destination"], policy, {}, separable("total_price"),
+             record_parameters=["stars"])
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""Test cases for the incremental re-optimization."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.cost_functions import separable
+from what_if.incremental import IncrementalOptimizer, changed_rows
+
+
+@pytest.fixture
+def trips():
+  rows = product(["NYC", "CHI"], ["LAX", "MIA", "DEN", "BOS"], range(4), range(4, 7))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from", "date_to"])
+  df["total_price"] = np.random.default_rng(5).uniform(100, 900, size=len(df)).round(2)
+  return df
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 3}, {"origin": "CHI", "travelers": 1}]
+
+
+PARAMETERS = ["destination", "date_from", "date_to"]
+COST = separable(lambda s: s["total_price"] * s["travelers"])
+
+
+def assert_same_results(results, expected):
+  assert [x for _, x in results] == pytest.approx([x for _, x in expected])
+  for (scenario, _), (other, _) in zip(results, expected):
+    pd.testing.assert_frame_equal(scenario, other, check_dtype=False)
+
+
+def test_changed_rows(trips):
+  new = trips.drop(index=[0]).copy()
+  new.loc[5, "total_price"] = 1.0
+
+  removed, added = changed_rows(trips, new)
+
+  assert sorted(removed.index) == [0, 5]
+  assert list(added.index) == [5]
+
+
+@pytest.mark.parametrize("engine", ["loop", "vectorized"])
+def test_first_run_matches_optimize(trips, policy, engine):
+  optimizer = IncrementalOptimizer(PARAMETERS, policy, {}, COST, 3, engine)
+
+  assert_same_results(optimizer.optimize(trips),
+                      optimize(trips, PARAMETERS, policy, {}, COST, 3, engine=engine))
+
+
+@pytest.mark.parametrize("engine", ["loop", "vectorized"])
+def test_only_scenarios_touching_changes_are_evaluated(trips, policy, engine):
+  optimizer = IncrementalOptimizer(PARAMETERS, policy, {}, COST, 3, engine)
+  optimizer.optimize(trips)
+  new = trips.copy()
+  # The cheapest scenario gets cheaper, another one disappears.
+  best = optimize(trips, PARAMETERS, policy, {}, COST, 1)[0][0]
+  changed = new.merge(best[PARAMETERS + ["origin"]], indicator=True, how="left")
+  new.loc[(changed["_merge"] == "both").to_numpy(), "total_price"] -= 50
+  new = new.drop(index=new.index[(new["destination"] == "BOS") & (new["date_from"] == 0)
+                                 & (new["date_to"] == 4)])
+
+  results, stats = optimizer.optimize(new, return_stats=True)
+
+  assert stats.evaluated == 1
+  assert_same_results(results, optimize(new, PARAMETERS, policy, {}, COST, 3, engine=engine))
+  assert len(optimizer.costs) == 4 * 4 * 3 - 1
+
+
+def test_new_parameter_values_are_evaluated(trips, policy):
+  optimizer = IncrementalOptimizer(PARAMETERS, policy, {}, COST, 2)
+  optimizer.optimize(trips)
+  extra = trips[trips["destination"] == "LAX"].assign(destination="AUS", total_price=1.0)
+  new = pd.concat([trips, extra], ignore_index=True)
+
+  results, stats = optimizer.optimize(new, return_stats=True)
+
+  assert stats.evaluated == 4 * 3
+  assert results[0][0]["destination"].unique().tolist() == ["AUS"]
+  assert_same_results(results, optimize(new, PARAMETERS, policy, {}, COST, 2))
+
+
+def test_unchanged_data_is_not_evaluated(trips, policy):
+  optimizer = IncrementalOptimizer(PARAMETERS, policy, {"date_to": [4, 5]}, COST, 3)
+  expected = optimizer.optimize(trips)
+
+  results, stats = optimizer.optimize(trips.sample(frac=1, random_state=0), return_stats=True)
+
+  assert stats.evaluated == 0
+  assert [x for _, x in results] == pytest.approx([x for _, x in expected])
+
+
+def test_rejects_invalid_arguments(policy):
+  with pytest.raises(ValueError):
+    IncrementalOptimizer([], policy, {}, COST)
+  with pytest.raises(ValueError):
+    IncrementalOptimizer(PARAMETERS, policy, {}, COST, engine="branch_and_bound")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""Test cases for the k-best engine."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.constraints import AggregateCap, ColumnComparison
+from what_if.cost_functions import separable
+
+PARAMETERS = ["destination", "date_from", "date_to"]
+COST = separable(lambda s: s["total_price"] * s["travelers"])
+
+
+@pytest.fixture
+def trips():
+  """Origins x destinations x departure x return days, with a few holes and
+  many repeated costs."""
+  rows = product(["NYC", "CHI", "SEA"], ["LAX", "MIA", "DEN", "BOS"], range(6), range(6, 10))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from", "date_to"])
+  df["total_price"] = (df.index * 37) % 11
+  df["seats"] = (df.index * 13) % 5
+  return df.drop(index=range(0, len(df), 7)).reset_index(drop=True)
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 4}, {"origin": "CHI", "travelers": 8},
+          {"origin": "SEA", "travelers": 4}]
+
+
+def assert_same_results(results, expected):
+  assert [x for _, x in results] == [x for _, x in expected]
+  for (scenario, _), (other, _) in zip(results, expected):
+    pd.testing.assert_frame_equal(scenario, other, check_dtype=False)
+
+
+@pytest.mark.parametrize("keep_ties", [False, True])
+@pytest.mark.parametrize("top_n", [1, 5, 40])
+def test_k_best_matches_brute_force(trips, policy, top_n, keep_ties):
+  brute_force = optimize(trips, PARAMETERS, policy, {}, COST, top_n, engine="vectorized",
+                         keep_ties=keep_ties)
+
+  results = optimize(trips, PARAMETERS, policy, {}, COST, top_n, engine="k_best",
+                     keep_ties=keep_ties)
+
+  assert_same_results(results, brute_force)
+  if keep_ties and top_n > 1:
+    assert len(results) == top_n
+    assert len({x for _, x in results}) < top_n, "The fixture should have tied costs."
+
+
+def test_keep_ties_in_every_engine(trips, policy):
+  expected = optimize(trips, PARAMETERS, policy, {}, COST, 12, engine="loop", keep_ties=True)
+
+  for engine in ["vectorized", "branch_and_bound", "k_best"]:
+    assert_same_results(
+      optimize(trips, PARAMETERS, policy, {}, COST, 12, engine=engine, keep_ties=True), expected
+    )
+
+
+def test_k_best_with_constraints(trips, policy):
+  constraints = [ColumnComparison(["seats", "travelers"], ">=", 6),
+                 AggregateCap("destination", "seats", 6)]
+  expected = optimize(trips, PARAMETERS, policy, {}, COST, 5, engine="vectorized",
+                      constraints=constraints, keep_ties=True)
+
+  results, stats = optimize(trips, PARAMETERS, policy, {}, COST, 5, engine="k_best",
+                            constraints=constraints, keep_ties=True, return_stats=True)
+
+  assert_same_results(results, expected)
+  assert results and stats.rejected > 0
+
+
+def test_k_best_only_scores_a_fraction_of_the_space():
+  rng = np.random.default_rng(1)
+  rows = product(["NYC", "CHI"], range(40), range(30), range(10))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from", "date_to"])
+  df["total_price"] = rng.uniform(100, 1000, size=len(df)).round(2)
+  policy = [{"origin": "NYC", "travelers": 2}, {"origin": "CHI", "travelers": 1}]
+
+  results, stats = optimize(df, PARAMETERS, policy, {}, COST, 3, engine="k_best",
+                            return_stats=True)
+
+  assert stats.evaluated < len(df) / 20
+  assert_same_results(results, optimize(df, PARAMETERS, policy, {}, COST, 3))
+
+
+def test_k_best_requires_a_separable_cost(trips, policy):
+  with pytest.raises(ValueError):
+    optimize(trips, ["destination"], policy, {}, lambda s: 0.0, engine="k_best")
+  with pytest.raises(ValueError):
+    optimize(trips, ["destination"], policy, {}, COST, engine="k_best", checkpoint="x.pkl")
@@ -55,3 +55,69 @@ def test_negative_n_param_raise_value_error():
       exc_info.value.args[0] ==
       "The number of elements in the KeepN structure should be a positive integer."
   )
+
+
+def test_threshold_is_the_worst_kept_cost_once_full():
+  keep = KeepN(2)
+  assert keep.threshold == float("inf")
+
+  keep.add_item(({}, 5))
+  assert keep.threshold == float("inf")
+
+  keep.add_item(({}, 7))
+  assert keep.threshold == 7
+
+  keep.add_item(({}, 1))
+  assert keep.threshold == 5
+
+
+def test_equal_costs_keep_the_first_item_added():
+  keep = KeepN(3)
+
+  assert keep.add_item(("first", 2))
+  assert not keep.add_item(("second", 2))
+
+  assert keep.return_results() == [("first", 2)]
+
+
+def test_an_evicted_cost_can_be_added_again():
+  keep = KeepN(1)
+  keep.add_item(("a", 3))
+  keep.add_item(("b", 1))
+
+  assert not keep.add_item(("c", 3))
+  assert keep.add_item(("d", 0))
+  assert keep.return_results() == [("d", 0)]
+
+
+def test_memory_stays_bounded():
+  keep = KeepN(5)
+  for i in range(100_000, 0, -1):
+    keep.add_item(({}, i))
+
+  assert len(keep) == 5
+  assert [cost for _, cost in keep.return_results()] == [1, 2, 3, 4, 5]
+
+
+def test_keep_ties_keeps_equal_costs_in_order_of_addition():
+  keep = KeepN(3, keep_ties=True)
+  for item in [("a", 2), ("b", 1), ("c", 2), ("d", 2), ("e", 1)]:
+    keep.add_item(item)
+
+  assert keep.return_results() == [("b", 1), ("e", 1), ("a", 2)]
+  assert keep.threshold == 2
+  assert not keep.add_item(("f", 2))
+
+
+@pytest.mark.parametrize("keep_ties", [False, True])
+def test_order_ranks_equal_costs_whatever_the_order_of_addition(keep_ties):
+  items = [(3, 2.0), (1, 2.0), (4, 1.0), (0, 2.0), (2, 5.0)]
+  expected = KeepN(3, keep_ties)
+  for item in sorted(items):
+    expected.add_item(item)
+
+  for shuffled in (items, items[::-1]):
+    keep = KeepN(3, keep_ties, order=lambda x: x[0])
+    for item in shuffled:
+      keep.add_item(item)
+    assert keep.return_results() == expected.return_results()
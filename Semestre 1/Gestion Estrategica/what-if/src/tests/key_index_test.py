@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+"""Test cases for the key index of the records."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+import pandas as pd
+import pytest
+
+from what_if.key_index import KeyIndex
+
+
+@pytest.fixture
+def trips():
+  return pd.DataFrame({
+    'origin': ['NYC', 'NYC', 'Chicago', 'Chicago'],
+    'destination': ['Seattle', 'LA', 'Seattle', 'LA'],
+    'total_price': [100.0, 50.0, 80.0, 70.0],
+  })
+
+
+def test_realize_matches_merge(trips):
+  index = KeyIndex(trips, ['origin', 'destination'])
+  records = [{'origin': 'Chicago', 'destination': 'LA', 'travelers': 1},
+             {'origin': 'NYC', 'destination': 'LA', 'travelers': 2}]
+
+  expected = trips.merge(pd.DataFrame(records), how='inner')
+
+  pd.testing.assert_frame_equal(index.realize(records), expected)
+
+
+def test_realize_leaves_out_missing_records(trips):
+  index = KeyIndex(trips.iloc[:3], ['origin', 'destination'])
+  records = [{'origin': 'Chicago', 'destination': 'LA', 'travelers': 1},
+             {'origin': 'NYC', 'destination': 'LA', 'travelers': 2}]
+
+  answer = index.realize(records)
+
+  assert answer['total_price'].tolist() == [50.0]
+  assert answer['travelers'].tolist() == [2]
+
+
+def test_lookup_returns_positions(trips):
+  index = KeyIndex(trips, ['origin', 'destination'])
+  frame = pd.DataFrame({'origin': ['Chicago', 'Denver'], 'destination': ['Seattle', 'LA']})
+
+  assert index.lookup(frame).tolist() == [2, -1]
+
+
+def test_key_index_requires_columns(trips):
+  with pytest.raises(ValueError):
+    KeyIndex(trips, [])
+
+
+def test_encode_and_find(trips):
+  index = KeyIndex(trips, ['origin', 'destination'])
+
+  assert index.encode('origin', ['Chicago', 'NYC', 'Denver']).tolist() == [1, 0, -1]
+  codes = {'origin': index.encode('origin', ['NYC', 'Chicago'])[:, None],
+           'destination': index.encode('destination', ['LA', 'Seattle', 'Boston'])[None, :]}
+  assert index.find(codes).tolist() == [[1, 0, -1], [3, 2, -1]]
+  assert index.locate([{'origin': 'Chicago', 'destination': 'LA'}, {'origin': 'NYC'}]).tolist() \
+    == [3, -1]
+
+
+def test_packed_keys_are_compressed_before_overflowing(trips, monkeypatch):
+  monkeypatch.setattr('what_if.key_index._PACKED_LIMIT', 3)
+  index = KeyIndex(trips, ['origin', 'destination', 'total_price'])
+  frame = trips.iloc[[3, 0]].assign(total_price=[70.0, 1.0])
+
+  assert index.lookup(trips).tolist() == [0, 1, 2, 3]
+  assert index.lookup(frame).tolist() == [3, -1]
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+
+"""Test cases for the multi-core execution of the optimization routine."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.cost_functions import vectorized
+from what_if.parallel import fork_available
+from what_if.parallel import resolve_n_jobs
+
+pytestmark = pytest.mark.skipif(not fork_available(), reason="requires fork")
+
+
+@pytest.fixture
+def trips():
+  """Every origin flies to every destination on every date. Prices repeat so
+  that many scenarios share the same cost."""
+  rows = product(["NYC", "CHI", "SEA"], [f"D{i}" for i in range(12)], range(10))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "day"])
+  df["price"] = (df.index * 7) % 23
+  return df
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 2}, {"origin": "SEA", "travelers": 1}]
+
+
+@pytest.mark.parametrize("cost_function", [
+  lambda s: (s["price"] * s["travelers"]).sum(),
+  vectorized(lambda c: (c["price"] * c["travelers"]).sum(axis=0)),
+])
+def test_parallel_results_match_the_sequential_path(trips, policy, cost_function):
+  parameters = ["destination", "day"]
+
+  sequential = optimize(trips, parameters, policy, {}, cost_function, top_n=7)
+  parallel = optimize(trips, parameters, policy, {}, cost_function, top_n=7, n_jobs=3)
+
+  assert [cost for _, cost in parallel] == [cost for _, cost in sequential]
+  for (parallel_df, _), (sequential_df, _) in zip(parallel, sequential):
+    pd.testing.assert_frame_equal(parallel_df, sequential_df)
+
+
+def test_resolve_n_jobs():
+  assert resolve_n_jobs(None) == 1
+  assert resolve_n_jobs(4) == 4
+  assert resolve_n_jobs(-1) >= 1
+  with pytest.raises(ValueError):
+    resolve_n_jobs(0)
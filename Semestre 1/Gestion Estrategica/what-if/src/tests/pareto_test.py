@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""Test cases for the multi-objective optimization."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.constraints import ColumnComparison
+from what_if.cost_functions import separable, vectorized
+from what_if.parallel import fork_available
+from what_if.pareto import ParetoFront
+
+
+@pytest.fixture
+def trips():
+  rows = product(["NYC", "CHI"], ["LAX", "MIA", "DEN", "BOS"], range(4), range(4, 7))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from", "date_to"])
+  rng = np.random.default_rng(3)
+  df["total_price"] = rng.uniform(100, 900, size=len(df)).round(0)
+  df["stars"] = rng.integers(1, 6, size=len(df))
+  return df
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 3}, {"origin": "CHI", "travelers": 1}]
+
+
+PARAMETERS = ["destination", "date_from", "date_to"]
+OBJECTIVES = {
+  "price": separable(lambda s: s["total_price"] * s["travelers"]),
+  "nights": vectorized(lambda c: (c["date_to"] - c["date_from"]).max(axis=0)),
+  "discomfort": separable(lambda s: 5 - s["stars"]),
+}
+
+
+def brute_force_front(df, policy, objectives):
+  """Non-dominated costs, computed by comparing every pair of scenarios."""
+  costs = []
+  for _, group in df.groupby(PARAMETERS):
+    scenario = group.merge(pd.DataFrame(policy))
+    if len(scenario) == len(policy):
+      costs.append(tuple(float(f(scenario)) for f in objectives.values()))
+  costs = sorted(set(costs))
+  return [x for x in costs
+          if not any(all(a <= b for a, b in zip(y, x)) and y != x for y in costs)]
+
+
+def test_front_keeps_non_dominated_items():
+  front = ParetoFront(["cost", "nights"])
+
+  assert front.add_item(("a", (3, 3)))
+  assert not front.add_item(("b", (3, 3))), "Equal costs: the first item wins."
+  assert not front.add_item(("c", (4, 3)))
+  assert front.add_item(("d", (1, 5)))
+  assert not front.add_item(("e", (np.inf, 0)))
+  assert front.add_item(("f", (2, 2)))
+
+  assert front.return_results() == [("d", (1.0, 5.0)), ("f", (2.0, 2.0))]
+  with pytest.raises(ValueError):
+    front.add_item(("g", (1, 2, 3)))
+
+
+def test_push_block_matches_adding_items_one_by_one():
+  rng = np.random.default_rng(0)
+  costs = rng.integers(0, 12, size=(500, 3)).astype(float)
+  costs[rng.random(500) < 0.1, 1] = np.inf
+  one_by_one, blocks = ParetoFront("abc"), ParetoFront("abc")
+
+  for i, x in enumerate(costs):
+    one_by_one.add_item((i, x))
+  for start in range(0, len(costs), 64):
+    blocks.push_block(costs[start:start + 64], np.arange(start, min(start + 64, len(costs))))
+
+  assert blocks.return_results() == one_by_one.return_results()
+  assert len(blocks) < 100
+
+
+@pytest.mark.parametrize("engine", ["loop", "vectorized"])
+def test_optimize_returns_the_pareto_front(trips, policy, engine):
+  results, stats = optimize(trips, PARAMETERS, policy, {}, OBJECTIVES, engine=engine,
+                            block_size=10, return_stats=True)
+
+  assert [x for _, x in results] == brute_force_front(trips, policy, OBJECTIVES)
+  assert stats.evaluated == 4 * 4 * 3 and stats.kept == len(results)
+  scenario, costs = results[0]
+  assert list(scenario["origin"]) == ["NYC", "CHI"]
+  assert scenario["destination"].nunique() == 1
+  assert tuple(scenario.loc[0, list(OBJECTIVES)]) == costs
+
+
+def test_single_objective_front_is_the_best_scenario(trips, policy):
+  cost = separable(lambda s: s["total_price"] * s["travelers"])
+
+  results = optimize(trips, PARAMETERS, policy, {}, {"price": cost})
+
+  assert [x for _, x in results] == [(optimize(trips, PARAMETERS, policy, {}, cost, 1)[0][1],)]
+  assert "price" in results[0][0]
+
+
+def test_constraints_and_row_wise_objectives(trips, policy):
+  objectives = {"price": lambda s: (s["total_price"] * s["travelers"]).sum(),
+                "comfort": lambda s: -s["stars"].min()}
+  constraints = [ColumnComparison("stars", ">=", "travelers")]
+
+  results = optimize(trips, PARAMETERS, policy, {}, objectives, constraints=constraints)
+
+  assert results
+  assert all((x["stars"] >= x["travelers"]).all() for x, _ in results)
+  kept = trips[trips["stars"] >= 3 - 2 * (trips["origin"] == "CHI")]
+  assert [x for _, x in results] == brute_force_front(kept, policy, objectives)
+
+
+@pytest.mark.skipif(not fork_available(), reason="requires fork")
+def test_worker_processes_merge_their_fronts(trips, policy):
+  expected = optimize(trips, PARAMETERS, policy, {}, OBJECTIVES)
+
+  results = optimize(trips, PARAMETERS, policy, {}, OBJECTIVES, block_size=5, n_jobs=2)
+
+  assert [x for _, x in results] == [x for _, x in expected]
+
+
+def test_rejects_unsupported_modes(trips, policy):
+  with pytest.raises(ValueError):
+    optimize(trips, PARAMETERS, policy, {}, OBJECTIVES, engine="branch_and_bound")
+  with pytest.raises(ValueError):
+    optimize(trips, PARAMETERS, policy, {}, OBJECTIVES, max_evaluations=10)
+  with pytest.raises(ValueError):
+    optimize(trips, PARAMETERS, policy, {}, {"a": lambda s: 1.0, "b": lambda s: 2.0},
+             engine="vectorized")
+  with pytest.raises(ValueError):
+    optimize(trips, PARAMETERS, policy, {}, {})
+  with pytest.raises(ValueError):
+    optimize(trips, PARAMETERS, policy, {}, {"price": "total_price"})
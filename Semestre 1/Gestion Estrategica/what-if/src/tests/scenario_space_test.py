@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+"""Test cases for the lazy scenario space."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import pytest
+
+from what_if.scenario_space import PolicyScenarios
+from what_if.scenario_space import ScenarioSpace
+
+
+@pytest.fixture
+def space():
+  return ScenarioSpace(["destination", "date_from", "stars"],
+                       [["NYC", "LAX", "SEA"], ["2024-01-01", "2024-01-02"], [4, 5]])
+
+
+def test_length_is_known_up_front(space):
+  assert len(space) == 12
+
+
+def test_order_matches_the_cartesian_product(space):
+  expected = [
+    dict(zip(space.parameters, values))
+    for values in product(*space.values)
+  ]
+
+  assert list(space) == expected
+
+
+def test_slices_are_lazy_spaces(space):
+  shard = space[3:7]
+
+  assert isinstance(shard, ScenarioSpace)
+  assert len(shard) == 4
+  assert list(shard) == list(space)[3:7]
+  assert shard[-1] == space[6]
+
+
+def test_shards_cover_the_space_in_order(space):
+  shards = space.shards(5)
+
+  assert len(shards) == 5
+  assert [x for shard in shards for x in shard] == list(space)
+
+
+def test_to_frame_matches_the_scenarios(space):
+  frame = space[2:9].to_frame()
+
+  assert frame.to_dict("records") == list(space[2:9])
+
+
+def test_policy_scenarios_merge_every_scenario_with_the_policy(space):
+  policy = [{"origin": "CHI"}, {"origin": "NYC"}]
+
+  scenarios = PolicyScenarios(space, policy)
+
+  assert len(scenarios) == len(space)
+  assert scenarios[1] == [pol | space[1] for pol in policy]
+  assert len(scenarios[4:]) == 8
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""Test cases for the instrumentation of the optimization routine."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+from itertools import product
+
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.constraints import AllowedValues
+from what_if.cost_functions import vectorized
+from what_if.parallel import fork_available
+from what_if.stats import OptimizationStats
+from what_if.stats import Progress
+
+
+@pytest.fixture
+def trips():
+  """Origins x destinations x departure days, NYC -> MIA missing and one
+  infinite price."""
+  rows = product(["NYC", "CHI"], ["LAX", "MIA", "DEN"], range(4))
+  df = pd.DataFrame(list(rows), columns=["origin", "destination", "date_from"])
+  df["total_price"] = (df.index * 37) % 101 + 1.0
+  df.loc[(df["destination"] == "DEN") & (df["date_from"] == 3), "total_price"] = float("inf")
+  return df[~((df["origin"] == "NYC") & (df["destination"] == "MIA"))].reset_index(drop=True)
+
+
+@pytest.fixture
+def policy():
+  return [{"origin": "NYC", "travelers": 2}, {"origin": "CHI", "travelers": 3}]
+
+
+COUNTERS = ("enumerated", "missing_rows", "rejected", "evaluated", "kept")
+
+
+@pytest.mark.parametrize("engine", ["loop", "vectorized"])
+def test_stats_count_the_scenarios(trips, policy, engine):
+  cost = vectorized(lambda c: (c["total_price"] * c["travelers"]).sum(axis=0))
+  constraints = [AllowedValues("travelers", [2, 3, 4]), AllowedValues("date_from", [0, 1, 3])]
+
+  results, stats = optimize(trips, ["destination", "date_from"], policy, {}, cost, 2,
+                            engine=engine, constraints=constraints, return_stats=True)
+
+  # 3 destinations x 3 dates, MIA is missing for NYC and the DEN trips on day 3
+  # are scored as infinite.
+  assert stats.enumerated == 9
+  assert stats.missing_rows == 3
+  assert stats.evaluated == 6
+  assert stats.rejected == 1
+  assert stats.kept == len(results) == 2
+  assert set(stats.stages) >= {"uniqueness_check", "keep_only_relevant_records", "filters",
+                               "enumeration", "evaluation", "materialization"}
+  assert stats.cost_calls >= 1 and set(stats.latency_percentiles()) == {"p50", "p90", "p99", "max"}
+
+
+def test_stats_callback_progress_and_memory(trips, policy):
+  seen, calls = [], []
+
+  results = optimize(trips, ["destination", "date_from"], policy, {},
+                     lambda s: (s["total_price"] * s["travelers"]).sum(), 2, engine="loop",
+                     stats_callback=seen.append, trace_memory=True,
+                     progress=lambda done, total: calls.append((done, total)),
+                     progress_interval=3600)
+
+  assert isinstance(results, list) and len(seen) == 1
+  assert all("peak_mb" in x for x in seen[0].stages.values())
+  assert calls == [(8, 8)]
+  assert "8" in str(seen[0])
+
+
+@pytest.mark.skipif(not fork_available(), reason="Worker processes cannot be forked")
+def test_stats_of_worker_processes_are_merged(trips, policy):
+  cost = vectorized(lambda c: (c["total_price"] * c["travelers"]).sum(axis=0))
+
+  _, sequential = optimize(trips, ["destination", "date_from"], policy, {}, cost, 2,
+                           block_size=1, return_stats=True)
+  _, parallel = optimize(trips, ["destination", "date_from"], policy, {}, cost, 2,
+                         block_size=1, n_jobs=2, return_stats=True)
+
+  for name in COUNTERS + ("cost_calls",):
+    assert getattr(parallel, name) == getattr(sequential, name)
+
+
+def test_progress_is_throttled():
+  calls = []
+  progress = Progress(lambda done, total: calls.append(done), 100, interval=3600)
+
+  for _ in range(100):
+    progress.update()
+
+  assert calls == [100]
+
+
+def test_latency_samples_are_bounded():
+  stats = OptimizationStats()
+  for i in range(20_000):
+    stats.record_cost(i / 1e6, 1.0)
+
+  assert stats.cost_calls == stats.evaluated == 20_000
+  assert stats.latency_percentiles()["max"] <= 20.0
+  assert len(stats.as_dict()["cost_latency_ms"]) == 4
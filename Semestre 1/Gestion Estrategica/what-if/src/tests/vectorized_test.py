@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""Test cases for the vectorized (batch) evaluation engine."""
+
+# pylint: disable=wildcard-import, missing-function-docstring,
+# pylint: disable=redefined-outer-name, unused-wildcard-import
+# pylint: disable=bad-indentation
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from what_if.brute_force_general import optimize
+from what_if.cost_functions import vectorized
+from what_if.keep_n import KeepN
+from what_if.vectorized import evaluate_block
+from what_if.vectorized import push_block
+from what_if.vectorized import resolve_positions
+
+
+@pytest.fixture
+def trips():
+  """Two origins, two destinations, one missing record (Chicago -> LA)."""
+  return pd.DataFrame({
+    'origin': ['NYC', 'NYC', 'Chicago'],
+    'destination': ['Seattle', 'LA', 'Seattle'],
+    'total_price': [100.0, 50.0, 80.0],
+  })
+
+
+@pytest.fixture
+def policy():
+  return [{'origin': 'NYC', 'travelers': 2}, {'origin': 'Chicago', 'travelers': 1}]
+
+
+def test_resolve_positions_marks_missing_records(trips, policy):
+  scenarios = [{'destination': 'Seattle'}, {'destination': 'LA'}]
+
+  positions = resolve_positions(trips, policy, ['destination'], scenarios)
+
+  assert positions.tolist() == [[0, 1], [2, -1]]
+
+
+def test_evaluate_block_broadcasts_policy_columns(trips, policy):
+  scenarios = [{'destination': 'Seattle'}, {'destination': 'LA'}]
+  cost = vectorized(lambda c: (c['total_price'] * c['travelers']).sum(axis=0))
+
+  costs = evaluate_block(trips, policy, ['destination'], scenarios, cost)
+
+  assert costs.tolist() == [100.0 * 2 + 80.0, float('inf')]
+
+
+def test_vectorized_cost_keeps_the_row_wise_contract(trips):
+  cost = vectorized(lambda c: c['total_price'].sum(axis=0))
+
+  assert cost(trips) == 230.0
+
+
+def test_push_block_keeps_the_first_occurrence_of_equal_costs():
+  keep = KeepN(2)
+
+  push_block(keep, np.array([3.0, np.inf, 1.0, 3.0, 1.0, 2.0]), np.arange(10, 16))
+
+  assert keep.return_results() == [(12, 1.0), (15, 2.0)]
+
+
+def test_vectorized_engine_matches_the_loop_engine():
+  df = pd.DataFrame({
+    'City': ['Chicago', 'Chicago', 'Austin', 'Austin', 'Denver'],
+    'Team Name': ['Delta', 'Epsilon', 'Delta', 'Epsilon', 'Delta'],
+    'REWS Cost': [25000, 12000, 18000, 9000, 18000],
+  })
+  policies = [{'Team Name': 'Delta', 'quantity': 4}, {'Team Name': 'Epsilon', 'quantity': 8}]
+
+  loop = optimize(df, ['City'], policies, {},
+                  lambda s: (s['quantity'] * s['REWS Cost']).sum(), top_n=5, engine='loop')
+  batch = optimize(df, ['City'], policies, {},
+                   vectorized(lambda c: (c['quantity'] * c['REWS Cost']).sum(axis=0)),
+                   top_n=5, engine='vectorized', block_size=1)
+
+  assert [cost for _, cost in batch] == [cost for _, cost in loop] == [144000, 196000]
+  for (batch_df, _), (loop_df, _) in zip(batch, loop):
+    pd.testing.assert_frame_equal(batch_df, loop_df, check_dtype=False)
+
+
+def test_vectorized_engine_requires_a_vectorized_cost(trips, policy):
+  with pytest.raises(ValueError):
+    optimize(trips, ['destination'], policy, {}, lambda s: 0.0, engine='vectorized')
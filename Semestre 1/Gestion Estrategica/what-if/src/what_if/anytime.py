@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""Time-budgeted (anytime) optimization.
+
+With a `deadline` or a `max_evaluations` budget, `optimize()` evaluates the
+scenarios in a promising order and stops when the budget runs out, returning the
+best top-N found so far. For separable costs (see
+`what_if.cost_functions.separable`), every value of every parameter gets a
+marginal lower bound from the data: the sum, over the policy records, of the
+cheapest row each record can use with that value. The bound of a scenario is the
+largest marginal bound of its values; the scenarios are evaluated cheapest
+bound first, and the search is proven optimal as soon as the next bound exceeds
+the top-N threshold. Other cost functions are evaluated in enumeration order and
+are only proven optimal once every scenario has been evaluated. Equal costs are
+ranked by scenario index (see `KeepN`'s `order`), so a proven optimal run keeps
+the same ties as a full one.
+
+"""
+
+# pylint: disable=bad-indentation
+
+import time
+
+import numpy as np
+
+from what_if.branch_and_bound import COST, RECORD, code_column, record_costs
+from what_if.scenario_space import ScenarioSpace
+
+
+def marginal_bounds(costs, n_records, space):
+  """Lower bound of the cost of the scenarios taking every value of every
+  parameter.
+
+  Args:
+    costs: pandas.DataFrame, as returned by `record_costs()`.
+    n_records: int, the number of policy records.
+    space: ScenarioSpace, the scenario space.
+
+  Returns:
+    One float array per parameter, indexed like `space.values`. Values leaving a
+    policy record without any row are bounded by infinity.
+  """
+  answer = []
+  for parameter, size in zip(space.parameters, space.sizes):
+    column = code_column(parameter)
+    per_record = costs.groupby([RECORD, column])[COST].min()
+    bounds = per_record.groupby(level=column).agg(["sum", "count"])
+    bounds = bounds[bounds["count"] == n_records]
+    values = np.full(size, np.inf)
+    values[bounds.index.to_numpy(dtype=np.int64)] = bounds["sum"].to_numpy(dtype=float)
+    answer.append(values)
+  return answer
+
+
+# pylint: disable=too-many-arguments
+def cheapest_first(df, policies, space, cost_function, constraints=()):
+  """Reorders `space` by increasing lower bound (see `marginal_bounds()`).
+
+  Returns:
+    A `(space, bounds)` tuple: the reordered `ScenarioSpace` and the lower bound
+    of every one of its scenarios, in the same order. Scenarios with equal bounds
+    keep their enumeration order.
+  """
+  indices = np.asarray(space.indices, dtype=np.int64)
+  if not space.parameters or len(indices) == 0:
+    return space, np.zeros(len(indices))
+  costs = record_costs(df, policies, space, cost_function, constraints)
+  marginals = marginal_bounds(costs, len(policies), space)
+  codes = np.unravel_index(indices, space.sizes)
+  bounds = np.max([bound[code] for bound, code in zip(marginals, codes)], axis=0)
+  order = np.argsort(bounds, kind="stable")
+  return ScenarioSpace(space.parameters, space.values, indices[order]), bounds[order]
+
+
+class Budget:
+  """Evaluation budget of an anytime run: a wall-clock deadline and/or a
+  maximum number of scenarios evaluated."""
+
+  def __init__(self, deadline=None, max_evaluations=None, start=None):
+    """Class initializer.
+
+    Args:
+        deadline: float, optional. Seconds allowed, counted from `start`.
+        max_evaluations: int, optional. Maximum number of scenarios evaluated.
+        start: float, optional. `time.monotonic()` at the beginning of the run,
+            defaults to now.
+    """
+    if deadline is not None and deadline <= 0:
+      raise ValueError("The deadline should be a positive number of seconds.")
+    if max_evaluations is not None and max_evaluations <= 0:
+      raise ValueError("The maximum number of evaluations should be a positive integer.")
+    self.deadline = deadline
+    self.max_evaluations = max_evaluations
+    self.start = time.monotonic() if start is None else start
+    self.used = 0
+
+  def allowance(self, step):
+    """How many scenarios the next batch may evaluate, at most `step`; 0 once the
+    budget is exhausted."""
+    if self.deadline is not None and time.monotonic() - self.start >= self.deadline:
+      return 0
+    if self.max_evaluations is not None:
+      return max(min(step, self.max_evaluations - self.used), 0)
+    return step
+
+  def spend(self, count):
+    """Marks `count` scenarios as evaluated."""
+    self.used += count
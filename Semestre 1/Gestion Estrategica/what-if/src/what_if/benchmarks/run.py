@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+"""Benchmarks of the optimization routine.
+
+Every case generates synthetic data (see `what_if.benchmarks.synthetic`), then
+times the stages of the routine: filtering the relevant records, applying the
+filters, enumerating the scenarios, keeping the top-N and `optimize()` with each
+engine. For every stage the report holds the best wall time over a few repeats,
+the peak memory allocated (traced in a separate run) and, for the enumeration
+and the optimization, the number of scenarios per second.
+
+The results are compared against a baseline JSON file; a stage slower or
+hungrier than its baseline by more than the tolerance is reported as a
+regression.
+
+>>> python -m what_if.benchmarks.run --cases tne-small hc-small
+>>> python -m what_if.benchmarks.run --update   # stores a new baseline
+
+"""
+
+# pylint: disable=bad-indentation
+
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from what_if.benchmarks import synthetic
+from what_if.brute_force_general import enumerate_present_parameters
+from what_if.brute_force_general import enumerate_scenarios
+from what_if.brute_force_general import keep_only_filters
+from what_if.brute_force_general import keep_only_relevant_records
+from what_if.brute_force_general import optimize
+from what_if.cost_functions import separable
+from what_if.keep_n import KeepN
+
+BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_TOLERANCE = 0.5
+# Absolute slack added to the tolerance, so that noise on very short or very
+# small stages is not reported as a regression.
+SLACK = {"seconds": 0.005, "peak_mb": 0.5}
+DEFAULT_REPEAT = 5
+
+CASES = {
+  "tne-small": {
+    "kind": "tne", "size": {"origins": 3, "destinations": 5, "days": 10, "max_nights": 3},
+    "policies": 2, "engines": ("loop", "vectorized", "branch_and_bound", "k_best"),
+  },
+  "tne-medium": {
+    "kind": "tne", "size": {"origins": 6, "destinations": 10, "days": 30, "max_nights": 5},
+    "policies": 4, "engines": ("vectorized", "branch_and_bound", "k_best"),
+  },
+  "tne-large": {
+    "kind": "tne", "size": {"origins": 12, "destinations": 20, "days": 60, "max_nights": 7},
+    "policies": 8, "engines": ("vectorized", "branch_and_bound", "k_best"),
+  },
+  "hc-small": {
+    "kind": "hc", "size": {"cities": 5, "teams": 8},
+    "policies": 3, "engines": ("loop", "vectorized", "branch_and_bound", "k_best"),
+  },
+  "hc-large": {
+    "kind": "hc", "size": {"cities": 50, "teams": 2000},
+    "policies": 1000, "engines": ("vectorized", "branch_and_bound", "k_best"),
+  },
+}
+
+TNE = {
+  "parameters": ["destination", "date_from", "date_to"],
+  "cost": lambda s: s["total_price"] * s["travelers"],
+}
+HC = {
+  "parameters": ["City"],
+  "cost": lambda s: s["REWS Cost"] * s["quantity"],
+}
+
+
+def build_case(case):
+  """Data frame, parameters, policy records, filters and cost function of a case."""
+  if case["kind"] == "tne":
+    # One row per trip, the cheapest hotel, as in `src/tests/scenarios_test.py`.
+    df = (
+      synthetic.tne_data(**case["size"])
+      .drop(["address", "amenities", "hotel_name"], axis=1)
+      .groupby(["origin", "destination", "date_from", "date_to"])
+      .aggregate("min")
+      .reset_index()
+    )
+    policies = synthetic.tne_policies(df, case["policies"])
+    dates = sorted(set(df["date_from"]))
+    filters = {"date_from": dates[: max(len(dates) // 2, 1)]}
+    return df, TNE["parameters"], policies, filters, separable(TNE["cost"])
+  df = synthetic.hc_data(**case["size"])
+  policies = synthetic.hc_policies(df, case["policies"])
+  filters = {"City": sorted(set(df["City"]))}
+  return df, HC["parameters"], policies, filters, separable(HC["cost"])
+
+
+def measure(function, repeat=DEFAULT_REPEAT):
+  """Best wall time over `repeat` calls of `function` and peak memory (MB) of an
+  additional traced call."""
+  seconds = float("inf")
+  for _ in range(repeat):
+    start = time.perf_counter()
+    function()
+    seconds = min(seconds, time.perf_counter() - start)
+  tracemalloc.start()
+  try:
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+  return {"seconds": seconds, "peak_mb": peak / 2**20}
+
+
+def run_case(case, repeat=DEFAULT_REPEAT, top_n=3):
+  """Timings of the stages of a case, keyed by stage name."""
+  df, parameters, policies, filters, cost = build_case(case)
+  relevant = keep_only_relevant_records(df, policies)
+  filtered = keep_only_filters(relevant, filters)
+  scenarios = len(enumerate_present_parameters(filtered, policies, parameters))
+  costs = np.random.default_rng(0).permutation(100_000).astype(float)
+
+  def keep_n():
+    keep = KeepN(top_n)
+    for i, x in enumerate(costs):
+      keep.add_item((i, x))
+
+  stages = {
+    "keep_only_relevant_records": measure(
+      lambda: keep_only_relevant_records(df, policies), repeat),
+    "keep_only_filters": measure(lambda: keep_only_filters(relevant, filters), repeat),
+    "enumerate_scenarios": measure(
+      lambda: sum(1 for _ in enumerate_scenarios(filtered, policies, parameters)), repeat),
+    "keep_n": measure(keep_n, repeat),
+  }
+  stages["enumerate_scenarios"]["scenarios_per_sec"] = (
+    len(enumerate_scenarios(filtered, policies, parameters))
+    / stages["enumerate_scenarios"]["seconds"]
+  )
+  stages["keep_n"]["items_per_sec"] = len(costs) / stages["keep_n"]["seconds"]
+  for engine in case["engines"]:
+    stage = measure(
+      lambda engine=engine: optimize(df, parameters, policies, filters, cost, top_n,
+                                     engine=engine),
+      repeat,
+    )
+    stage["scenarios_per_sec"] = scenarios / stage["seconds"]
+    stages[f"optimize[{engine}]"] = stage
+  return {"rows": len(df), "policies": len(policies), "scenarios": scenarios,
+          "stages": stages}
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+  """Regressions of `results` against `baseline`, as readable messages.
+
+  A stage regresses when its time or peak memory exceeds the baseline by more
+  than `tolerance` (a fraction) plus `SLACK`. Cases and stages missing from the baseline are
+  not compared."""
+  regressions = []
+  for name, result in results.items():
+    reference = baseline.get("cases", {}).get(name)
+    if reference is None:
+      continue
+    for stage, values in result["stages"].items():
+      expected = reference["stages"].get(stage)
+      if expected is None:
+        continue
+      for metric in ("seconds", "peak_mb"):
+        if values[metric] > expected[metric] * (1 + tolerance) + SLACK[metric]:
+          regressions.append(
+            f"{name} {stage}: {metric} {values[metric]:.4g} vs baseline {expected[metric]:.4g}"
+          )
+  return regressions
+
+
+def report(results):
+  """Human readable table of the results."""
+  lines = []
+  for name, result in results.items():
+    lines.append(f"{name}: {result['rows']} rows, {result['policies']} policy records, "
+                 f"{result['scenarios']} scenarios")
+    for stage, values in result["stages"].items():
+      rate = values.get("scenarios_per_sec", values.get("items_per_sec"))
+      rate = f"{rate:14,.0f}/s" if rate is not None else ""
+      lines.append(f"  {stage:28} {values['seconds'] * 1000:10.2f} ms "
+                   f"{values['peak_mb']:9.2f} MB {rate}")
+  return "\n".join(lines)
+
+
+def main(argv=None):
+  """Command line entry point. Returns 1 when a regression is found."""
+  parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+  parser.add_argument("--cases", nargs="+", default=list(CASES),
+                      choices=sorted(CASES))
+  parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+  parser.add_argument("--baseline", type=Path, default=BASELINE)
+  parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+  parser.add_argument("--update", action="store_true",
+                      help="store the results as the new baseline")
+  args = parser.parse_args(argv)
+  logging.getLogger().setLevel(logging.WARNING)
+
+  results = {name: run_case(CASES[name], args.repeat) for name in args.cases}
+  print(report(results))
+
+  if args.update:
+    baseline = {"python": platform.python_version(), "machine": platform.machine(),
+                "cases": results}
+    if args.baseline.exists():
+      previous = json.loads(args.baseline.read_text(encoding="utf-8"))
+      baseline["cases"] = previous.get("cases", {}) | results
+    args.baseline.write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
+    return 0
+  if not args.baseline.exists():
+    print(f"No baseline at {args.baseline}, run with --update to create one.")
+    return 0
+  regressions = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")),
+                        args.tolerance)
+  for line in regressions:
+    print(f"REGRESSION {line}")
+  return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+"""Synthetic data for the benchmarks of the optimization routine.
+
+The generators produce data frames with the columns of the sample files shipped
+in `./data` (`sample_tne_data_flights_and_hotel_combined.csv` and
+`sample_HC_data.csv`), with as many origins, destinations, dates, teams or
+cities as asked for, and the matching policy records. Prices are drawn from a
+seeded generator so every run sees the same data.
+
+"""
+
+# pylint: disable=bad-indentation
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+CITIES = ("NYC", "Los Angeles", "Chicago", "Seattle", "Miami", "Austin", "Denver", "Boston")
+TEAMS = ("Alpha", "Beta", "Gamma", "Delta", "Epsilon", "Zeta", "Eta", "Theta")
+
+
+def names(base, count):
+  """`count` distinct names, cycling over `base` with a numeric suffix."""
+  return [
+    base[i % len(base)] if i < len(base) else f"{base[i % len(base)]} {i // len(base)}"
+    for i in range(count)
+  ]
+
+
+# pylint: disable=too-many-arguments
+def tne_data(origins=4, destinations=6, days=30, max_nights=5,
+             stars=(4, 5), start=date(2024, 1, 1), seed=0):
+  """Flights and hotels combined, in the shape of
+  `sample_tne_data_flights_and_hotel_combined.csv`.
+
+  There is one row per origin, destination (different from the origin),
+  departure date, number of nights (1 to `max_nights`) and hotel category. The
+  dates are ISO formatted strings, as read from the sample file.
+
+  Args:
+    origins: int, number of origin cities.
+    destinations: int, number of destination cities.
+    days: int, number of departure dates, starting on `start`.
+    max_nights: int, longest stay.
+    stars: Sequence[int], hotel categories.
+    start: datetime.date, first departure date.
+    seed: int, seed of the price generator.
+  """
+  rng = np.random.default_rng(seed)
+  cities = names(CITIES, max(origins, destinations))
+  dates = [start + timedelta(days=i) for i in range(days + max_nights)]
+
+  origin, destination, date_from, nights, category = (
+    x.ravel() for x in np.meshgrid(
+      np.arange(origins), np.arange(destinations), np.arange(days),
+      np.arange(1, max_nights + 1), np.array(stars), indexing="ij",
+    )
+  )
+  keep = origin != destination
+  origin, destination = origin[keep], destination[keep]
+  date_from, nights, category = date_from[keep], nights[keep], category[keep]
+
+  flight_price = rng.integers(150, 600, size=(origins, destinations, days))
+  flight_price = flight_price[origin, destination, date_from].astype(float)
+  hotel_price = (rng.integers(80, 350, size=len(origin)) * category / 4 * nights).round()
+  iso = np.array([x.isoformat() for x in dates])
+  city = np.array(cities)
+
+  return pd.DataFrame({
+    "origin": city[origin],
+    "destination": city[destination],
+    "date_from": iso[date_from],
+    "date_to": iso[date_from + nights],
+    "flight_price": flight_price,
+    "hotel_name": "Null",
+    "stars": category.astype(float),
+    "address": "Null",
+    "amenities": "Null",
+    "hotel_price": hotel_price,
+    "total_price": flight_price + hotel_price,
+  })
+
+
+def tne_policies(df, count=2, travelers=(4, 8)):
+  """Policy records of the travel and expenses data: `count` origins of `df`,
+  each with a number of travelers."""
+  origins = list(dict.fromkeys(df["origin"]))[:count]
+  return [{"origin": x, "travelers": travelers[i % len(travelers)]}
+          for i, x in enumerate(origins)]
+
+
+def hc_data(cities=5, teams=8, seed=0):
+  """Head count data, in the shape of `sample_HC_data.csv`: one row per city
+  and team."""
+  rng = np.random.default_rng(seed)
+  city, team = (x.ravel() for x in np.meshgrid(np.arange(cities), np.arange(teams),
+                                               indexing="ij"))
+  size = rng.integers(10, 40, size=len(city))
+  capacity = rng.integers(150, 400, size=len(city))
+  return pd.DataFrame({
+    "City": np.array(names(CITIES, cities))[city],
+    "Team Name": np.array(names(TEAMS, teams))[team],
+    "Team Size": size,
+    "Headquarter Capacity": capacity,
+    "Utilized Seats": (capacity * rng.uniform(0.5, 0.9, size=len(city))).astype(int),
+    "REWS Cost": rng.integers(5, 30, size=len(city)) * 1000,
+  })
+
+
+def hc_policies(df, count=2, quantities=(4, 8)):
+  """Policy records of the head count data: `count` teams of `df`, each with a
+  quantity."""
+  teams = list(dict.fromkeys(df["Team Name"]))[:count]
+  return [{"Team Name": x, "quantity": quantities[i % len(quantities)]}
+          for i, x in enumerate(teams)]
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""Branch-and-bound engine for separable cost functions.
+
+When the cost of a scenario is the sum of a cost per policy record (see
+`what_if.cost_functions.separable`), fixing the first parameters of a scenario
+bounds the cost of every scenario sharing them: every policy record pays at
+least the cheapest of the rows still available to it. The engine explores the
+scenario space depth-first, in enumeration order, and prunes every subtree whose
+lower bound cannot beat the threshold of the top-N structure. The results are
+the ones of the brute-force engines, ties included.
+
+"""
+
+# pylint: disable=bad-indentation
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from what_if.constraints import row_mask, satisfied
+from what_if.key_index import KeyIndex
+from what_if.vectorized import key_columns
+
+RECORD = "__what_if_record__"
+COST = "__what_if_cost__"
+
+
+def code_column(parameter):
+  """Name of the column holding the codes of `parameter` in `record_costs()`."""
+  return f"__what_if_code_{parameter}__"
+
+
+def record_costs(df, policies, space, cost_function, constraints=()):
+  """Cost of every row of `df` usable by every policy record.
+
+  Args:
+    df: pandas.DataFrame, the (filtered) data.
+    policies: List[dict], the policy records.
+    space: ScenarioSpace, the scenario space explored.
+    cost_function: SeparableCost, the cost of a record.
+    constraints: List of constraints (see `what_if.constraints`). The pairs
+        breaking a record-level constraint are left out.
+
+  Returns:
+    A data frame with one row per usable (policy record, row of `df`) pair,
+    holding the position of the policy record, the position of the value of
+    every parameter in `space.values` and the cost of the record.
+  """
+  parameters = list(space.parameters)
+  keys = [x for x in key_columns(df, parameters, policies) if x not in parameters]
+  records = pd.DataFrame(list(policies), index=range(len(policies)))
+  records = records.drop(columns=[x for x in parameters if x in records.columns]).assign(
+    **{RECORD: np.arange(len(records))}
+  )
+  if keys:
+    matched = records.merge(df, on=keys, how="inner")
+  else:
+    matched = records.merge(df, how="cross")
+  mask = row_mask(matched, constraints)
+  if mask is not None:
+    matched = matched[np.asarray(mask)]
+
+  answer = pd.DataFrame({RECORD: matched[RECORD].to_numpy()})
+  for parameter, values in zip(parameters, space.values):
+    answer[code_column(parameter)] = pd.Index(values).get_indexer(matched[parameter])
+  answer[COST] = cost_function.row_costs(matched)
+  return answer
+
+
+def prefix_bounds(costs, n_records, parameters):
+  """Lower bounds of the cost of the scenarios sharing the same first parameters.
+
+  Returns:
+    One dictionary per depth `d` (number of parameters fixed minus one), mapping
+    the codes of the first `d` parameters to the list of `(code, lower bound)`
+    of the values the next parameter can take, in enumeration order. Prefixes
+    leaving a policy record without any row are left out. At the last depth, the
+    lower bound is the cost of the scenario, summed record by record in record
+    order like `SeparableCost.total()` (the sums of `groupby` are compensated, and
+    may differ from it in the last bit).
+  """
+  levels = []
+  for depth in range(1, len(parameters) + 1):
+    columns = [code_column(x) for x in parameters[:depth]]
+    per_record = costs.groupby([RECORD] + columns)[COST].min()
+    bounds = per_record.groupby(level=columns).agg(["sum", "count"])
+    bounds = bounds[bounds["count"] == n_records]
+    sums = bounds["sum"].to_numpy()
+    if depth == len(parameters) and len(bounds):
+      table = per_record.unstack(RECORD).loc[bounds.index].to_numpy(dtype=float)
+      sums = np.zeros(len(table))
+      for record in range(table.shape[1]):
+        sums = sums + table[:, record]
+
+    children = {}
+    for prefix, bound in zip(bounds.index, sums):
+      prefix = prefix if isinstance(prefix, tuple) else (prefix,)
+      children.setdefault(tuple(int(x) for x in prefix[:-1]), []).append(
+        (int(prefix[-1]), float(bound))
+      )
+    levels.append(children)
+  return levels
+
+
+# pylint: disable=too-many-arguments
+def branch_and_bound(df, policies, space, cost_function, keep, constraints=(), index=None,
+                     stats=None):
+  """Finds the best scenarios of `space` and accumulates them in `keep`.
+
+  The record-level `constraints` remove rows before the bounds are computed. The
+  other ones (see `what_if.constraints.AggregateCap`) do not change the bounds
+  and are checked on the scenarios reaching the top-N threshold, realized with
+  `index` (a `KeyIndex` of `df`).
+
+  The items kept are `(scenario index, cost)` tuples, see
+  `ScenarioSpace.scenario()`. The scenarios reaching a leaf of the search are
+  counted as evaluated in `stats` (a `what_if.stats.OptimizationStats`) when
+  given.
+  """
+  if not space.parameters:
+    raise ValueError("The branch-and-bound engine requires at least one parameter.")
+  start = time.perf_counter()
+  costs = record_costs(df, policies, space, cost_function, constraints)
+  if stats is not None:
+    stats.record_call(time.perf_counter() - start)
+  levels = prefix_bounds(costs, len(policies), list(space.parameters))
+  last = len(levels) - 1
+  aggregates = [x for x in constraints if not x.row_level]
+  if aggregates and index is None:
+    index = KeyIndex(df, key_columns(df, space.parameters, policies))
+
+  def feasible(position):
+    if stats is not None:
+      stats.evaluated += 1
+    if not aggregates:
+      return True
+    scenario = space.scenario(position)
+    if satisfied(index.realize([pol | scenario for pol in policies]), aggregates):
+      return True
+    if stats is not None:
+      stats.rejected += 1
+    return False
+
+  def search(prefix, depth):
+    for code, bound in levels[depth].get(prefix, ()):
+      if not bound < keep.threshold:
+        continue
+      if depth == last:
+        position = space.index_of(prefix + (code,))
+        if feasible(position):
+          keep.add_item((position, bound))
+      else:
+        search(prefix + (code,), depth + 1)
+
+  search((), 0)
@@ -12,20 +12,54 @@ This module has a single function necessary for the optimization of the routine
 # pylint: disable=bad-indentation
 
 import logging
+import time
 from functools import reduce
-from itertools import product
 from typing import Sequence
 
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
 
+from what_if.anytime import Budget, cheapest_first
+from what_if.branch_and_bound import branch_and_bound
+from what_if.checkpoint import Checkpoint, fingerprint
+from what_if.constraints import filter_data, satisfied, split_constraints
+from what_if.cost_functions import SeparableCost, VectorizedCost
+from what_if.decomposition import decompose, realize_rows
+from what_if.k_best import k_best
 from what_if.keep_n import KeepN
+from what_if.key_index import KeyIndex
+from what_if.parallel import fork_available, map_shards, resolve_n_jobs
+from what_if.pareto import (
+  ParetoFront,
+  as_objectives,
+  evaluate_objectives,
+  label_scenario,
+  vectorized_objectives,
+)
+from what_if.scenario_space import PolicyScenarios, ScenarioSpace
+from what_if.stats import OptimizationStats, Progress
+from what_if.vectorized import (
+  DEFAULT_BLOCK_SIZE,
+  key_columns,
+  optimize_in_blocks,
+  resolve_positions,
+)
 
 # Setting up basic configuration for logging
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+ENGINES = ("auto", "loop", "vectorized", "branch_and_bound", "k_best")
+# Engines exploring the scenarios in their own order, from per-record costs.
+SEARCH_ENGINES = ("branch_and_bound", "k_best")
+# Scenarios evaluated between two checks of the budget by the loop engine.
+ANYTIME_STEP = 64
+DEFAULT_CHECKPOINT_EVERY = 100_000
+
+_RECORD = "__what_if_record__"
+_SCENARIO = "__what_if_scenario__"
+
 
 # pylint: disable=too-many-arguments
 def optimize(
@@ -35,6 +69,23 @@ def optimize(
   filters,
   cost_function,
   top_n=3,
+  engine="auto",
+  block_size=DEFAULT_BLOCK_SIZE,
+  n_jobs=1,
+  checkpoint=None,
+  checkpoint_every=DEFAULT_CHECKPOINT_EVERY,
+  record_parameters=None,
+  feasible=None,
+  constraints=None,
+  return_stats=False,
+  stats_callback=None,
+  trace_memory=False,
+  progress=None,
+  progress_interval=1.0,
+  deadline=None,
+  max_evaluations=None,
+  cache=None,
+  keep_ties=False,
 ):
   """Optimization routine. For more information, consult the documentation at README.md.
 
@@ -54,55 +105,390 @@ def optimize(
     cost_function: Callable[[pd.Series], float]
         Cost function to be applied to a scenario to compute the cost of acting on the scenario.
         The optimization routine will return the approximate smallest value
-        for the results of this function.
+        for the results of this function. Several objectives can be given as a
+        mapping of names to cost functions: the routine then
+        returns the Pareto-optimal scenarios (see `what_if.pareto`), with the
+        loop or vectorized engine only.
     top_n: int
-        How many results do you want returned?
+        How many results do you want returned? Ignored with several objectives,
+        where the whole Pareto front is returned.
+    engine: str
+        How the scenarios are evaluated. "loop" merges and scores every scenario
+        one by one with the row-wise cost function. "vectorized" evaluates blocks
+        of scenarios with a single merge and requires a cost function declared with
+        `what_if.cost_functions.vectorized`. "branch_and_bound" explores the
+        scenarios depth-first and prunes the ones that cannot make it to the top-N;
+        it requires a cost function declared with `what_if.cost_functions.separable`.
+        "k_best" reads the rows of every policy record in order of cost and stops
+        as soon as no unseen scenario can enter the top-N (see `what_if.k_best`);
+        it also requires a separable cost function.
+        "auto" (default) picks "vectorized" whenever the cost function allows it.
+    block_size: int
+        How many scenarios the vectorized engine evaluates at once.
+    n_jobs: int
+        How many processes evaluate the scenarios. The scenario space is split in
+        shards evaluated by forked workers, each keeping a local top-N which are
+        merged at the end; the results are the same as with a single process.
+        -1 uses every CPU. Defaults to 1 (no worker process). The branch-and-bound
+        and k-best engines always run in a single process.
+    checkpoint: str or os.PathLike, optional
+        Local file where the progress is saved (see `what_if.checkpoint`). When the
+        file exists, the optimization resumes from it; it is refused if the data,
+        policies, parameters, `top_n`, engine or constraints changed. Not
+        supported by the branch-and-bound and k-best engines.
+    checkpoint_every: int
+        How many scenarios are evaluated between two checkpoints.
+    record_parameters: List[str], optional
+        Parameters (among `parameters`) chosen independently for every policy
+        record, instead of being shared by all of them. Requires a cost function
+        declared with `what_if.cost_functions.separable`; the scenarios are found
+        by the decomposition solver of `what_if.decomposition`, in a single process
+        and without checkpoints. The rows of the results follow the order of the
+        policy records.
+    feasible: Callable[[pd.DataFrame], bool], optional
+        Constraints coupling the records when `record_parameters` are given (for
+        instance the capacity of an office shared by several records). Called on
+        every candidate scenario; the rejected ones are skipped.
+    constraints: List, optional
+        Declarative constraints (see `what_if.constraints`), checked before the
+        cost function is called. Record-level constraints only reading columns of
+        `df` are applied to the data before the scenarios are enumerated; the
+        others reject infeasible scenarios in every engine.
+    return_stats: bool
+        Whether to also return the statistics of the run (see
+        `what_if.stats.OptimizationStats`): wall time per stage, scenarios
+        enumerated, missing a record, rejected, evaluated and kept, and latency
+        percentiles of the cost function.
+    stats_callback: Callable[[OptimizationStats], None], optional
+        Called with the statistics at the end of the run, e.g. `logging.info`.
+    trace_memory: bool
+        Whether the statistics include the peak memory of every stage (traced
+        with `tracemalloc`, which slows the run down).
+    progress: Callable[[int, int], None], optional
+        Progress hook, called with the number of scenarios evaluated and the
+        total at most once every `progress_interval` seconds, and at the end.
+    progress_interval: float
+        Minimum number of seconds between two calls to `progress`.
+    deadline: float, optional
+        Time budget of the run, in seconds. The scenarios are evaluated in a
+        promising order (see `what_if.anytime`) until the budget runs out, and
+        the best top-N found so far is returned. The statistics tell whether the
+        results are proven optimal and how many scenarios were left unexplored.
+        Among scenarios of equal cost, the one kept may differ from a full run.
+    max_evaluations: int, optional
+        Budget of the run, as a maximum number of scenarios evaluated. Can be
+        combined with `deadline`.
+    cache: CostCache, optional
+        Persistent cache of the costs (see `what_if.cost_cache`). The cost of a
+        scenario already evaluated with the same cost function and the same rows,
+        by this run or a previous one, is looked up instead of computed. Used by
+        the loop and vectorized engines.
+    keep_ties: bool
+        Whether scenarios with the same cost as a scenario kept are kept too
+        (see `KeepN`). By default, only the first scenario (in enumeration
+        order) of every cost is returned.
 
   Returns:
     A list of `top_n` tuples (the values and the associated cost as computed by `target_calculation`).
+    With several objectives, the tuples of the Pareto front, in lexicographic
+    order of their costs: the values, with a column per objective, and the tuple
+    of the costs. With `return_stats`, a `(results, stats)` tuple.
   """
+  started = time.monotonic()
   # We keep only the columns we care about
   try:
-    if not set(parameters).issubset(set(df.columns)):
-      raise ValueError("Columns provided in parameters does not match with dataset columns")
+    if engine not in ENGINES:
+      raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    objectives = as_objectives(cost_function)
+    if objectives is not None:
+      if (engine in SEARCH_ENGINES or record_parameters or checkpoint is not None
+          or cache is not None or deadline is not None or max_evaluations is not None):
+        raise ValueError("Several objectives are only supported by the loop and vectorized "
+                         "engines, without record parameters, checkpoints, cache nor budget")
+      cost_function = objectives
+      vectorizable = vectorized_objectives(objectives)
+    else:
+      vectorizable = isinstance(cost_function, VectorizedCost)
+    if engine == "vectorized" and not vectorizable:
+      raise ValueError("The vectorized engine requires a cost function declared with "
+                       "what_if.cost_functions.vectorized")
+    if engine in SEARCH_ENGINES and not isinstance(cost_function, SeparableCost):
+      raise ValueError(f"The {engine} engine requires a cost function declared with "
+                       "what_if.cost_functions.separable")
+    if checkpoint is not None and engine in SEARCH_ENGINES:
+      raise ValueError(f"The {engine} engine does not support checkpoints")
+    if checkpoint_every <= 0:
+      raise ValueError("The checkpoint interval should be a positive integer.")
+    if record_parameters:
+      if not set(record_parameters).issubset(parameters):
+        raise ValueError("The record parameters should be part of the parameters")
+      if not isinstance(cost_function, SeparableCost):
+        raise ValueError("Record parameters require a cost function declared with "
+                         "what_if.cost_functions.separable")
+      if engine != "auto" or checkpoint is not None:
+        raise ValueError("Record parameters are optimized by the decomposition solver, "
+                         "without engine choice nor checkpoints")
+    elif feasible is not None:
+      raise ValueError("The feasibility check requires record parameters")
+    anytime = deadline is not None or max_evaluations is not None
+    if anytime and (checkpoint is not None or record_parameters):
+      raise ValueError("A deadline or a maximum number of evaluations cannot be combined "
+                       "with checkpoints or record parameters")
+    budget = Budget(deadline, max_evaluations, started) if anytime else None
+
+    stats = OptimizationStats(trace_memory=trace_memory)
+    df, constraints = prepare_data(df, parameters, policies, filters, constraints, stats)
+
+    # Optimization
+    def empty_store():
+      if objectives is not None:
+        return ParetoFront(list(objectives))
+      if anytime:
+        # Visited cheapest first: ties are ranked by scenario, as in enumeration order.
+        return KeepN(top_n, keep_ties, order=lambda item: item[0])
+      return KeepN(top_n, keep_ties)
+
+    answer = empty_store()
+    if record_parameters:
+      with stats.stage("enumeration"):
+        shared = [x for x in parameters if x not in record_parameters]
+        scenarios = enumerate_present_parameters(df, policies, shared)
+      stats.enumerated = scenarios.size
+      stats.missing_rows = scenarios.size - len(scenarios)
+      with stats.stage("evaluation"):
+        decompose(df, policies, scenarios, record_parameters, cost_function, answer, feasible,
+                  constraints, stats)
+      with stats.stage("materialization"):
+        results = []
+        for rows, cost in answer.return_results():
+          scenario = realize_rows(df, policies, rows)
+          scenario["total_cost"] = cost
+          results.append((scenario, cost))
+      return _finish(results, stats, return_stats, stats_callback)
+
+    with stats.stage("enumeration"):
+      scenarios = enumerate_present_parameters(df, policies, parameters)
+    stats.enumerated = scenarios.size
+    stats.missing_rows = scenarios.size - len(scenarios)
+    logging.info("Evaluating %d scenarios, skipped %d dead combinations of parameters",
+                 len(scenarios), scenarios.size - len(scenarios))
+    use_vectorized = engine != "loop" and vectorizable
+    with stats.stage("index"):
+      index = KeyIndex(df, key_columns(df, parameters, policies))
+    tracker = Progress(progress, len(scenarios), progress_interval) if progress else None
+    scope = None
+    if cache is not None and engine not in SEARCH_ENGINES:
+      with stats.stage("cache"):
+        scope = cache.scope(cost_function, index.df, policies)
+
+    def evaluate_shard(shard):
+      keep, shard_stats = empty_store(), OptimizationStats()
+      evaluate_scenarios(index, policies, shard, cost_function, keep, use_vectorized,
+                         block_size, constraints=constraints, stats=shard_stats, cache=scope)
+      return keep.return_results(), shard_stats
+
+    n_jobs = resolve_n_jobs(n_jobs)
+    if n_jobs > 1 and not fork_available():
+      logging.warning("Worker processes cannot be forked on this platform, "
+                      "evaluating the scenarios in a single process.")
+      n_jobs = 1
+
+    def evaluate(space):
+      if n_jobs > 1:
+        for results, shard_stats in map_shards(evaluate_shard, space, n_jobs):
+          for item in results:
+            answer.add_item(item)
+          stats.merge(shard_stats)
+        if tracker is not None:
+          tracker.update(len(space))
+      else:
+        evaluate_scenarios(index, policies, space, cost_function, answer, use_vectorized,
+                           block_size, tracker, constraints, stats, scope)
+
+    with stats.stage("evaluation"):
+      if anytime:
+        bounds = None
+        if isinstance(cost_function, SeparableCost):
+          scenarios, bounds = cheapest_first(df, policies, scenarios, cost_function,
+                                             constraints)
+        step = (block_size if use_vectorized else ANYTIME_STEP) * n_jobs
+        cursor, proven = 0, False
+        while cursor < len(scenarios):
+          # A scenario costing the threshold can still displace a later tie.
+          if bounds is not None and (bounds[cursor] > answer.threshold or
+                                     bounds[cursor] == np.inf):
+            proven = True
+            break
+          count = budget.allowance(step)
+          if count == 0:
+            break
+          chunk = scenarios[cursor:cursor + count]
+          evaluate(chunk)
+          budget.spend(len(chunk))
+          cursor += len(chunk)
+        stats.remaining = 0 if proven else len(scenarios) - cursor
+        stats.proven_optimal = stats.remaining == 0
+        if not stats.proven_optimal:
+          logging.info("Budget exhausted after %d scenarios, %d left unexplored",
+                       cursor, stats.remaining)
+      elif engine == "branch_and_bound":
+        branch_and_bound(df, policies, scenarios, cost_function, answer, constraints, index,
+                         stats)
+        if tracker is not None:
+          tracker.update(len(scenarios))
+      elif engine == "k_best":
+        k_best(df, policies, scenarios, cost_function, answer, constraints, index, stats)
+        if tracker is not None:
+          tracker.update(len(scenarios))
+      elif checkpoint is not None:
+        store = Checkpoint(checkpoint, fingerprint(
+          df, parameters, policies, top_n, "vectorized" if use_vectorized else "loop",
+          keep_ties, constraints
+        ))
+        cursor = store.restore(answer)
+        if cursor:
+          logging.info("Resuming from checkpoint %s at scenario %d", checkpoint, cursor)
+          if tracker is not None:
+            tracker.update(cursor)
+        while cursor < len(scenarios):
+          chunk = scenarios[cursor:cursor + checkpoint_every]
+          evaluate(chunk)
+          cursor += len(chunk)
+          store.save(cursor, answer)
+      else:
+        evaluate(scenarios)
+
+    # Only the scenarios returned are realized as data frames.
+    with stats.stage("materialization"):
+      if objectives is not None:
+        results = [
+          (label_scenario(index.realize(merge_scenario_parameter_with_policy(
+            scenarios.scenario(position), policies)), answer.names, costs), costs)
+          for position, costs in answer.return_results()
+        ]
+      else:
+        results = [
+          (realize_scenario(index, scenarios.scenario(position), policies, cost), cost)
+          for position, cost in answer.return_results()
+        ]
+    return _finish(results, stats, return_stats, stats_callback)
 
-    # Columns in use for the policy
-    policy_columns = list(
-          reduce(lambda x, y: set(x).union(set(y)), [x.keys() for x in policies])
-      )
+  except Exception as err:
+    raise ValueError(f"An unexpected error occured during optimization: {err}") from err
 
-      # We need to match on at least one column.
-    if not set(policy_columns).intersection(set(df.columns)) != set():
-      raise ValueError("No common columns found between policy_columns and df.columns")
 
-    common_columns = list(set(parameters + policy_columns).intersection(df.columns))
+# pylint: disable=too-many-arguments
+def prepare_data(df, parameters, policies, filters, constraints=None, stats=None):
+  """Validates the inputs of `optimize()` and keeps the records of `df` the
+  scenarios can use: the ones tied to a policy record, passing the `filters` and
+  the record-level `constraints` only reading columns of `df`.
+
+  Returns:
+    A `(df, constraints)` tuple: the records kept and the constraints left to
+    check on the scenarios. The stages are timed in `stats` (a
+    `what_if.stats.OptimizationStats`) when given.
+  """
+  if stats is None:
+    stats = OptimizationStats()
+  if not set(parameters).issubset(set(df.columns)):
+    raise ValueError("Columns provided in parameters does not match with dataset columns")
+
+  # Columns in use for the policy
+  policy_columns = list(
+        reduce(lambda x, y: set(x).union(set(y)), [x.keys() for x in policies])
+    )
+
+    # We need to match on at least one column.
+  if not set(policy_columns).intersection(set(df.columns)) != set():
+    raise ValueError("No common columns found between policy_columns and df.columns")
+
+  with stats.stage("uniqueness_check"):
+    common_columns = list(set(list(parameters) + policy_columns).intersection(df.columns))
     group_counts = df.groupby(common_columns).count().max().max()
-    if not group_counts==1:
-      raise ValueError("Group count is not equal to 1")
+  if not group_counts==1:
+    raise ValueError("Group count is not equal to 1")
 
-      # Remove any record which does not belong to the policy
+    # Remove any record which does not belong to the policy
+  with stats.stage("keep_only_relevant_records"):
     df = keep_only_relevant_records(df, policies)
+  with stats.stage("filters"):
     if filters:
       df = keep_only_filters(df, filters)
+    data_constraints, constraints = split_constraints(constraints, df.columns)
+    df = filter_data(df, data_constraints)
+  return df, constraints
 
-    # Optimization
-    answer = KeepN(top_n)
-    all_scenarios = enumerate_scenarios(df, policies, parameters)
-    for scenario in tqdm(all_scenarios):
-      answer.add_item(apply_cost_function(df, scenario, cost_function))
 
-    return answer.return_results()
+def _finish(results, stats, return_stats, stats_callback):
+  """Completes the statistics of a run, hands them to `stats_callback` and
+  returns the results of `optimize()`."""
+  stats.kept = len(results)
+  if stats_callback is not None:
+    stats_callback(stats)
+  if return_stats:
+    return results, stats
+  return results
 
-  except Exception as err:
-    raise ValueError(f"An unexpected error occured during optimization: {err}") from err
+
+# pylint: disable=too-many-arguments
+def evaluate_scenarios(index, policies, scenarios, cost_function, keep, use_vectorized,
+                       block_size=DEFAULT_BLOCK_SIZE, progress=None, constraints=(),
+                       stats=None, cache=None):
+  """Evaluates the scenarios of a `ScenarioSpace` against the data indexed by
+  `index` (a `KeyIndex`) and accumulates the best ones in the `KeepN` structure
+  `keep`.
+
+  Both engines keep compact `(scenario index, cost)` items (see
+  `ScenarioSpace.scenario()`); the loop engine scores every scenario with
+  `apply_cost_to_rows()` and drops the realized data frame, which
+  `realize_scenario()` rebuilds for the scenarios returned. Both resolve the
+  scenarios of a block to row positions on the integer codes of `index` (see
+  `resolve_positions()`), so the labels are only read for the scenarios
+  realized. Scenarios breaking one of the `constraints` are
+  rejected before their cost is computed, and costs found in `cache` (a
+  `what_if.cost_cache.CacheScope` of `index.df`) are not computed again.
+  `progress` (a `what_if.stats.Progress`) and `stats` (a
+  `what_if.stats.OptimizationStats`) are updated when given.
+
+  When `keep` is a `what_if.pareto.ParetoFront`, `cost_function` is the mapping
+  of the objectives (see `what_if.pareto.evaluate_objectives()`)."""
+  if isinstance(keep, ParetoFront):
+    evaluate_objectives(index, policies, scenarios, cost_function, keep, use_vectorized,
+                        block_size, progress, constraints, stats)
+    return
+  if use_vectorized:
+    optimize_in_blocks(index.df, policies, scenarios.parameters, scenarios, cost_function,
+                       keep, block_size, index, constraints, stats, progress, cache)
+    return
+  for start in range(0, len(scenarios), block_size):
+    block = scenarios[start:start + block_size]
+    positions = resolve_positions(index.df, policies, scenarios.parameters, block, index)
+    for scenario, rows in zip(block.indices, positions.T):
+      _, cost = apply_cost_to_rows(index, rows, policies, cost_function, constraints, stats,
+                                   cache)
+      keep.add_item((int(scenario), cost))
+      if progress is not None:
+        progress.update()
 
 
 def keep_only_relevant_records(df, policies):
   """From a DataFrame `df`, keep only the records that are relevant for
-  computing the optimized parameters for a given set of policies."""
-  return pd.concat(
-    [df.merge(pd.DataFrame([x]), how="inner") for x in policies]
-  ).drop_duplicates()
+  computing the optimized parameters for a given set of policies.
+
+  The policy records are grouped by the columns of `df` they set, and each group
+  is matched in a single pass (semi-join) against the hashed values of those
+  columns. The rows kept are returned once, in the order of `df`."""
+  groups = {}
+  for policy in policies:
+    keys = tuple(x for x in df.columns if x in policy)
+    groups.setdefault(keys, set()).add(tuple(policy[x] for x in keys))
+
+  mask = np.zeros(len(df), dtype=bool)
+  for keys, values in groups.items():
+    if not keys:
+      raise ValueError("No common columns found between a policy record and df.columns")
+    mask |= pd.MultiIndex.from_frame(df[list(keys)]).isin(list(values))
+  return df[mask]
 
 
 def keep_only_filters(df, policy):
@@ -116,35 +502,100 @@ def keep_only_filters(df, policy):
   ]
 
 
-def apply_cost_function(df, policy, target_calculation):
-  """Applies the cost function/target_calculation to a policy, using the data in `df`."""
-  answer = df.merge(pd.DataFrame(policy), how="inner")
-  if len(answer) != len(policy):
+# pylint: disable=too-many-arguments
+def apply_cost_function(df, policy, target_calculation, index=None, constraints=(), stats=None,
+                        cache=None):
+  """Applies the cost function/target_calculation to a policy, using the data in `df`.
+
+  When `index` (a `KeyIndex` of `df`) is given, the records of the policy are
+  fetched by position instead of merging the policy against `df`, and the cost
+  is looked up in `cache` (a `what_if.cost_cache.CacheScope` of `df`) when given.
+  A scenario breaking one of the `constraints` gets an infinite cost without
+  calling `target_calculation`. The outcome is counted in `stats` (a
+  `what_if.stats.OptimizationStats`) when given."""
+  if index is None:
+    answer = df.merge(pd.DataFrame(policy), how="inner")
+    if len(answer) != len(policy):
+      if stats is not None:
+        stats.missing_rows += 1
+      return answer, float("inf")
+    return score_scenario(answer, target_calculation, constraints, stats)
+  rows = index.locate(policy)
+  if (rows < 0).any():
+    if stats is not None:
+      stats.missing_rows += 1
+    return index.realize(policy), float("inf")
+  return apply_cost_to_rows(index, rows, policy, target_calculation, constraints, stats, cache)
+
+
+# pylint: disable=too-many-arguments
+def apply_cost_to_rows(index, rows, policy, target_calculation, constraints=(), stats=None,
+                       cache=None):
+  """Like `apply_cost_function()`, for a scenario already resolved to the
+  positions `rows` (in the data indexed by `index`, one per policy record, -1
+  when missing). Scenarios missing a record are not realized: the item returned
+  is `(None, inf)`."""
+  rows = np.asarray(rows, dtype=np.int64)
+  if (rows < 0).any():
+    if stats is not None:
+      stats.missing_rows += 1
+    return None, float("inf")
+  keys = None if cache is None else cache.keys(rows)
+  return score_scenario(index.take(rows, policy), target_calculation, constraints, stats,
+                        cache, keys)
+
+
+# pylint: disable=too-many-arguments
+def score_scenario(answer, target_calculation, constraints=(), stats=None, cache=None,
+                   keys=None):
+  """Scores a realized scenario (see `apply_cost_function()`): checks the
+  `constraints`, looks the cost up in `cache` under `keys` when given, and calls
+  `target_calculation` otherwise. Returns the `(answer, cost)` item."""
+  if not satisfied(answer, constraints):
+    if stats is not None:
+      stats.rejected += 1
     return answer, float("inf")
 
-  answer["total_cost"] = target_calculation(answer)
+  if keys is not None:
+    cached, found = cache.get(keys)
+    if found[0]:
+      if stats is not None:
+        stats.record_cached(cached)
+      answer["total_cost"] = cached[0]
+      return answer, float(cached[0])
+    if stats is not None:
+      stats.cache_misses += 1
+
+  start = time.perf_counter()
+  cost = target_calculation(answer)
+  answer["total_cost"] = cost
+  if stats is not None:
+    stats.record_cost(time.perf_counter() - start, cost)
+  if keys is not None:
+    cache.put(keys, [cost])
+
+  return answer, cost
+
 
-  return answer, target_calculation(answer)
+def realize_scenario(index, scenario_parameter, policy, cost):
+  """Builds the result data frame of a scenario which cost is already known, as
+  returned by `apply_cost_function()`, from a `KeyIndex` of the data."""
+  answer = index.realize(merge_scenario_parameter_with_policy(scenario_parameter, policy))
+  answer["total_cost"] = cost
+  return answer
 
 
-# TODO: This could be more performant
 def enumerate_over_all_parameters(
   dfp, parameters: Sequence[str] = ("destination", "date_from", "date_to", "stars")
 ):
   """Brute-force approach. Takes all the combinations of parameters and return
-  a list of all the scenarios to evaluate."""
-  def _tuple_to_dict(val):
-    return {x[0]: x[1] for x in val}
-
-  return [
-    _tuple_to_dict(rec)
-    for rec in product(
-      *[
-        [(parameter, value) for value in set(dfp[parameter])]
-        for parameter in parameters
-    ]
-      )
-  ]
+  a lazy sequence (`ScenarioSpace`) of all the scenarios to evaluate.
+
+  The scenarios are generated on demand: the length of the sequence is known up
+  front and it can be sliced by index range to shard the work."""
+  return ScenarioSpace(
+    parameters, [list(dict.fromkeys(dfp[parameter])) for parameter in parameters]
+  )
 
 
 def merge_scenario_parameter_with_policy(scenario_parameter, policy):
@@ -154,15 +605,43 @@ def merge_scenario_parameter_with_policy(scenario_parameter, policy):
   return [pol | scenario_parameter for pol in policy]
 
 
-# TODO: We could refine this further by only keeping the values in the data.
+def enumerate_present_parameters(
+  dfp,
+  policy,
+  parameters: Sequence[str] = ("destination", "date_from", "date_to", "stars"),
+):
+  """Data-driven approach. Like `enumerate_over_all_parameters()`, but only keeps
+  the combinations of parameters that have a record in `dfp` for *every* record
+  of the policy. The other combinations can only be rejected (see
+  `apply_cost_function()`), so there is no need to evaluate them.
+
+  The combinations are found with a single merge of the policy records against
+  `dfp` followed by a grouped count, and are kept in enumeration order. The
+  number of skipped combinations is `space.size - len(space)`."""
+  space = enumerate_over_all_parameters(dfp, parameters)
+  flat = np.zeros(len(dfp), dtype=np.int64)
+  for parameter, values, size in zip(space.parameters, space.values, space.sizes):
+    flat = flat * size + pd.Index(values).get_indexer(dfp[parameter])
+
+  keys = [x for x in key_columns(dfp, parameters, policy) if x not in parameters]
+  rows = dfp[keys].assign(**{_SCENARIO: flat})
+  records = pd.DataFrame(list(policy), index=range(len(policy)), columns=keys)
+  records[_RECORD] = np.arange(len(records))
+  if keys:
+    matched = records.merge(rows, on=keys, how="inner")
+  else:
+    matched = records.merge(rows, how="cross")
+
+  counts = matched.groupby(_SCENARIO)[_RECORD].nunique()
+  present = np.sort(counts.index[counts == len(records)].to_numpy(dtype=np.int64))
+  return ScenarioSpace(space.parameters, space.values, present)
+
+
 def enumerate_scenarios(
   dfp,
   policy,
   parameters: Sequence[str] = ("destination", "date_from", "date_to", "stars"),
 ):
   """Combination of `enumerate_over_all_parameters()` and
-  `merge_scenario_parameter_with_policy()`."""
-  return [
-    merge_scenario_parameter_with_policy(scenario, policy)
-    for scenario in enumerate_over_all_parameters(dfp, parameters)
-  ]
+  `merge_scenario_parameter_with_policy()`, as a lazy sequence."""
+  return PolicyScenarios(enumerate_over_all_parameters(dfp, parameters), policy)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""Checkpoints of long-running optimizations.
+
+A checkpoint stores, in a local file, how far the enumeration of the scenario
+space went (the cursor), the top-N found so far and a fingerprint of the inputs.
+`optimize()` saves one every `checkpoint_every` scenarios and, when restarted
+with the same inputs, resumes from the cursor instead of starting over.
+
+"""
+
+# pylint: disable=bad-indentation
+
+import hashlib
+import os
+import pickle
+
+import pandas as pd
+
+# Version 2: the loop engine keeps (scenario index, cost) items instead of data frames.
+# Version 3: the constraints are part of the fingerprint.
+VERSION = 3
+
+
+def fingerprint(df, parameters, policies, top_n, engine, keep_ties=False, constraints=()):
+  """Digest of the inputs an optimization depends on.
+
+  The data is hashed row by row (values and column names, not the index), the
+  policy records, parameters, number of results, engine, constraints and, when
+  set, `keep_ties` through their `repr`. The cost function cannot be hashed
+  reliably and is left out.
+  """
+  digest = hashlib.sha256()
+  digest.update(repr(list(df.columns)).encode())
+  digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+  for item in (list(parameters), list(policies), top_n, engine, list(constraints)):
+    digest.update(repr(item).encode())
+  if keep_ties:
+    digest.update(b"keep_ties")
+  return digest.hexdigest()
+
+
+class Checkpoint:
+  """Checkpoint file of an optimization, identified by the fingerprint of its
+  inputs."""
+
+  def __init__(self, path, digest):
+    """Class initializer.
+
+    Args:
+        path: str or os.PathLike, location of the checkpoint file.
+        digest: str, fingerprint of the inputs (see `fingerprint()`).
+    """
+    self.path = os.fspath(path)
+    self.digest = digest
+
+  def restore(self, keep):
+    """Loads the checkpoint file, if any, into the `KeepN` structure `keep`.
+
+    Returns:
+      The position of the next scenario to evaluate (0 without checkpoint file).
+
+    Raises:
+      ValueError: when the checkpoint was saved for different inputs.
+    """
+    if not os.path.exists(self.path):
+      return 0
+    with open(self.path, "rb") as file:
+      state = pickle.load(file)
+    if state.get("version") != VERSION or state.get("fingerprint") != self.digest:
+      raise ValueError(f"The checkpoint {self.path} was saved for different data, "
+                       "policies or settings; remove it to start over")
+    for item in state["results"]:
+      keep.add_item(item)
+    return state["cursor"]
+
+  def save(self, cursor, keep):
+    """Saves the position of the next scenario to evaluate and the content of
+    `keep`. The file is replaced atomically, so an interrupted save leaves the
+    previous checkpoint intact."""
+    state = {
+      "version": VERSION,
+      "fingerprint": self.digest,
+      "cursor": cursor,
+      "results": keep.return_results(),
+    }
+    temporary = f"{self.path}.tmp"
+    with open(temporary, "wb") as file:
+      pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+      file.flush()
+      os.fsync(file.fileno())
+    os.replace(temporary, self.path)
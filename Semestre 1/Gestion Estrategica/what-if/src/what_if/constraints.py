@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+"""Declarative constraints for the optimization routine.
+
+Instead of returning `float("inf")` from the cost function, the business rules
+can be given to `optimize()` as constraints:
+
+* `ColumnComparison`, a comparison between columns (or sums of columns) of
+  every record of a scenario, e.g. the capacity of an office against the seats
+  used plus the quantity of the policy record;
+* `AllowedValues`, the values a column may take;
+* `AggregateCap`, a cap on the sum of a column over the records of a scenario
+  sharing the same group, e.g. the seats taken in every office.
+
+Every constraint is evaluated on arrays: a column of a realized scenario, or a
+`(policy record, scenario)` array covering a whole block of scenarios. The
+record-level constraints (comparisons and allowed values) only reading columns
+of the data frame are applied to the data before the scenarios are enumerated;
+the others are checked before the cost of a scenario is computed, so infeasible
+scenarios never reach the cost function.
+
+>>> from what_if.constraints import AggregateCap, AllowedValues, ColumnComparison
+
+"""
+
+# pylint: disable=bad-indentation
+
+import operator
+
+import numpy as np
+import pandas as pd
+
+OPERATORS = {
+  "<": operator.lt,
+  "<=": operator.le,
+  ">": operator.gt,
+  ">=": operator.ge,
+  "==": operator.eq,
+  "!=": operator.ne,
+}
+
+
+def _as_list(columns):
+  return [columns] if isinstance(columns, str) else list(columns)
+
+
+def _total(columns, names):
+  """Element-wise sum of the columns `names` (a column name or a list of them)."""
+  names = _as_list(names)
+  answer = np.asarray(columns[names[0]])
+  for name in names[1:]:
+    answer = answer + np.asarray(columns[name], dtype=float)
+  return answer
+
+
+class ColumnComparison:
+  """Record-level constraint `left <op> right`.
+
+  Example, the office must have room for the policy record:
+  `ColumnComparison("Headquarter Capacity", ">=", ["Utilized Seats", "quantity"])`.
+  """
+
+  row_level = True
+
+  def __init__(self, left, op, right):
+    """Class initializer.
+
+    Args:
+        left: str or List[str], a column or columns summed together.
+        op: str, one of "<", "<=", ">", ">=", "==", "!=".
+        right: str, List[str] or a number, a column, columns summed together or
+            a constant.
+    """
+    if op not in OPERATORS:
+      raise ValueError(f"Unknown comparison {op!r}, expected one of {tuple(OPERATORS)}")
+    self.left = _as_list(left)
+    self.op = op
+    self.right = right if np.isscalar(right) and not isinstance(right, str) else _as_list(right)
+
+  def __repr__(self):
+    return f"ColumnComparison({self.left!r}, {self.op!r}, {self.right!r})"
+
+  @property
+  def columns(self):
+    """Columns read by the constraint."""
+    return set(self.left) | (set(self.right) if isinstance(self.right, list) else set())
+
+  def mask(self, columns):
+    """Element-wise mask of the records satisfying the constraint."""
+    right = _total(columns, self.right) if isinstance(self.right, list) else self.right
+    return OPERATORS[self.op](_total(columns, self.left), right)
+
+
+class AllowedValues:
+  """Record-level constraint: `column` takes one of `values`."""
+
+  row_level = True
+
+  def __init__(self, column, values):
+    """Class initializer.
+
+    Args:
+        column: str, the column constrained.
+        values: Iterable, the admissible values.
+    """
+    self.column = column
+    self.values = list(values)
+
+  def __repr__(self):
+    return f"AllowedValues({self.column!r}, {self.values!r})"
+
+  @property
+  def columns(self):
+    """Columns read by the constraint."""
+    return {self.column}
+
+  def mask(self, columns):
+    """Element-wise mask of the records satisfying the constraint."""
+    return np.isin(np.asarray(columns[self.column]), self.values)
+
+
+class AggregateCap:
+  """Scenario-level constraint: for every group of records of a scenario, the
+  sum of `column` is at most `cap`.
+
+  Example, the teams moved to an office must fit in its free seats:
+  `AggregateCap("City", "quantity", "Free Seats")`.
+  """
+
+  row_level = False
+
+  def __init__(self, group_by, column, cap):
+    """Class initializer.
+
+    Args:
+        group_by: str or List[str], the columns defining the groups.
+        column: str or List[str], the column (or columns summed together) to cap.
+        cap: str or a number, a constant or a column, in which case the cap of a
+            group is the smallest value of the column in the group.
+    """
+    self.group_by = _as_list(group_by)
+    self.column = _as_list(column)
+    self.cap = cap
+
+  def __repr__(self):
+    return f"AggregateCap({self.group_by!r}, {self.column!r}, {self.cap!r})"
+
+  @property
+  def columns(self):
+    """Columns read by the constraint."""
+    return set(self.group_by) | set(self.column) | (
+      {self.cap} if isinstance(self.cap, str) else set()
+    )
+
+  def check(self, columns):
+    """Mask of the scenarios satisfying the constraint. The columns are arrays
+    of shape `(policy records, scenarios)` (or one-dimensional for a single
+    scenario)."""
+    values = _total(columns, self.column).astype(float)
+    if values.ndim == 1:
+      values = values[:, np.newaxis]
+    records, scenarios = values.shape
+    group = np.zeros(values.size, dtype=np.int64)
+    for name in self.group_by:
+      codes, uniques = pd.factorize(np.asarray(columns[name]).reshape(-1))
+      group = group * max(len(uniques), 1) + codes
+    group = group * scenarios + np.tile(np.arange(scenarios), records)
+    keys, inverse = np.unique(group, return_inverse=True)
+
+    sums = np.bincount(inverse, weights=values.reshape(-1), minlength=len(keys))
+    if isinstance(self.cap, str):
+      caps = np.full(len(keys), np.inf)
+      np.minimum.at(caps, inverse, _total(columns, self.cap).reshape(-1))
+    else:
+      caps = self.cap
+    answer = np.ones(scenarios, dtype=bool)
+    answer[keys[sums > caps] % scenarios] = False
+    return answer
+
+
+def split_constraints(constraints, data_columns):
+  """Splits `constraints` in the ones that can be applied to the data before
+  enumerating the scenarios (record-level, only reading `data_columns`) and the
+  others."""
+  data, others = [], []
+  for constraint in constraints or ():
+    if constraint.row_level and constraint.columns <= set(data_columns):
+      data.append(constraint)
+    else:
+      others.append(constraint)
+  return data, others
+
+
+def row_mask(columns, constraints):
+  """Element-wise mask of the records satisfying every record-level constraint
+  of `constraints`, or None when there is none."""
+  answer = None
+  for constraint in constraints:
+    if constraint.row_level:
+      mask = constraint.mask(columns)
+      answer = mask if answer is None else answer & mask
+  return answer
+
+
+def scenario_mask(columns, constraints, scenarios):
+  """Mask of the scenarios satisfying every constraint of `constraints`.
+
+  Args:
+    columns: Mapping of a column name to an array of shape
+        `(policy records, scenarios)`.
+    constraints: List of constraints.
+    scenarios: int, the number of scenarios.
+  """
+  answer = np.ones(scenarios, dtype=bool)
+  records = row_mask(columns, constraints)
+  if records is not None:
+    answer &= np.asarray(records).reshape(-1, scenarios).all(axis=0)
+  for constraint in constraints:
+    if not constraint.row_level:
+      answer &= constraint.check(columns)
+  return answer
+
+
+def filter_data(df, constraints):
+  """Rows of `df` satisfying the record-level `constraints`."""
+  mask = row_mask(df, constraints)
+  return df if mask is None else df[np.asarray(mask)]
+
+
+def satisfied(scenario, constraints):
+  """Whether a realized scenario (a data frame, one row per policy record)
+  satisfies every constraint of `constraints`."""
+  if not constraints:
+    return True
+  return bool(scenario_mask(scenario, constraints, 1)[0])
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+"""Persistent cache of the costs computed by the optimization routine.
+
+Analysts often run the same optimization again with another `top_n`, other
+filters or a few more policy records. `CostCache` stores, in a local SQLite
+file, the cost of every scenario evaluated, keyed by:
+
+* a fingerprint of the cost function (see `cost_fingerprint()`);
+* the hash of the values of the rows the scenario uses, in the order of the
+  policy records, and of the columns only present in the records.
+
+A scenario found in the cache costs a lookup instead of a realization and a call
+to the cost function. The cache holds at most `max_entries` costs; the least
+recently used ones are evicted first.
+
+>>> from what_if.cost_cache import CostCache
+
+"""
+
+# pylint: disable=bad-indentation
+
+import datetime
+import decimal
+import enum
+import fractions
+import functools
+import hashlib
+import logging
+import os
+import sqlite3
+import types
+
+import numpy as np
+import pandas as pd
+
+from what_if.cost_functions import SeparableCost, VectorizedCost
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+# Number of keys per SQL statement, below the limit of host parameters of SQLite.
+BATCH = 500
+KEY_SIZE = 16
+
+
+# Values described by their `repr`, which is complete for these types (unlike
+# the `repr` of arrays and frames, which numpy and pandas truncate).
+_SCALARS = (type(None), bool, int, float, complex, str, bytes, range, slice, type(Ellipsis),
+            datetime.date, datetime.time, datetime.timedelta, decimal.Decimal,
+            fractions.Fraction, enum.Enum, pd.Timestamp, pd.Timedelta)
+
+
+def _digest(data):
+  return hashlib.sha256(data).hexdigest()
+
+
+def _global_names(code):
+  """Names of the global variables `code` (and the functions it defines) may read."""
+  names = set(code.co_names)
+  for constant in code.co_consts:
+    if isinstance(constant, types.CodeType):
+      names |= _global_names(constant)
+  return names
+
+
+def _describe_globals(function, seen):
+  """Description of the global variables `function` reads. Functions of other
+  modules are described by name; values without a stable description are
+  described by their type, with a warning: the cache cannot see them change."""
+  answer = []
+  for name in sorted(_global_names(function.__code__)):
+    if name not in function.__globals__:
+      continue
+    value = function.__globals__[name]
+    if isinstance(value, types.FunctionType) and value.__globals__ is not function.__globals__:
+      answer.append((name, repr(("function", value.__module__, value.__qualname__))))
+      continue
+    try:
+      answer.append((name, _describe(value, seen)))
+    except ValueError:
+      logging.warning("The cost function %s reads the global variable %s, a %s which cannot "
+                      "be fingerprinted: the cost cache will not see it change, use "
+                      "CostCache(namespace=...) when it does.", function.__qualname__, name,
+                      type(value).__name__)
+      answer.append((name, repr(("opaque", type(value).__module__, type(value).__qualname__))))
+  return tuple(answer)
+
+
+def _describe(value, seen=None):
+  """Stable description of `value` for `cost_fingerprint()`. Functions are
+  described by their code (recursively), defaults and closures, instead of their
+  `repr` which holds a memory address; arrays and pandas objects by a digest of
+  their content.
+
+  Raises:
+    ValueError: when `value` holds something without a stable description.
+  """
+  seen = set() if seen is None else seen
+  if id(value) in seen:
+    return "<recursion>"
+  if isinstance(value, _SCALARS):
+    return repr((type(value).__qualname__, value))
+  if isinstance(value, np.generic):
+    return repr(("numpy", value.dtype.str, _digest(value.tobytes())))
+  if isinstance(value, np.ndarray):
+    if value.dtype.hasobject:
+      return repr(("ndarray", value.shape, _describe(value.ravel().tolist(), seen)))
+    return repr(("ndarray", value.dtype.str, value.shape,
+                 _digest(np.ascontiguousarray(value).tobytes())))
+  if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+    try:
+      hashes = pd.util.hash_pandas_object(value, index=not isinstance(value, pd.Index))
+    except TypeError as err:
+      raise ValueError(f"Cannot fingerprint a {type(value).__name__} holding unhashable "
+                       "values: the cost function cannot be cached.") from err
+    dtypes = value.dtypes if isinstance(value, pd.DataFrame) else [value.dtype]
+    columns = list(value.columns) if isinstance(value, pd.DataFrame) else [value.name]
+    return repr((type(value).__qualname__, value.shape, [str(x) for x in dtypes],
+                 _describe(columns, seen), _digest(hashes.to_numpy().tobytes())))
+  if isinstance(value, type):
+    return repr(("type", value.__module__, value.__qualname__))
+  if isinstance(value, types.ModuleType):
+    return repr(("module", value.__name__))
+  if isinstance(value, np.ufunc):
+    return repr(("ufunc", value.__name__))
+  if isinstance(value, types.BuiltinFunctionType) and isinstance(
+      value.__self__, (types.ModuleType, type(None))):
+    return repr(("builtin", value.__module__, value.__qualname__))
+  if isinstance(value, types.CodeType):
+    return repr((value.co_name, value.co_code, value.co_names, value.co_varnames,
+                 tuple(_describe(x, seen) for x in value.co_consts)))
+  seen = seen | {id(value)}
+  if isinstance(value, (types.FunctionType, types.MethodType, functools.partial,
+                        VectorizedCost)):
+    if isinstance(value, SeparableCost):
+      return repr(("separable", _describe(value.row_cost, seen)))
+    if isinstance(value, VectorizedCost):
+      return repr(("vectorized", _describe(value.function, seen)))
+    if isinstance(value, functools.partial):
+      return repr(("partial", _describe(value.func, seen),
+                   tuple(_describe(x, seen) for x in value.args),
+                   tuple((k, _describe(x, seen)) for k, x in sorted(value.keywords.items()))))
+    if isinstance(value, types.MethodType):
+      return repr(("method", _describe(value.__func__, seen), _describe(value.__self__, seen)))
+    closure = tuple(_describe(x.cell_contents, seen) for x in value.__closure__ or ())
+    defaults = tuple(_describe(x, seen) for x in value.__defaults__ or ())
+    keyword_defaults = _describe(value.__kwdefaults__ or {}, seen)
+    return repr((value.__module__, value.__qualname__, _describe(value.__code__, seen),
+                 defaults, keyword_defaults, closure, _describe_globals(value, seen)))
+  if isinstance(value, (list, tuple)):
+    return repr((type(value).__qualname__, tuple(_describe(x, seen) for x in value)))
+  if isinstance(value, (set, frozenset)):
+    return repr((type(value).__qualname__, tuple(sorted(_describe(x, seen) for x in value))))
+  if isinstance(value, dict):
+    return repr(tuple((_describe(k, seen), _describe(x, seen)) for k, x in value.items()))
+  if hasattr(value, "__dict__"):
+    return repr((type(value).__module__, type(value).__qualname__,
+                 _describe(vars(value), seen)))
+  raise ValueError(f"Cannot fingerprint a {type(value).__name__} value: the cost function "
+                   "cannot be cached.")
+
+
+def cost_fingerprint(cost_function):
+  """Digest of a cost function: its code, constants, default arguments, the
+  values it closes over and the global variables it reads (so mutable state, like
+  a call counter or a tariff table, changes its fingerprint). Arrays and pandas
+  objects are described by a digest of their content, the functions of other
+  modules by their name. Globals without a stable description are only described
+  by their type, with a warning, see `CostCache(namespace=...)`.
+
+  Raises:
+    ValueError: when the cost function holds a value without a stable
+        description, rather than risking two functions sharing a fingerprint.
+  """
+  return hashlib.sha256(_describe(cost_function).encode()).hexdigest()
+
+
+class CostCache:
+  """Least-recently-used cache of scenario costs, stored in a SQLite file.
+
+  The file can be shared by several optimizations, cost functions and worker
+  processes (each process opens its own connection).
+
+  Attributes:
+    hits: int, number of costs found in the cache by this process.
+    misses: int, number of costs looked up and not found by this process.
+    evictions: int, number of costs evicted by this process.
+  """
+
+  def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, namespace=""):
+    """Class initializer.
+
+    Args:
+        path: str or os.PathLike, location of the cache file, created if needed.
+        max_entries: int, maximum number of costs kept in the file.
+        namespace: str, mixed into every key. Change it to invalidate the costs
+            when the cost function reads something its fingerprint cannot see
+            (files, global variables without a stable description, the code of
+            the functions of other modules).
+    """
+    if max_entries <= 0:
+      raise ValueError("The maximum number of cache entries should be a positive integer.")
+    self.path = os.fspath(path)
+    self.max_entries = max_entries
+    self.namespace = namespace
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+    self._connections = {}
+    self._clock = 0
+    self._size = 0
+
+  def _connection(self):
+    """Connection of the current process, opened on first use."""
+    pid = os.getpid()
+    if pid not in self._connections:
+      connection = sqlite3.connect(self.path, timeout=60)
+      connection.execute("PRAGMA journal_mode=WAL")
+      connection.execute("PRAGMA synchronous=NORMAL")
+      with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS costs "
+                           "(key BLOB PRIMARY KEY, cost REAL, used INTEGER) WITHOUT ROWID")
+        connection.execute("CREATE INDEX IF NOT EXISTS costs_used ON costs (used)")
+      self._clock, self._size = connection.execute(
+        "SELECT COALESCE(MAX(used), 0), COUNT(*) FROM costs"
+      ).fetchone()
+      self._connections[pid] = connection
+    return self._connections[pid]
+
+  def __len__(self):
+    return self._connection().execute("SELECT COUNT(*) FROM costs").fetchone()[0]
+
+  def get(self, keys):
+    """Looks `keys` up, marking the ones found as recently used.
+
+    Returns:
+      A `(costs, found)` tuple of arrays aligned with `keys`; the costs of the
+      keys not found are NaN.
+    """
+    connection = self._connection()
+    costs = np.full(len(keys), np.nan)
+    found = np.zeros(len(keys), dtype=bool)
+    if not keys:
+      return costs, found
+    positions = {}
+    for i, key in enumerate(keys):
+      positions.setdefault(key, []).append(i)
+    unique = list(positions)
+    self._clock += 1
+    with connection:
+      for start in range(0, len(unique), BATCH):
+        batch = unique[start:start + BATCH]
+        marks = ",".join("?" * len(batch))
+        rows = connection.execute(
+          f"SELECT key, cost FROM costs WHERE key IN ({marks})", batch
+        ).fetchall()
+        for key, cost in rows:
+          costs[positions[key]] = np.nan if cost is None else cost
+          found[positions[key]] = True
+        if rows:
+          connection.execute(f"UPDATE costs SET used = ? WHERE key IN ({marks})",
+                             [self._clock] + batch)
+    self.hits += int(found.sum())
+    self.misses += int((~found).sum())
+    return costs, found
+
+  def put(self, keys, costs):
+    """Stores the `costs` of `keys`, then evicts the least recently used costs
+    beyond `max_entries`."""
+    if not keys:
+      return
+    connection = self._connection()
+    self._clock += 1
+    entries = [(key, None if np.isnan(cost) else float(cost), self._clock)
+               for key, cost in zip(keys, np.asarray(costs, dtype=float))]
+    with connection:
+      before = connection.total_changes
+      connection.executemany("INSERT OR IGNORE INTO costs VALUES (?, ?, ?)", entries)
+      self._size += connection.total_changes - before
+      if self._size > self.max_entries:
+        excess = self._size - self.max_entries
+        connection.execute("DELETE FROM costs WHERE key IN "
+                           "(SELECT key FROM costs ORDER BY used LIMIT ?)", (excess,))
+        self._size, = connection.execute("SELECT COUNT(*) FROM costs").fetchone()
+        self.evictions += excess
+
+  def clear(self):
+    """Removes every cost from the file."""
+    connection = self._connection()
+    with connection:
+      connection.execute("DELETE FROM costs")
+    self._size = 0
+
+  def stats(self):
+    """Hits, misses, hit rate and evictions of this process, and entries in the file."""
+    lookups = self.hits + self.misses
+    return {
+      "hits": self.hits,
+      "misses": self.misses,
+      "hit_rate": self.hits / lookups if lookups else 0.0,
+      "evictions": self.evictions,
+      "entries": len(self),
+    }
+
+  def scope(self, cost_function, df, policies):
+    """Keys of the scenarios of an optimization, see `CacheScope`."""
+    return CacheScope(self, cost_function, df, policies)
+
+
+class CacheScope:
+  """`CostCache` bound to the cost function, data and policy records of an
+  optimization, which computes the keys of its scenarios."""
+
+  def __init__(self, cache, cost_function, df, policies):
+    """Class initializer.
+
+    Args:
+        cache: CostCache, the cache.
+        cost_function: the cost function of the optimization.
+        df: pandas.DataFrame, the (filtered) data the scenarios are realized from.
+        policies: List[dict], the policy records.
+    """
+    self.cache = cache
+    self.rows = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    context = hashlib.blake2b(digest_size=KEY_SIZE)
+    for item in (cache.namespace, cost_fingerprint(cost_function), list(df.columns),
+                 _describe([sorted((k, v) for k, v in pol.items() if k not in df.columns)
+                            for pol in policies])):
+      context.update(repr(item).encode())
+    self.context = context
+
+  def keys(self, positions):
+    """Keys of the scenarios which rows are `positions`, an array of row positions
+    in the data of shape `(policy records, scenarios)` (or `(policy records,)`
+    for a single scenario)."""
+    positions = np.asarray(positions, dtype=np.int64)
+    if positions.ndim == 1:
+      positions = positions[:, np.newaxis]
+    hashes = np.ascontiguousarray(self.rows[positions].T)
+    answer = []
+    for row in hashes:
+      digest = self.context.copy()
+      digest.update(row.tobytes())
+      answer.append(digest.digest())
+    return answer
+
+  def get(self, keys):
+    """See `CostCache.get()`."""
+    return self.cache.get(keys)
+
+  def put(self, keys, costs):
+    """See `CostCache.put()`."""
+    self.cache.put(keys, costs)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""Cost function declarations understood by the optimization routine.
+
+Any callable taking a realized scenario (a `pd.DataFrame`) and returning a
+float is a valid cost function for `optimize()`. The wrappers in this module
+keep that contract, so they can be used anywhere a plain cost function is
+expected, and additionally tell the optimization routine how the cost can be
+computed in bulk.
+
+>>> from what_if.cost_functions import separable, vectorized
+>>> cost = vectorized(lambda c: (c["total_price"] * c["travelers"]).sum(axis=0))
+>>> same_cost = separable(lambda c: c["total_price"] * c["travelers"])
+
+"""
+
+# pylint: disable=bad-indentation
+
+import numpy as np
+
+
+class VectorizedCost:
+  """Cost function evaluated over many scenarios at once.
+
+  The wrapped function receives a mapping of column names to 2D arrays of
+  shape `(policy records, scenarios)` and returns one cost per scenario
+  (an array of shape `(scenarios,)`). Column `c[name][i, j]` holds the value
+  of `name` for the i-th policy record in the j-th scenario.
+  """
+
+  def __init__(self, function):
+    """Class initializer.
+
+    Args:
+        function: Callable[[Mapping[str, np.ndarray]], np.ndarray], the
+            column-array cost function.
+    """
+    if not callable(function):
+      raise ValueError("The vectorized cost function must be callable.")
+    self.function = function
+
+  def evaluate(self, columns):
+    """Returns the costs (as floats) of every scenario laid out in `columns`."""
+    return np.asarray(self.function(columns), dtype=float)
+
+  def __call__(self, df):
+    """Row-wise contract: computes the cost of a single realized scenario."""
+    columns = {x: df[x].to_numpy()[:, np.newaxis] for x in df.columns}
+    return self.evaluate(columns).reshape(-1)[0]
+
+
+def vectorized(function):
+  """Declares `function` as a column-array cost function. See `VectorizedCost`."""
+  return VectorizedCost(function)
+
+
+class SeparableCost(VectorizedCost):
+  """Cost function which is the sum of a cost per record of the realized scenario.
+
+  Most cost functions are of this shape, e.g. `(s["total_price"] * s["travelers"]).sum()`.
+  Knowing the cost per record lets the branch-and-bound engine bound the cost of
+  scenarios from partial assignments of the parameters.
+
+  The row cost is either the name of a column or an element-wise function of the
+  columns, which is called with a data frame or with a mapping of column arrays
+  (so arithmetic on columns works in both cases).
+  """
+
+  def __init__(self, row_cost):
+    """Class initializer.
+
+    Args:
+        row_cost: str or Callable, the column holding the cost of a record or
+            the element-wise function computing it.
+    """
+    if not isinstance(row_cost, str) and not callable(row_cost):
+      raise ValueError("The row cost must be a column name or a callable.")
+    self.row_cost = row_cost
+    super().__init__(self.total)
+
+  def row_costs(self, columns):
+    """Returns the cost of every record (as floats) of `columns`."""
+    if isinstance(self.row_cost, str):
+      return np.asarray(columns[self.row_cost], dtype=float)
+    return np.asarray(self.row_cost(columns), dtype=float)
+
+  def total(self, columns):
+    """Returns the cost of every scenario of `columns`: the sum of its row costs."""
+    return self.row_costs(columns).sum(axis=0)
+
+
+def separable(row_cost):
+  """Declares a cost as the sum of `row_cost` over the records. See `SeparableCost`."""
+  return SeparableCost(row_cost)
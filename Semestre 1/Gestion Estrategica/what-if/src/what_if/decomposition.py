@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+
+"""Decomposition solver for parameters chosen per policy record.
+
+By default every policy record of a scenario shares the same parameter values
+(one `City` or `destination` for everybody). With record parameters, each
+record picks its own values, so the scenario space grows as
+|values|^records and cannot be enumerated. When the cost is separable (the sum
+of a cost per record, see `what_if.cost_functions.separable`), the records only
+interact through the shared parameters and the feasibility check:
+
+* for every combination of the shared parameters, the rows each record can use
+  are sorted by cost, independently of the other records;
+* the combinations of rows are then enumerated by increasing total cost (k-best
+  sums of sorted lists), skipping the ones rejected by the feasibility check,
+  until they cannot beat the top-N threshold anymore.
+
+"""
+
+# pylint: disable=bad-indentation
+
+import heapq
+import time
+
+import numpy as np
+import pandas as pd
+
+from what_if.constraints import row_mask, satisfied
+
+RECORD = "__what_if_record__"
+ROW = "__what_if_row__"
+
+
+def candidate_rows(df, policies, space, record_parameters, cost_function, constraints=()):
+  """Rows of `df` every policy record can use, with their cost, grouped by
+  combination of the shared parameters.
+
+  Args:
+    df: pandas.DataFrame, the (filtered) data.
+    policies: List[dict], the policy records.
+    space: ScenarioSpace, the combinations of the shared parameters.
+    record_parameters: List[str], the parameters chosen per record.
+    cost_function: SeparableCost, the cost of a record.
+    constraints: List of constraints (see `what_if.constraints`). The rows
+        breaking a record-level constraint are left out.
+
+  Returns:
+    A dictionary mapping the index of a combination of `space` (see
+    `ScenarioSpace.scenario()`) to one `(costs, rows)` pair of arrays per policy
+    record, sorted by cost and then by row position. Combinations leaving a
+    record without any row are left out.
+  """
+  free = list(space.parameters) + list(record_parameters)
+  records = pd.DataFrame(list(policies), index=range(len(policies)))
+  records = records.drop(columns=[x for x in free if x in records.columns]).assign(
+    **{RECORD: np.arange(len(records))}
+  )
+  keys = [x for x in df.columns if x in records.columns]
+  rows = df.assign(**{ROW: np.arange(len(df))})
+  if keys:
+    matched = records.merge(rows, on=keys, how="inner")
+  else:
+    matched = records.merge(rows, how="cross")
+
+  flat = np.zeros(len(matched), dtype=np.int64)
+  for parameter, values, size in zip(space.parameters, space.values, space.sizes):
+    flat = flat * size + pd.Index(values).get_indexer(matched[parameter])
+  present = np.isin(flat, np.asarray(space.indices))
+  mask = row_mask(matched, constraints)
+  if mask is not None:
+    present &= np.asarray(mask)
+  costs = np.asarray(cost_function.row_costs(matched), dtype=float)[present]
+  record = matched[RECORD].to_numpy()[present]
+  row = matched[ROW].to_numpy()[present]
+  flat = flat[present]
+
+  order = np.lexsort((row, costs, record, flat))
+  costs, record, row, flat = costs[order], record[order], row[order], flat[order]
+  answer = {}
+  starts = np.flatnonzero(np.r_[True, (flat[1:] != flat[:-1]) | (record[1:] != record[:-1])])
+  ends = np.r_[starts[1:], len(flat)]
+  for start, end in zip(starts, ends):
+    answer.setdefault(int(flat[start]), []).append((costs[start:end], row[start:end]))
+  return {k: v for k, v in answer.items() if len(v) == len(records)}
+
+
+def k_best_sums(lists):
+  """Choices of one element per sorted list, by increasing sum.
+
+  Args:
+    lists: List[numpy.ndarray], non-empty arrays sorted in increasing order.
+
+  Yields:
+    `(sum, choice)` tuples, `choice` holding the position picked in every list.
+    Every combination is yielded exactly once; the next one is only computed
+    when asked for. The sums are updated incrementally: they order the
+    combinations, but may differ from the exact sums in the last bit.
+  """
+  start = tuple(0 for _ in lists)
+  heap = [(float(sum(x[0] for x in lists)), start, 0)]
+  while heap:
+    total, choice, low = heapq.heappop(heap)
+    yield total, choice
+    # Only the positions from the last one incremented onwards can be moved,
+    # so that every combination has a single parent.
+    for i in range(low, len(lists)):
+      if choice[i] + 1 < len(lists[i]):
+        child = choice[:i] + (choice[i] + 1,) + choice[i + 1:]
+        heapq.heappush(
+          heap, (total - lists[i][choice[i]] + lists[i][choice[i] + 1], child, i)
+        )
+
+
+def realize_rows(df, policies, rows):
+  """Scenario built from one row of `df` per policy record, in the order of the
+  policy, with the columns only present in the records appended."""
+  answer = df.take(list(rows)).reset_index(drop=True)
+  extra = [x for x in dict.fromkeys(k for pol in policies for k in pol) if x not in answer.columns]
+  for column in extra:
+    answer[column] = [pol.get(column) for pol in policies]
+  return answer
+
+
+# pylint: disable=too-many-arguments
+def decompose(df, policies, space, record_parameters, cost_function, keep, feasible=None,
+              constraints=(), stats=None):
+  """Finds the best scenarios when `record_parameters` are chosen per policy
+  record and accumulates them in `keep`.
+
+  Args:
+    df: pandas.DataFrame, the (filtered) data.
+    policies: List[dict], the policy records.
+    space: ScenarioSpace, the combinations of the shared parameters, see
+        `what_if.brute_force_general.enumerate_present_parameters()`.
+    record_parameters: List[str], the parameters chosen per record.
+    cost_function: SeparableCost, the cost of a record.
+    keep: KeepN, the top-N structure.
+    feasible: Callable[[pd.DataFrame], bool], optional. Check of the constraints
+        shared by the records, called on the scenario (see `realize_rows()`).
+        Rejected scenarios are skipped.
+    constraints: List of constraints (see `what_if.constraints`), applied
+        before `feasible`.
+    stats: OptimizationStats, optional. Counts the combinations enumerated and
+        rejected (see `what_if.stats`).
+
+  The items kept are `(rows, cost)` tuples, `rows` holding the position in `df`
+  of the row used by every record.
+  """
+  start = time.perf_counter()
+  candidates = candidate_rows(df, policies, space, record_parameters, cost_function,
+                              constraints)
+  if stats is not None:
+    stats.record_call(time.perf_counter() - start)
+  aggregates = [x for x in constraints if not x.row_level]
+  for index in np.asarray(space.indices):
+    lists = candidates.get(int(index))
+    if lists is None:
+      continue
+    costs = [x for x, _ in lists]
+    for total, choice in k_best_sums(costs):
+      if not total < keep.threshold:
+        break
+      rows = tuple(int(lists[i][1][x]) for i, x in enumerate(choice))
+      # Summed record by record, like `SeparableCost.total()`.
+      cost = float(sum(costs[i][x] for i, x in enumerate(choice)))
+      if stats is not None:
+        stats.evaluated += 1
+      if aggregates or feasible is not None:
+        scenario = realize_rows(df, policies, rows)
+        if not satisfied(scenario, aggregates) or (feasible is not None and not feasible(scenario)):
+          if stats is not None:
+            stats.rejected += 1
+          continue
+      keep.add_item((rows, cost))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""Incremental re-optimization when the data changes.
+
+When the price data is refreshed, only a few records usually change, yet
+`optimize()` evaluates every scenario again. `IncrementalOptimizer` keeps the
+records of the previous run and the cost of every scenario it evaluated. On the
+next run, the new records are compared with the previous ones on their hashed
+values: a changed record (or one added or removed) only belongs to the
+scenarios taking its parameter values, so only those are evaluated again. The
+others keep their stored cost, and the top-N is selected from the whole table in
+enumeration order, exactly as a full run of `optimize()` would.
+
+>>> from what_if.incremental import IncrementalOptimizer
+
+"""
+
+# pylint: disable=bad-indentation
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from what_if.brute_force_general import (
+  _finish,
+  apply_cost_to_rows,
+  enumerate_present_parameters,
+  prepare_data,
+  realize_scenario,
+)
+from what_if.cost_functions import VectorizedCost
+from what_if.keep_n import KeepN
+from what_if.key_index import KeyIndex
+from what_if.scenario_space import ScenarioSpace
+from what_if.stats import OptimizationStats
+from what_if.vectorized import (
+  DEFAULT_BLOCK_SIZE,
+  evaluate_block,
+  key_columns,
+  push_block,
+  resolve_positions,
+)
+
+ENGINES = ("auto", "loop", "vectorized")
+
+
+def changed_rows(old, new):
+  """Records of `old` and of `new` that are not found, with the same values, in
+  the other data frame.
+
+  The records are compared on the hash of their values (the index is ignored).
+  A record whose values changed is returned in both frames. When the columns
+  differ, every record is considered changed.
+
+  Returns:
+    A `(removed, added)` tuple of data frames: the records of `old` and of `new`
+    that changed.
+  """
+  if list(old.columns) != list(new.columns):
+    return old, new
+  old_hashes = pd.util.hash_pandas_object(old, index=False).to_numpy()
+  new_hashes = pd.util.hash_pandas_object(new, index=False).to_numpy()
+  return old[~np.isin(old_hashes, new_hashes)], new[~np.isin(new_hashes, old_hashes)]
+
+
+class IncrementalOptimizer:
+  """`optimize()` over successive versions of the data, only evaluating again
+  the scenarios that use a record that changed.
+
+  Attributes:
+    data: pandas.DataFrame, the records kept by the last run (after the policy,
+        the filters and the data-level constraints).
+    costs: pandas.Series, the cost of every scenario of the last run, indexed by
+        the values of the parameters.
+  """
+
+  # pylint: disable=too-many-arguments
+  def __init__(self, parameters, policies, filters, cost_function, top_n=3, engine="auto",
+               block_size=DEFAULT_BLOCK_SIZE, constraints=None):
+    """Class initializer. The arguments are the ones of `optimize()`.
+
+    Args:
+        parameters: List[str], the columns to optimize (at least one).
+        policies: List[dict], the policy records.
+        filters: dict, the admissible values of some columns.
+        cost_function: Callable, the cost of a scenario.
+        top_n: int, how many results are returned.
+        engine: str, "loop", "vectorized" or "auto" (see `optimize()`).
+        block_size: int, how many scenarios the vectorized engine evaluates at once.
+        constraints: List, optional. Declarative constraints (see
+            `what_if.constraints`).
+    """
+    if engine not in ENGINES:
+      raise ValueError(f"Unknown engine {engine!r}, expected one of {ENGINES}")
+    if engine == "vectorized" and not isinstance(cost_function, VectorizedCost):
+      raise ValueError("The vectorized engine requires a cost function declared with "
+                       "what_if.cost_functions.vectorized")
+    if not parameters:
+      raise ValueError("Incremental optimization requires at least one parameter")
+    if block_size <= 0:
+      raise ValueError("The block size should be a positive integer.")
+    if top_n <= 0:
+      raise ValueError("The number of results should be a positive integer.")
+    self.parameters = list(parameters)
+    self.policies = policies
+    self.filters = filters
+    self.cost_function = cost_function
+    self.top_n = top_n
+    self.block_size = block_size
+    self.constraints = constraints
+    self.use_vectorized = engine != "loop" and isinstance(cost_function, VectorizedCost)
+    self.data = None
+    self.costs = None
+
+  def optimize(self, df, return_stats=False, stats_callback=None):
+    """Optimizes the scenarios against `df`, a new version of the data.
+
+    The first call evaluates every scenario. The next ones only evaluate the
+    scenarios that are new or use a record of `df` that changed since the
+    previous call; the statistics count those in `evaluated`.
+
+    Args:
+        df: pandas.DataFrame, the data.
+        return_stats: bool, whether to also return the statistics of the run.
+        stats_callback: Callable[[OptimizationStats], None], optional. Called
+            with the statistics at the end of the run.
+
+    Returns:
+        The results of `optimize(df, ...)`: a list of `top_n` `(scenario, cost)`
+        tuples, or a `(results, stats)` tuple with `return_stats`.
+    """
+    stats = OptimizationStats()
+    df, constraints = prepare_data(df, self.parameters, self.policies, self.filters,
+                                   self.constraints, stats)
+    with stats.stage("enumeration"):
+      space = enumerate_present_parameters(df, self.policies, self.parameters)
+    stats.enumerated = space.size
+    stats.missing_rows = space.size - len(space)
+    with stats.stage("index"):
+      index = KeyIndex(df, key_columns(df, self.parameters, self.policies))
+
+    with stats.stage("diff"):
+      keys = pd.MultiIndex.from_frame(space.to_frame())
+      costs = np.full(len(space), np.nan)
+      stale = np.ones(len(space), dtype=bool)
+      if self.costs is not None:
+        removed, added = changed_rows(self.data, df)
+        touched = pd.concat([removed[self.parameters], added[self.parameters]])
+        positions = self.costs.index.get_indexer(keys)
+        known = positions >= 0
+        costs[known] = self.costs.to_numpy()[positions[known]]
+        stale = ~known | keys.isin(pd.MultiIndex.from_frame(touched))
+        logging.info("%d records changed, evaluating %d of %d scenarios again",
+                     len(removed) + len(added), int(stale.sum()), len(space))
+
+    with stats.stage("evaluation"):
+      indices = np.asarray(space.indices, dtype=np.int64)
+      stale_space = ScenarioSpace(space.parameters, space.values, indices[stale])
+      costs[stale] = self._evaluate(index, stale_space, constraints, stats)
+    self.data = df
+    self.costs = pd.Series(costs, index=keys)
+
+    with stats.stage("materialization"):
+      keep = KeepN(self.top_n)
+      push_block(keep, costs, indices)
+      results = [
+        (realize_scenario(index, space.scenario(position), self.policies, cost), cost)
+        for position, cost in keep.return_results()
+      ]
+    return _finish(results, stats, return_stats, stats_callback)
+
+  def _evaluate(self, index, space, constraints, stats):
+    """Costs of the scenarios of `space`, in order."""
+    if self.use_vectorized:
+      blocks = [
+        evaluate_block(index.df, self.policies, self.parameters,
+                       space[start:start + self.block_size], self.cost_function, index,
+                       constraints, stats)
+        for start in range(0, len(space), self.block_size)
+      ]
+      return np.concatenate(blocks) if blocks else np.zeros(0)
+    positions = resolve_positions(index.df, self.policies, self.parameters, space, index)
+    return np.array([
+      apply_cost_to_rows(index, rows, self.policies, self.cost_function, constraints, stats)[1]
+      for rows in positions.T
+    ], dtype=float)
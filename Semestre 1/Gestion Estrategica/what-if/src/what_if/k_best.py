@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""K-best engine for separable cost functions.
+
+When the cost of a scenario is the sum of a cost per policy record (see
+`what_if.cost_functions.separable`), every policy record ranks the rows it can
+use, i.e. the scenarios, by cost. The engine reads these sorted lists in
+parallel, a few rows at a time (threshold algorithm): every scenario seen in one
+of the lists is scored by looking its row up in the list of every other record,
+and the sum of the costs at the reading positions bounds the cost of every
+scenario not seen yet. The search stops as soon as the top-N found is below that
+bound, which usually happens after reading a small fraction of the lists when
+`top_n` is small.
+
+The scenarios seen are added to the top-N structure in enumeration order, so the
+results are the ones of the brute-force engines, ties included (see
+`KeepN(keep_ties=True)`).
+
+"""
+
+# pylint: disable=bad-indentation
+
+import logging
+import time
+
+import numpy as np
+
+from what_if.branch_and_bound import COST, RECORD, code_column, record_costs
+from what_if.constraints import scenario_mask
+from what_if.keep_n import KeepN
+from what_if.key_index import KeyIndex
+from what_if.scenario_space import ScenarioSpace
+from what_if.vectorized import ScenarioColumns, key_columns, push_block, resolve_positions
+
+
+class SortedRecord:
+  """Rows usable by a policy record, as scenarios: sorted by cost for the
+  sequential reads and by scenario index for the lookups."""
+
+  def __init__(self, scenarios, costs, index, index_costs):
+    """Class initializer.
+
+    Args:
+        scenarios: np.ndarray, the index of the scenario of every row, in order
+            of cost (then of scenario index).
+        costs: np.ndarray, the cost of the record for every row, ascending.
+        index: np.ndarray, the same scenarios in ascending order.
+        index_costs: np.ndarray, the costs in the order of `index`.
+    """
+    self.scenarios = scenarios
+    self.costs = costs
+    self.index = index
+    self.index_costs = index_costs
+
+  def lookup(self, scenarios):
+    """Cost of the record in every scenario of `scenarios`, inf when it has no
+    row."""
+    position = np.searchsorted(self.index, scenarios)
+    position = np.minimum(position, len(self.index) - 1)
+    return np.where(self.index[position] == scenarios, self.index_costs[position], np.inf)
+
+
+def sorted_records(records, scenarios, costs, n_records):
+  """One `SortedRecord` per policy record, from the (record, scenario, cost)
+  triples of its usable rows; None when a record has no row."""
+  costs = np.where(np.isnan(costs), np.inf, costs)
+  by_cost = np.lexsort([scenarios, costs, records])
+  by_index = np.lexsort([scenarios, records])
+  bounds = np.searchsorted(records[by_cost], np.arange(n_records + 1))
+  if (np.diff(bounds) == 0).any():
+    return None
+  answer = []
+  for start, stop in zip(bounds[:-1], bounds[1:]):
+    cost_order, index_order = by_cost[start:stop], by_index[start:stop]
+    answer.append(SortedRecord(scenarios[cost_order], costs[cost_order],
+                               scenarios[index_order], costs[index_order]))
+  return answer
+
+
+# pylint: disable=too-many-arguments, too-many-locals
+def k_best(df, policies, space, cost_function, keep, constraints=(), index=None, stats=None):
+  """Finds the best scenarios of `space` and accumulates them in `keep`.
+
+  The record-level `constraints` remove rows before the lists are sorted. The
+  other ones are checked on the scenarios seen, realized with `index` (a
+  `KeyIndex` of `df`); a rejected scenario only costs its lookups.
+
+  The items kept are `(scenario index, cost)` tuples, see
+  `ScenarioSpace.scenario()`. The scenarios seen are counted as evaluated in
+  `stats` (a `what_if.stats.OptimizationStats`) when given.
+  """
+  if not space.parameters:
+    raise ValueError("The k-best engine requires at least one parameter.")
+  start = time.perf_counter()
+  costs = record_costs(df, policies, space, cost_function, constraints)
+  if stats is not None:
+    stats.record_call(time.perf_counter() - start)
+  flat = np.ravel_multi_index(
+    tuple(costs[code_column(x)].to_numpy() for x in space.parameters), space.sizes
+  ) if len(costs) else np.zeros(0, dtype=np.int64)
+  lists = sorted_records(costs[RECORD].to_numpy(), flat, costs[COST].to_numpy(dtype=float),
+                         len(policies))
+  if lists is None:
+    return
+  aggregates = [x for x in constraints if not x.row_level]
+  if aggregates and index is None:
+    index = KeyIndex(df, key_columns(df, space.parameters, policies))
+
+  seen = np.zeros(0, dtype=np.int64)
+  scores = np.zeros(0)
+  cursor, step = 0, keep.n
+  while True:
+    found = np.unique(np.concatenate([x.scenarios[cursor:cursor + step] for x in lists]))
+    found = found[~np.isin(found, seen)]
+    cursor += step
+    step *= 2
+    if found.size:
+      # Summed record by record, in the order of the brute-force engines.
+      total = np.zeros(found.size)
+      for record in lists:
+        total = total + record.lookup(found)
+      complete = np.isfinite(total)
+      if aggregates and complete.any():
+        subspace = ScenarioSpace(space.parameters, space.values, found[complete])
+        positions = resolve_positions(df, policies, space.parameters, subspace, index)
+        feasible = scenario_mask(ScenarioColumns(df, policies, positions), aggregates,
+                                 len(subspace))
+        if stats is not None:
+          stats.rejected += int((~feasible).sum())
+        total[np.flatnonzero(complete)[~feasible]] = np.inf
+      if stats is not None:
+        stats.evaluated += int(complete.sum())
+      seen = np.concatenate([seen, found])
+      scores = np.concatenate([scores, total])
+
+    bound = 0.0
+    for record in lists:
+      bound = bound + (record.costs[cursor] if cursor < len(record.costs) else np.inf)
+    if not np.isfinite(bound):
+      break
+    trial = KeepN(keep.n, keep.keep_ties)
+    order = np.argsort(seen, kind="stable")
+    push_block(trial, scores[order], seen[order])
+    if len(trial) == keep.n and trial.threshold < bound:
+      break
+
+  logging.info("The k-best engine scored %d of %d scenarios", len(seen), len(space))
+  order = np.argsort(seen, kind="stable")
+  push_block(keep, scores[order], seen[order])
@@ -4,52 +4,96 @@
 # pylint: disable=missing-module-docstring
 # pylint: disable=bad-indentation
 
+import heapq
+from itertools import count
+
+
 class KeepN:
   """This is a lightweight structure to keep the top N results (based on the lowest cost).
 
-  We try to keep a tradeoff between memory usage and abusive sorting by
-  accumulating all the results without doing anything and sorting/keeping the
-  relevant results periodically.
+  The results are kept in a bounded max-heap ordered on the cost: adding an item
+  is O(log n), the worst kept cost is available in O(1) through `threshold`,
+  and the memory stays O(n) regardless of how many items are streamed through.
+  Engines can use `threshold` to skip the work for scenarios that cannot be
+  kept anymore.
 
   The container currently only accepts tuple of the following form. We compare
   on the `cost`.
 
   (results, cost)
 
+  Infinite costs are never kept, and neither are costs equal to the cost of an
+  item already kept (the first item added wins), unless `keep_ties` is set: the
+  structure then keeps the first `n` items in order of cost and, among equal
+  costs, of addition.
+
+  With an `order`, equal costs are ranked on `order(item)` instead of the order
+  of addition, so that the items kept do not depend on the order in which they
+  are added (e.g. `order=lambda x: x[0]` ranks scenarios by index).
+
   """
 
-  def __init__(self, n: int):
+  def __init__(self, n: int, keep_ties: bool = False, order=None):
     """Class initializer.
 
     Args:
         n: int, number of elements we wish to retrun when we call `reture_results()`.
+        keep_ties: bool, whether items with the same cost as an item kept are
+            kept too.
+        order: Callable[[tuple], float], optional. Rank of an item among the
+            items with the same cost, the lowest first. Defaults to the order
+            of addition.
     """
 
     if n <= 0:
         raise ValueError("The number of elements in the KeepN "
                           "structure should be a positive integer.")
     self.n = n
-    self._n = n  # Utility counter which keeps track of how many elements we have
-    self.container = []  # Container for the values.
+    self.keep_ties = keep_ties
+    self.order = order
+    self._heap = []  # Entries are (-cost, -rank, item): the root is the worst item.
+    self._costs = {}  # Rank of the item kept for every cost, to reject duplicates in O(1).
+    self._sequence = count()  # Insertion order, used to break ties without `order`.
+
+  def __len__(self):
+    return len(self._heap)
 
-  def _sort_and_clean(self):
-    """Cleaning routine. Removes all but the best `n` results."""
-    self.container.sort(key=lambda x: x[1])
-    self.container = self.container[0 : self.n]
-    self._n = self.n
+  @property
+  def threshold(self):
+    """Cost an item needs to beat to be kept: the worst kept cost once the
+    structure is full, infinity before."""
+    if len(self._heap) < self.n:
+      return float("inf")
+    return -self._heap[0][0]
 
   def add_item(self, item):
-    """Adds an item to the structure"""
-    if item[1] < float("inf") and item[1] not in [x[1] for x in self.container]:
-      self.container.append(item)
-      self._n += 1
-    if self._n > self.n * 10000:
-      self._sort_and_clean()
-      print("Intermediate cleaning. Result set:")
-      print(self.return_results())
-      print("\n\n")
+    """Adds an item to the structure. Returns whether the item was kept."""
+    cost = item[1]
+    if self.order is None:
+      if not cost < self.threshold or (not self.keep_ties and cost in self._costs):
+        return False
+      rank = next(self._sequence)
+    else:
+      rank = self.order(item)
+      if not cost < float("inf"):
+        return False
+      if len(self._heap) == self.n and (-self._heap[0][0], -self._heap[0][1]) <= (cost, rank):
+        return False
+      if not self.keep_ties and cost in self._costs:
+        if self._costs[cost] <= rank:
+          return False
+        # The item replaces the one kept with the same cost.
+        self._heap = [x for x in self._heap if x[0] != -cost]
+        heapq.heapify(self._heap)
+    entry = (-cost, -rank, item)
+    if len(self._heap) < self.n:
+      heapq.heappush(self._heap, entry)
+    else:
+      _, _, worst = heapq.heapreplace(self._heap, entry)
+      self._costs.pop(worst[1], None)
+    self._costs[cost] = rank
+    return True
 
   def return_results(self):
     """Returns the top `n` results in a list."""
-    self._sort_and_clean()
-    return [x for x in self.container if x[1] < float("inf")]
+    return [x[2] for x in sorted(self._heap, key=lambda x: (-x[0], -x[1]))]
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+"""Integer-coded index of the records of a data frame on the columns tying them
+to a scenario.
+
+Realizing a scenario used to merge the policy records (with the scenario
+parameters) against the whole data frame. `KeyIndex` dictionary-encodes every
+key column once: each label gets a small integer code, and the codes of a row
+are packed into a single integer key. Scenarios are then resolved on integer
+arrays (see `what_if.vectorized.resolve_positions()`), the records are fetched
+with a positional `take`, and the labels are only read back from the data frame
+for the scenarios returned.
+
+"""
+
+# pylint: disable=bad-indentation
+
+import numpy as np
+import pandas as pd
+
+# Packed keys are compressed (re-coded) before they could overflow an int64.
+_PACKED_LIMIT = 2**62
+
+
+class KeyIndex:
+  """Maps the values of the key columns of `df` to row positions.
+
+  The key values must identify a single row of `df` (as checked by
+  `optimize()`).
+
+  Attributes:
+    df: pandas.DataFrame, the data indexed.
+    columns: List[str], the key columns.
+    labels: dict, mapping every key column to the `pd.Index` of its distinct
+        values; the code of a value is its position in the index.
+  """
+
+  def __init__(self, df, columns):
+    """Class initializer.
+
+    Args:
+        df: pandas.DataFrame, the data to index.
+        columns: List[str], the key columns (see `what_if.vectorized.key_columns`).
+    """
+    if not columns:
+      raise ValueError("At least one key column is needed to index the records.")
+    self.df = df
+    self.columns = list(columns)
+    self.labels = {}
+    codes = {}
+    for column in self.columns:
+      codes[column], uniques = pd.factorize(df[column], use_na_sentinel=False)
+      self.labels[column] = pd.Index(uniques)
+    # Steps replayed on the codes of a query to pack them like the rows: the
+    # size of every column, or the distinct packed keys when compressing.
+    self._steps = []
+    self._keys = pd.Index(self._pack(codes, build=True))
+
+  def _pack(self, codes, build=False):
+    """Packs the codes of every key column (arrays broadcasting together) into
+    one integer key (mixed radix); -1 where a code is missing."""
+    packed = np.zeros((), dtype=np.int64)
+    missing = np.zeros((), dtype=bool)
+    bound, step = 1, 0
+    for column in self.columns:
+      size = max(len(self.labels[column]), 1)
+      if bound * size > _PACKED_LIMIT:
+        if build:
+          self._steps.append(pd.Index(pd.unique(packed.reshape(-1))))
+        packed = self._steps[step].get_indexer(packed.reshape(-1)).reshape(packed.shape)
+        missing = missing | (packed < 0)
+        bound, step = len(self._steps[step]), step + 1
+      code = np.asarray(codes[column], dtype=np.int64)
+      missing = missing | (code < 0)
+      packed = packed * size + code
+      bound *= size
+    return np.where(missing, -1, packed)
+
+  def encode(self, column, values):
+    """Codes of `values` (labels of the key column `column`), -1 when unknown."""
+    if not hasattr(values, "dtype"):
+      values = pd.Series(list(values), dtype=object).to_numpy()
+    return self.labels[column].get_indexer(values.reshape(-1)).reshape(values.shape)
+
+  def find(self, codes):
+    """Row positions of packed codes.
+
+    Args:
+      codes: Mapping of every key column to an integer array of codes (see
+          `encode()`); the arrays broadcast together.
+
+    Returns:
+      An integer array of row positions, -1 where there is no matching row.
+    """
+    packed = self._pack(codes)
+    answer = self._keys.get_indexer(packed.reshape(-1)).reshape(packed.shape)
+    return np.where(packed < 0, -1, answer)
+
+  def lookup(self, frame):
+    """Row positions of the keys held by the rows of `frame` (-1 when missing)."""
+    return self.find({x: self.encode(x, frame[x].to_numpy()) for x in self.columns})
+
+  def locate(self, records):
+    """Row positions of the keys of `records` (dictionaries), -1 when missing."""
+    if not records:
+      return np.zeros(0, dtype=np.int64)
+    return self.find({x: self.encode(x, [rec.get(x) for rec in records]) for x in self.columns})
+
+  def position(self, record):
+    """Row position of the key of `record` (a dictionary), None when missing."""
+    position = int(self.locate([record])[0])
+    return None if position < 0 else position
+
+  def take(self, positions, records):
+    """Rows of `df` at `positions` (one per record of `records`), as
+    `df.merge(pd.DataFrame(records))` would return them: in the order of `df`,
+    with the columns only present in the records appended."""
+    order = np.argsort(np.asarray(positions, dtype=np.int64), kind="stable")
+    answer = self.df.take(np.asarray(positions, dtype=np.int64)[order]).reset_index(drop=True)
+    extra = [x for x in dict.fromkeys(k for rec in records for k in rec) if x not in answer.columns]
+    for column in extra:
+      answer[column] = [records[i].get(column) for i in order]
+    return answer
+
+  def realize(self, records):
+    """Rows of `df` matching `records`, as `df.merge(pd.DataFrame(records))` would
+    return them. Records without a match are left out."""
+    positions = self.locate(records)
+    found = positions >= 0
+    return self.take(positions[found], [rec for rec, x in zip(records, found) if x])
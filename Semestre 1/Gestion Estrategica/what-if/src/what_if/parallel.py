@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+"""Multi-core execution of the optimization routine.
+
+The scenario space is split in contiguous shards evaluated by a pool of worker
+processes. The workers are forked from the calling process, so they inherit the
+filtered data frame, the policy and the cost function (lambdas included) without
+pickling them: only the position of a shard travels to a worker, and only its
+local top-N travels back.
+
+"""
+
+# pylint: disable=bad-indentation
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+SHARDS_PER_JOB = 4
+
+# State inherited by the forked workers. Only set while a pool is running.
+_SHARED = {}
+
+
+def fork_available():
+  """Whether worker processes can be forked on this platform."""
+  return "fork" in multiprocessing.get_all_start_methods()
+
+
+def resolve_n_jobs(n_jobs):
+  """Number of worker processes to use. Negative values count back from the
+  number of CPUs (-1 uses all of them, -2 all but one, ...)."""
+  if n_jobs is None:
+    return 1
+  if n_jobs == 0:
+    raise ValueError("The number of jobs should be a non-zero integer.")
+  if n_jobs < 0:
+    return max((os.cpu_count() or 1) + 1 + n_jobs, 1)
+  return n_jobs
+
+
+def map_shards(function, space, n_jobs, shards_per_job=SHARDS_PER_JOB):
+  """Calls `function(shard)` for every shard of `space` in a pool of `n_jobs`
+  forked processes.
+
+  Returns:
+    The results of every call, in the order of the shards.
+  """
+  _SHARED["task"] = (function, space.shards(n_jobs * shards_per_job))
+  try:
+    with ProcessPoolExecutor(max_workers=n_jobs,
+                             mp_context=multiprocessing.get_context("fork")) as executor:
+      return list(executor.map(_run_shard, range(len(_SHARED["task"][1]))))
+  finally:
+    _SHARED.clear()
+
+
+def _run_shard(position):
+  """Worker entry point: evaluates the shard at `position`."""
+  function, shards = _SHARED["task"]
+  return function(shards[position])
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""Multi-objective optimization: the Pareto front of the scenarios.
+
+Trading the total cost against the number of nights, of travel days or the hotel
+stars used to take one run of `optimize()` per combination of weights. Given
+several objective functions (a mapping of names to cost functions, all
+minimized), `optimize()` instead returns the Pareto-optimal scenarios: the ones
+no other scenario matches or beats on every objective while beating them on
+one.
+
+`ParetoFront` replaces `KeepN` in this mode. It only holds the non-dominated
+scenarios found so far, as `(scenario index, costs)` items: a new scenario
+dominated by one of them is rejected, and the ones it dominates are pruned, so
+the memory is bounded by the size of the front rather than by the number of
+scenarios evaluated.
+
+>>> from what_if.pareto import ParetoFront
+
+"""
+
+# pylint: disable=bad-indentation
+
+import time
+from collections.abc import Mapping
+
+import numpy as np
+
+from what_if.constraints import scenario_mask
+from what_if.cost_functions import VectorizedCost
+from what_if.vectorized import DEFAULT_BLOCK_SIZE, ScenarioColumns, resolve_positions
+
+# Kept points compared at once with a block of candidates, to bound the memory
+# of the comparison to `CHUNK * block size * objectives` booleans.
+CHUNK = 1024
+
+
+def as_objectives(cost_function):
+  """The objectives of a multi-objective `cost_function` (a mapping of names to
+  cost functions) as a dictionary; None for a single cost function."""
+  if not isinstance(cost_function, Mapping):
+    return None
+  objectives = dict(cost_function)
+  if not objectives:
+    raise ValueError("At least one objective function is needed.")
+  if not all(callable(x) for x in objectives.values()):
+    raise ValueError("Every objective must be a cost function.")
+  return objectives
+
+
+class ParetoFront:
+  """Non-dominated `(item, costs)` items, every objective being minimized.
+
+  An item dominates another when its costs are lower or equal on every
+  objective and lower on one. Items with a non-finite cost are never kept, and
+  neither are items with the same costs as an item already kept (the first item
+  added wins), like in `KeepN`.
+
+  Attributes:
+    names: List[str], the names of the objectives, in the order of the costs.
+  """
+
+  def __init__(self, names):
+    """Class initializer.
+
+    Args:
+        names: List[str], the names of the objectives (at least one).
+    """
+    if not names:
+      raise ValueError("The Pareto front needs at least one objective.")
+    self.names = list(names)
+    self._costs = np.empty((16, len(self.names)))  # Rows [:len(self)] are kept.
+    self._items = []
+
+  def __len__(self):
+    return len(self._items)
+
+  @property
+  def costs(self):
+    """Array of the costs kept, of shape `(len(self), objectives)`."""
+    return self._costs[:len(self._items)]
+
+  def dominated(self, costs):
+    """Mask of the rows of `costs` (an array of shape `(n, objectives)`) matched
+    or dominated by an item kept."""
+    costs = np.asarray(costs, dtype=float).reshape(-1, len(self.names))
+    answer = np.zeros(len(costs), dtype=bool)
+    kept = self.costs
+    for start in range(0, len(kept), CHUNK):
+      chunk = kept[start:start + CHUNK]
+      answer |= (chunk[:, np.newaxis, :] <= costs[np.newaxis, :, :]).all(axis=2).any(axis=0)
+    return answer
+
+  def add_item(self, item):
+    """Adds an `(item, costs)` item, pruning the items it dominates. Returns
+    whether the item was kept."""
+    costs = np.asarray(item[1], dtype=float).reshape(-1)
+    if costs.shape != (len(self.names),):
+      raise ValueError(f"Expected {len(self.names)} costs, got {costs.size}")
+    if not np.isfinite(costs).all() or self.dominated(costs)[0]:
+      return False
+    size = len(self._items)
+    if size:
+      keep = ~(costs <= self._costs[:size]).all(axis=1)
+      if not keep.all():
+        self._items = [x for x, kept in zip(self._items, keep) if kept]
+        self._costs[:len(self._items)] = self._costs[:size][keep]
+        size = len(self._items)
+    if size == len(self._costs):
+      self._costs = np.concatenate([self._costs, np.empty_like(self._costs)])
+    self._costs[size] = costs
+    self._items.append((item[0], tuple(float(x) for x in costs)))
+    return True
+
+  def push_block(self, costs, indices):
+    """Adds the items `(indices[i], costs[i])` of a block, `costs` being an array
+    of shape `(len(indices), objectives)`.
+
+    The candidates dominated by the front are discarded at once; the others are
+    added in lexicographic order of their costs (then of enumeration), so none
+    of them is pruned by a later one of the block. The front ends up in the same
+    state as when adding every item one by one in enumeration order.
+    """
+    costs = np.asarray(costs, dtype=float).reshape(len(indices), len(self.names))
+    candidates = np.flatnonzero(np.isfinite(costs).all(axis=1))
+    candidates = candidates[~self.dominated(costs[candidates])]
+    if candidates.size == 0:
+      return
+    order = np.lexsort([candidates] + [costs[candidates, i]
+                                       for i in reversed(range(len(self.names)))])
+    for i in candidates[order]:
+      self.add_item((int(indices[i]), costs[i]))
+
+  def return_results(self):
+    """Returns the items kept, in lexicographic order of their costs."""
+    return sorted(self._items, key=lambda x: x[1])
+
+
+# pylint: disable=too-many-arguments, too-many-locals
+def evaluate_objectives(index, policies, scenarios, objectives, front, use_vectorized,
+                        block_size=DEFAULT_BLOCK_SIZE, progress=None, constraints=(),
+                        stats=None):
+  """Evaluates every objective on the scenarios of a `ScenarioSpace` against the
+  data indexed by `index` (a `KeyIndex`), and accumulates the non-dominated ones
+  in `front` (a `ParetoFront`).
+
+  Like in `what_if.brute_force_general.evaluate_scenarios()`, the scenarios of a
+  block are resolved to row positions at once, and the ones missing a record or
+  breaking one of the `constraints` are rejected before any objective is
+  computed. The vectorized engine scores the whole block with every objective
+  (each declared with `what_if.cost_functions.vectorized`); the loop engine
+  realizes every scenario once and calls every objective on it. A NaN cost
+  counts as infinite, which rejects the scenario. `progress` (a
+  `what_if.stats.Progress`) and `stats` (a `what_if.stats.OptimizationStats`)
+  are updated when given."""
+  functions = list(objectives.values())
+  for start in range(0, len(scenarios), block_size):
+    block = scenarios[start:start + block_size]
+    positions = resolve_positions(index.df, policies, scenarios.parameters, block, index)
+    costs = np.full((positions.shape[1], len(functions)), np.inf)
+    complete = (positions >= 0).all(axis=0)
+    if stats is not None:
+      stats.missing_rows += int((~complete).sum())
+    if constraints and complete.any():
+      feasible = scenario_mask(ScenarioColumns(index.df, policies, positions[:, complete]),
+                               constraints, int(complete.sum()))
+      if stats is not None:
+        stats.rejected += int((~feasible).sum())
+      complete[complete] = feasible
+    if complete.any():
+      rows = positions[:, complete]
+      if use_vectorized:
+        columns = ScenarioColumns(index.df, policies, rows)
+        values = np.empty((rows.shape[1], len(functions)))
+        for i, function in enumerate(functions):
+          started = time.perf_counter()
+          values[:, i] = function.evaluate(columns)
+          if stats is not None:
+            stats.record_call(time.perf_counter() - started)
+      else:
+        values = np.empty((rows.shape[1], len(functions)))
+        for j, scenario_rows in enumerate(rows.T):
+          scenario = index.take(scenario_rows, policies)
+          for i, function in enumerate(functions):
+            started = time.perf_counter()
+            values[j, i] = function(scenario)
+            if stats is not None:
+              stats.record_call(time.perf_counter() - started)
+      values = np.where(np.isnan(values), np.inf, values)
+      if stats is not None:
+        stats.evaluated += len(values)
+        stats.rejected += int((~np.isfinite(values).all(axis=1)).sum())
+      costs[complete] = values
+    front.push_block(costs, np.asarray(block.indices))
+    if progress is not None:
+      progress.update(len(block))
+
+
+def vectorized_objectives(objectives):
+  """Whether every objective can be evaluated by the vectorized engine."""
+  return all(isinstance(x, VectorizedCost) for x in objectives.values())
+
+
+def label_scenario(scenario, names, costs):
+  """Adds a column per objective to a realized scenario, holding its cost."""
+  for name, cost in zip(names, costs):
+    scenario[name] = cost
+  return scenario
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""Lazy representation of the scenarios explored by the optimization routine.
+
+The scenario space is the cartesian product of the values taken by every
+parameter. Instead of materializing the product, `ScenarioSpace` numbers the
+scenarios (in the order of `itertools.product`) and decodes them on demand. Its
+length is known up front, it can be sliced by index range to shard the work, and
+iterating over it yields one scenario at a time.
+
+>>> space = ScenarioSpace(["destination", "stars"], [["NYC", "LAX"], [4, 5]])
+>>> len(space), space[1], len(space[1:3])
+(4, {'destination': 'NYC', 'stars': 5}, 2)
+
+"""
+
+# pylint: disable=bad-indentation
+
+from collections.abc import Sequence
+from math import prod
+
+import numpy as np
+import pandas as pd
+
+
+class ScenarioSpace(Sequence):
+  """Lazy sequence of scenarios (dictionaries mapping every parameter to a value)."""
+
+  def __init__(self, parameters, values, indices=None):
+    """Class initializer.
+
+    Args:
+        parameters: Sequence[str], the parameters explored by the scenarios.
+        values: Sequence[Sequence], the values taken by every parameter.
+        indices: range or np.ndarray, optional. Positions (in the full product)
+            of the scenarios that belong to this space. Defaults to all of them.
+    """
+    if len(parameters) != len(values):
+      raise ValueError("Every parameter should have a list of values.")
+    self.parameters = tuple(parameters)
+    self.values = tuple(list(x) for x in values)
+    self.sizes = tuple(len(x) for x in self.values)
+    self.size = prod(self.sizes)
+    self.indices = range(self.size) if indices is None else indices
+
+  def __len__(self):
+    return len(self.indices)
+
+  def __getitem__(self, item):
+    if isinstance(item, slice):
+      return self.__class__(self.parameters, self.values, self.indices[item])
+    return self.scenario(int(self.indices[item]))
+
+  def __iter__(self):
+    for index in self.indices:
+      yield self.scenario(int(index))
+
+  def codes(self, index):
+    """Position of the value of every parameter for the scenario numbered `index`
+    (in the full product)."""
+    answer = []
+    for size in reversed(self.sizes):
+      index, code = divmod(index, size)
+      answer.append(code)
+    return tuple(reversed(answer))
+
+  def index_of(self, codes):
+    """Inverse of `codes()`: the number of the scenario (in the full product)."""
+    index = 0
+    for size, code in zip(self.sizes, codes):
+      index = index * size + code
+    return index
+
+  def scenario(self, index):
+    """Scenario numbered `index` (in the full product)."""
+    return {
+      parameter: values[code]
+      for parameter, values, code in zip(self.parameters, self.values, self.codes(index))
+    }
+
+  def shards(self, count):
+    """Splits the space into (at most) `count` contiguous slices of similar length."""
+    if count <= 0:
+      raise ValueError("The number of shards should be a positive integer.")
+    bounds = np.linspace(0, len(self), min(count, max(len(self), 1)) + 1).astype(int)
+    return [self[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+  def to_frame(self):
+    """The scenarios as a data frame (one column per parameter, one row per scenario)."""
+    flat = np.asarray(self.indices, dtype=np.int64)
+    columns = {}
+    for parameter, values, size in reversed(list(zip(self.parameters, self.values, self.sizes))):
+      flat, codes = np.divmod(flat, size)
+      columns[parameter] = pd.Series(values).take(codes).reset_index(drop=True)
+    return pd.DataFrame({x: columns[x] for x in self.parameters}, index=range(len(self)))
+
+
+class PolicyScenarios(Sequence):
+  """Lazy sequence of realized scenarios: every scenario of a `ScenarioSpace`
+  merged into the policy records, as `merge_scenario_parameter_with_policy()`
+  would do."""
+
+  def __init__(self, space, policy):
+    self.space = space
+    self.policy = policy
+
+  def __len__(self):
+    return len(self.space)
+
+  def __getitem__(self, item):
+    if isinstance(item, slice):
+      return self.__class__(self.space[item], self.policy)
+    return self._merge(self.space[item])
+
+  def __iter__(self):
+    for scenario in self.space:
+      yield self._merge(scenario)
+
+  def _merge(self, scenario):
+    return [pol | scenario for pol in self.policy]
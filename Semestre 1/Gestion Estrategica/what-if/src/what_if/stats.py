@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+"""Instrumentation of the optimization routine.
+
+`optimize(..., return_stats=True)` returns an `OptimizationStats` next to the
+results. It holds the wall time (and, on demand, the peak memory) of every stage
+of the routine, the number of scenarios enumerated, missing a record, rejected
+(by a constraint or an infinite cost), evaluated and kept, and the latency of
+the calls to the cost function. `Progress` is the throttled progress hook of
+`optimize(..., progress=...)`.
+
+"""
+
+# pylint: disable=bad-indentation
+
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+
+LATENCY_SAMPLES = 10_000
+PERCENTILES = (50, 90, 99)
+
+
+class OptimizationStats:
+  """Counters and timings of one call to `optimize()`.
+
+  Attributes:
+    stages: dict, mapping the name of a stage to its wall time (`seconds`) and,
+        when memory is traced, the peak memory allocated during the stage
+        (`peak_mb`), in execution order.
+    enumerated: int, number of combinations of parameters.
+    missing_rows: int, combinations missing a record for a policy record.
+    rejected: int, scenarios rejected by a constraint or scored as infinite (or
+        NaN) by the cost function.
+    evaluated: int, scenarios scored by the cost function (or bounded, for the
+        branch-and-bound engine).
+    kept: int, number of results returned.
+    cost_calls: int, number of calls to the cost function. The vectorized and
+        separable engines score many scenarios per call.
+    proven_optimal: bool, False when a budget (`deadline`, `max_evaluations`)
+        stopped the run before the results could be proven to be the best ones.
+    remaining: int, number of scenarios left unexplored by such a run.
+    cache_hits: int, scenarios which cost was found in the cost cache (see
+        `what_if.cost_cache`), counted as evaluated.
+    cache_misses: int, scenarios looked up in the cost cache and not found.
+  """
+
+  def __init__(self, trace_memory=False):
+    """Class initializer.
+
+    Args:
+        trace_memory: bool, whether to trace the peak memory of every stage with
+            `tracemalloc` (slows the routine down noticeably).
+    """
+    self.trace_memory = trace_memory
+    self.stages = {}
+    self.enumerated = 0
+    self.missing_rows = 0
+    self.rejected = 0
+    self.evaluated = 0
+    self.kept = 0
+    self.cost_calls = 0
+    self.cost_seconds = 0.0
+    self.proven_optimal = True
+    self.remaining = 0
+    self.cache_hits = 0
+    self.cache_misses = 0
+    self._latencies = []
+    self._random = random.Random(0)
+
+  @contextmanager
+  def stage(self, name):
+    """Context manager timing the stage `name`."""
+    started = False
+    if self.trace_memory:
+      if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        started = True
+      tracemalloc.reset_peak()
+      base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      entry = self.stages.setdefault(name, {"seconds": 0.0})
+      entry["seconds"] += time.perf_counter() - start
+      if self.trace_memory:
+        peak = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+        entry["peak_mb"] = max(entry.get("peak_mb", 0.0), peak)
+        if started:
+          tracemalloc.stop()
+
+  def record_cost(self, seconds, costs):
+    """Records a call to the cost function lasting `seconds`, which scored the
+    scenarios of `costs` (a number or an array)."""
+    costs = np.atleast_1d(np.asarray(costs, dtype=float))
+    self.evaluated += costs.size
+    self.rejected += int((~np.isfinite(costs)).sum())
+    self.record_call(seconds)
+
+  def record_cached(self, costs):
+    """Records the scenarios of `costs` (an array) which cost was found in the
+    cost cache."""
+    costs = np.atleast_1d(np.asarray(costs, dtype=float))
+    self.evaluated += costs.size
+    self.rejected += int((~np.isfinite(costs)).sum())
+    self.cache_hits += costs.size
+
+  def record_call(self, seconds):
+    """Records a call to the cost function lasting `seconds`, without counting
+    the scenarios it scored (e.g. the per-record costs of a separable cost)."""
+    self.cost_calls += 1
+    self.cost_seconds += seconds
+    self._sample(seconds)
+
+  def _sample(self, seconds):
+    """Keeps a uniform sample (reservoir) of at most `LATENCY_SAMPLES` latencies."""
+    if len(self._latencies) < LATENCY_SAMPLES:
+      self._latencies.append(seconds)
+    else:
+      position = self._random.randrange(self.cost_calls)
+      if position < LATENCY_SAMPLES:
+        self._latencies[position] = seconds
+
+  def merge(self, other):
+    """Adds the counters of `other`, e.g. the statistics of a worker process."""
+    for name, entry in other.stages.items():
+      mine = self.stages.setdefault(name, {"seconds": 0.0})
+      mine["seconds"] += entry["seconds"]
+    self.missing_rows += other.missing_rows
+    self.rejected += other.rejected
+    self.evaluated += other.evaluated
+    self.cost_calls += other.cost_calls
+    self.cost_seconds += other.cost_seconds
+    self.cache_hits += other.cache_hits
+    self.cache_misses += other.cache_misses
+    self._latencies.extend(other._latencies)  # pylint: disable=protected-access
+    if len(self._latencies) > LATENCY_SAMPLES:
+      self._latencies = self._random.sample(self._latencies, LATENCY_SAMPLES)
+
+  def latency_percentiles(self):
+    """Percentiles (`p50`, `p90`, `p99`) and maximum of the latency of the calls
+    to the cost function, in milliseconds. Empty without calls."""
+    if not self._latencies:
+      return {}
+    samples = np.asarray(self._latencies) * 1000
+    answer = {f"p{x}": float(np.percentile(samples, x)) for x in PERCENTILES}
+    answer["max"] = float(samples.max())
+    return answer
+
+  def as_dict(self):
+    """The statistics as a dictionary (e.g. to serialize them as JSON)."""
+    return {
+      "stages": {name: dict(entry) for name, entry in self.stages.items()},
+      "enumerated": self.enumerated,
+      "missing_rows": self.missing_rows,
+      "rejected": self.rejected,
+      "evaluated": self.evaluated,
+      "kept": self.kept,
+      "cost_calls": self.cost_calls,
+      "cost_seconds": self.cost_seconds,
+      "cost_latency_ms": self.latency_percentiles(),
+      "proven_optimal": self.proven_optimal,
+      "remaining": self.remaining,
+      "cache_hits": self.cache_hits,
+      "cache_misses": self.cache_misses,
+    }
+
+  def __str__(self):
+    stages = ", ".join(f"{name} {entry['seconds'] * 1000:.1f} ms"
+                       for name, entry in self.stages.items())
+    latency = ", ".join(f"{name} {value:.3f} ms"
+                        for name, value in self.latency_percentiles().items())
+    cache = (f"; cost cache {self.cache_hits} hits, {self.cache_misses} misses"
+             if self.cache_hits or self.cache_misses else "")
+    return (f"{self.enumerated} scenarios enumerated, {self.missing_rows} missing rows, "
+            f"{self.rejected} rejected, {self.evaluated} evaluated, {self.kept} kept; "
+            f"stages: {stages}; {self.cost_calls} cost calls ({latency or 'none'}); "
+            + ("proven optimal" if self.proven_optimal else
+               f"not proven optimal, {self.remaining} scenarios left") + cache)
+
+
+class Progress:
+  """Throttled progress hook: calls `callback(done, total)` at most once every
+  `interval` seconds, and once when the work is done."""
+
+  def __init__(self, callback, total, interval=1.0):
+    """Class initializer.
+
+    Args:
+        callback: Callable[[int, int], None], called with the number of scenarios
+            done and the total.
+        total: int, the number of scenarios to go through.
+        interval: float, minimum number of seconds between two calls.
+    """
+    self.callback = callback
+    self.total = total
+    self.interval = interval
+    self.done = 0
+    self._last = time.monotonic()
+
+  def update(self, count=1):
+    """Marks `count` more scenarios as done."""
+    self.done += count
+    now = time.monotonic()
+    if self.done >= self.total or now - self._last >= self.interval:
+      self._last = now
+      self.callback(self.done, self.total)
@@ -6,7 +6,7 @@ import math
 import random
 import logging
 from typing import Dict
-from what_if.tne.cost_function import CalculateTripCost
+from what_if.tne.cost_function import CalculateTripCost, candidate_costs
 from what_if.tne.utilities import (generate_neighboring_solution,
                         create_json_response)
 from what_if.tne.custom_exceptions import (FlightEstimationError,
@@ -57,10 +57,16 @@ def convert_to_tuple(item) -> tuple:
     return tuple((k, convert_to_tuple(v)) for k, v in item.items())
   return item
 
+def solution_details(solution,data,cost_evaluation_list,cache=None) -> list:
+  """Trip details of every trip of a solution"""
+  return [CalculateTripCost(trip_obj,data,cost_evaluation_list,cache).calculate_total_cost()
+          for trip_obj in solution]
+
 def annealing_algorithm_optimization(trips,destination_list,cost_evaluation_list,
                                      flex_days,data,initial_temperature=100,
-                                     cooling_rate=0.1) -> list:
-  """ Annealing Optimization method"""
+                                     cooling_rate=0.1,cache=None) -> list:
+  """ Annealing Optimization method, pricing the trips through `cache` (a
+  `TripCostCache`) when given"""
   try:
       # Convert initial_solution dict to Trip objects for cost calculation
     logger.info("--Initiating annealing Algorithm--")
@@ -70,11 +76,8 @@ def annealing_algorithm_optimization(trips,destination_list,cost_evaluation_list
 
     # Setup initial solution
     initial_solution= setup_initial_solution(trips,potential_destinations[0])
-    initial_cost_details = [
-        CalculateTripCost(trip, data, cost_evaluation_list).calculate_total_cost()
-        for trip in initial_solution
-    ]
-    initial_cost = sum(detail["Trip Cost"] for detail in initial_cost_details)
+    # Solutions are priced costs only; the details are built for the top ones.
+    initial_cost = candidate_costs([initial_solution],data,cost_evaluation_list,cache)[0]
 
     current_solution = initial_solution
     current_cost = initial_cost
@@ -87,9 +90,7 @@ def annealing_algorithm_optimization(trips,destination_list,cost_evaluation_list
       potential_destination = random.choice(potential_destinations)
       new_solution = [generate_neighboring_solution(sol, potential_destination,flex_days)
                       for sol in current_solution]
-      new_cost_details = [CalculateTripCost(trip_obj,data,cost_evaluation_list).calculate_total_cost()
-                          for trip_obj in new_solution]
-      new_cost = sum(detail["Trip Cost"] for detail in new_cost_details)
+      new_cost = candidate_costs([new_solution],data,cost_evaluation_list,cache)[0]
       cost_difference = new_cost - current_cost
       acceptance_probability = math.exp(-cost_difference / temperature) if cost_difference >= 0 else 1.0
 
@@ -97,20 +98,22 @@ def annealing_algorithm_optimization(trips,destination_list,cost_evaluation_list
           current_solution = new_solution
           #current_cost = new_cost
           best_destination= potential_destination
-          solutions.append((best_destination, new_cost, new_cost_details))
+          solutions.append((best_destination, new_cost, new_solution))
 
       temperature *= cooling_rate
 
     min_cost_trips={}
-    for best_destination,cost, details in solutions:
+    for best_destination,cost, solution in solutions:
       existing_cost, _ = min_cost_trips.get(best_destination, (float('inf'), None))
       if cost < existing_cost:
-        min_cost_trips[best_destination] = (cost, details)
+        min_cost_trips[best_destination] = (cost, solution)
 
     solutions.sort(key=lambda x: x[1])
     top_solutions = solutions[:3]
     response = []
-    for idx, (destination, cost, details) in enumerate(top_solutions, start=1):
+    for idx, (destination, cost, solution) in enumerate(top_solutions, start=1):
+      details = solution_details(solution,data,cost_evaluation_list,cache)
+      cost = sum(detail["Trip Cost"] for detail in details)
       resp = create_json_response("Annealing Algorithm", idx, destination, cost, details)
       response.append(resp)
     logger.info("Annealing results: %s",response)
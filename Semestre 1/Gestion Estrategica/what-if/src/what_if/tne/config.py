@@ -8,6 +8,8 @@ class Config:
   # variables for Multi processing
   max_worker = 12
   ite_range = 1
+  # Trips kept by the cost cache shared by the algorithms
+  trip_cache_size = 100_000
 
   # Tabu Search  Algorithm
   iterations= 100
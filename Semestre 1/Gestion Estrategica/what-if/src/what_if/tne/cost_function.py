@@ -1,9 +1,17 @@
 """Cost Function Module"""
+from collections.abc import Hashable
 from datetime import datetime ,date
+from types import SimpleNamespace
+import numpy as np
 import pandas as pd
 from what_if.tne.custom_exceptions import (TripCalculationError,
                                 HotelEstimationError,
                                 FlightEstimationError)
+from what_if.tne.price_index import price_indexes, query_day
+
+# Prices used when the data holds no flight, or no hotel night, for a trip
+DEFAULT_FLIGHT_COST = 5000
+DEFAULT_HOTEL_COST = 15000
 
 
 # Function to estimate flight cost from historical data
@@ -11,10 +19,14 @@ from what_if.tne.custom_exceptions import (TripCalculationError,
 def estimate_flight_cost(trip, data,response) -> int:
   """
   Estimate the cost of a flight for a given trip and travel date.
+  The prices are looked up in the flight index of `data` when it is registered
+  (see `what_if.tne.price_index.register_price_data`).
 
   Args:
       trip (Trip): Trip object containing trip details.
       data (pd.DataFrame): DataFrame containing flight data.
+      response (dict): trip details to update with the flight rates and costs,
+          None to only return the cost.
       travel_date (str): Travel date 
       return_flag (bool, optional): Indicates if it's a return flight. Default to False.
 
@@ -24,8 +36,14 @@ def estimate_flight_cost(trip, data,response) -> int:
   Raises:
       FlightEstimationError: If there is an error estimating flight cost.
   """
+  indexes = price_indexes(data)
   def flight_cost_1(origin,destination,travel_date):
-      default_flight_cost = 5000
+      default_flight_cost = DEFAULT_FLIGHT_COST
+      if indexes is not None and indexes.flights is not None:
+        found, price = indexes.flights.lookup(origin,destination,travel_date)
+        if found is not None:
+          return price if found else default_flight_cost
+      travel_date = pd.to_datetime(travel_date)
       matching_flights = data[(data['Origin'] == origin) & (data['City'] == destination) &
                             (data['Date'] == travel_date)]
       if matching_flights.empty:
@@ -35,21 +53,23 @@ def estimate_flight_cost(trip, data,response) -> int:
 
     if trip.origin == trip.destination:
       flight_cost = 0
+      if response is None:
+        return 0
       response.update({"Flight Rate":0,
                       "Flight Cost":0,
                       "Return Flight Rate":0,
                       "Return Flight Cost":0})
       return 0
     # for travel start date
-    desired_date = pd.to_datetime(trip.start_date)
-    return_desired_date = pd.to_datetime(trip.end_date)
-    flight_rate = flight_cost_1(trip.origin,trip.destination,desired_date)
+    flight_rate = flight_cost_1(trip.origin,trip.destination,trip.start_date)
     # for flight cost for return date
     origin, destination = (trip.destination, trip.origin)
-    return_flight_rate = flight_cost_1(origin,destination,return_desired_date)
+    return_flight_rate = flight_cost_1(origin,destination,trip.end_date)
     flight_cost = flight_rate * trip.num_travelers
     return_flight_cost = return_flight_rate * trip.num_travelers
     total_flight_cost = flight_cost +return_flight_cost
+    if response is None:
+      return total_flight_cost
     response.update({"Flight Rate":flight_rate,
                     "Flight Cost":flight_cost,
                     "Return Flight Rate":return_flight_rate,
@@ -62,10 +82,14 @@ def estimate_flight_cost(trip, data,response) -> int:
 def estimate_hotel_cost(trip, data,response,stars=None) -> int:
   """
   Estimate the cost of hotels for a given trip and hotel data.
+  The daily rates are looked up in the hotel index of `data` when it is registered
+  (see `what_if.tne.price_index.register_price_data`).
 
   Args:
       trip (Trip): Trip object containing trip details.
       data (pd.DataFrame): DataFrame containing hotel data.
+      response (dict): trip details to update with the hotel rates and costs,
+          None to only return the cost.
       stars (int, optional): Minimum star rating of hotels. Default to 4.
 
   Returns:
@@ -75,51 +99,207 @@ def estimate_hotel_cost(trip, data,response,stars=None) -> int:
       HotelEstimationError: If there is an error estimating hotel cost.
   """
   try:
-    default_hotel_cost = 15000
+    default_hotel_cost = DEFAULT_HOTEL_COST
     if trip.origin == trip.destination:
       overall_hotel_cost = 0
+      if response is None:
+        return 0
       response.update({"Hotel Cost":overall_hotel_cost,
                       "Hotel cost per person":0,
                       "Hotel Rates":[]
                           })
     else:
-      start_date = pd.to_datetime(trip.start_date)
-      end_date = pd.to_datetime(trip.end_date)
-      end_date = end_date - pd.Timedelta(days=1)
-      matching_hotels = data[(data['City'] == trip.destination) &
-                           (data['Date'].between(start_date, end_date))]
-      if stars is not None:
-        matching_hotels = matching_hotels[matching_hotels['Stars'] == stars]
-
-      matching_hotels = matching_hotels.loc[matching_hotels.groupby('Date')
-                                            ['Night Price($)'].idxmin()]
-      hotel_rates = matching_hotels[["Date", "Night Price($)"]]
-
-      if hotel_rates.empty:
+      indexes = price_indexes(data)
+      found = None
+      if indexes is not None and indexes.hotels is not None:
+        found, hotel_cost, rates = indexes.hotels.lookup(trip.destination, stars,
+                                                         trip.start_date, trip.end_date,
+                                                         rates=response is not None)
+      if found is None:
+        start_date = pd.to_datetime(trip.start_date)
+        end_date = pd.to_datetime(trip.end_date)
+        end_date = end_date - pd.Timedelta(days=1)
+        matching_hotels = data[(data['City'] == trip.destination) &
+                             (data['Date'].between(start_date, end_date))]
+        if stars is not None:
+          matching_hotels = matching_hotels[matching_hotels['Stars'] == stars]
+
+        matching_hotels = matching_hotels.loc[matching_hotels.groupby('Date')
+                                              ['Night Price($)'].idxmin()]
+        hotel_rates = matching_hotels[["Date", "Night Price($)"]]
+        found = not hotel_rates.empty
+        hotel_cost = hotel_rates['Night Price($)'].sum()
+        if response is not None:
+          hotel_rates_copy = hotel_rates.copy()
+          hotel_rates_copy["Date"] = hotel_rates_copy["Date"].astype(str)
+          rates = hotel_rates_copy.to_dict("records")
+
+      if not found:
         overall_hotel_cost = default_hotel_cost * trip.num_travelers * trip.max_nights
       else:
-        hotel_cost = hotel_rates['Night Price($)'].sum()
         overall_hotel_cost = hotel_cost * trip.num_travelers
-      hotel_rates_copy = hotel_rates.copy()
-      hotel_rates_copy["Date"] = hotel_rates_copy["Date"].astype(str)
+      if response is None:
+        return overall_hotel_cost
       response.update({"Hotel Cost":overall_hotel_cost,
-                      "Hotel cost per person": hotel_rates['Night Price($)'].sum(),
-                      "Hotel Rates":hotel_rates_copy.to_dict("records")
+                      "Hotel cost per person": hotel_cost,
+                      "Hotel Rates":rates
                           })
     return overall_hotel_cost
 
   except Exception as err:
     raise HotelEstimationError(trip,trip.start_date,err) from err
 
+# Cost functions returning only the cost when given no response dict
+COST_ONLY_FUNCTIONS = (estimate_flight_cost, estimate_hotel_cost)
+
+def supports_batch(cost_list) -> bool:
+  """Whether `calculate_trip_costs` prices trips like the cost functions of `cost_list`"""
+  return (len(cost_list) > 0 and
+          all(any(x is f for f in COST_ONLY_FUNCTIONS) for x in cost_list) and
+          len({id(x) for x in cost_list}) == len(cost_list))
+
+# pylint: disable=too-many-arguments, too-many-locals
+def calculate_trip_costs(data, origins, destinations, start_dates, end_dates, num_travelers,
+                         max_nights=None,
+                         cost_list=(estimate_flight_cost, estimate_hotel_cost)) -> dict:
+  """
+  Price many trips at once, with the costs `CalculateTripCost` gives each of them.
+  The prices are looked up for all the trips together in the indexes of `data`
+  when it is registered (see `what_if.tne.price_index.register_price_data`); the
+  trips the indexes cannot price are priced one by one.
+
+  Args:
+      data (pd.DataFrame): DataFrame containing flight and hotel data.
+      origins (list): origin of every trip.
+      destinations (list): destination of every trip.
+      start_dates (list): start date of every trip.
+      end_dates (list): end date of every trip.
+      num_travelers (list): number of travelers of every trip.
+      max_nights (list, optional): maximum nights of every trip, for the default
+          hotel cost. Default to None for every trip.
+      cost_list (list, optional): cost functions, among estimate_flight_cost and
+          estimate_hotel_cost. Default to both.
+
+  Returns:
+      dict: "Flight Cost", "Return Flight Cost", "Hotel Cost" and "Trip Cost" arrays
+          (float), a cost being 0 when its function is not in `cost_list`.
+
+  Raises:
+      ValueError: If a cost function is not supported or the arrays differ in length.
+      FlightEstimationError: If there is an error estimating a flight cost.
+      HotelEstimationError: If there is an error estimating a hotel cost.
+  """
+  if not supports_batch(cost_list):
+    raise ValueError("Only estimate_flight_cost and estimate_hotel_cost can be batched.")
+  size = len(origins)
+  max_nights = [None] * size if max_nights is None else list(max_nights)
+  if any(len(x) != size for x in (destinations, start_dates, end_dates, num_travelers,
+                                  max_nights)):
+    raise ValueError("Every trip array must have the same length.")
+  flights = any(x is estimate_flight_cost for x in cost_list)
+  hotels = any(x is estimate_hotel_cost for x in cost_list)
+  travelers = np.asarray(num_travelers, dtype=float)
+  flight_cost, return_cost, hotel_cost = np.zeros(size), np.zeros(size), np.zeros(size)
+  away = np.array([o != d for o, d in zip(origins, destinations)], dtype=bool)
+
+  indexes = price_indexes(data)
+  if (indexes is None or (flights and indexes.flights is None) or
+      (hotels and indexes.hotels is None)):
+    slow = away
+  else:
+    start = (indexes.flights if flights else indexes.hotels).start
+    first = [query_day(start, x) for x in start_dates]
+    last = [query_day(start, x) for x in end_dates]
+    slow = away & np.array([a is None or b is None or not isinstance(o, Hashable) or
+                            not isinstance(d, Hashable)
+                            for a, b, o, d in zip(first, last, origins, destinations)], dtype=bool)
+    rows = np.flatnonzero(away & ~slow)
+    first_days = np.array([first[k] for k in rows], dtype=np.int64)
+    last_days = np.array([last[k] for k in rows], dtype=np.int64)
+    origin_list = [origins[k] for k in rows]
+    destination_list = [destinations[k] for k in rows]
+    if flights:
+      found, rates = indexes.flights.lookup_days(origin_list, destination_list, first_days)
+      flight_cost[rows] = np.where(found, rates, DEFAULT_FLIGHT_COST) * travelers[rows]
+      found, rates = indexes.flights.lookup_days(destination_list, origin_list, last_days)
+      return_cost[rows] = np.where(found, rates, DEFAULT_FLIGHT_COST) * travelers[rows]
+    if hotels:
+      found, costs = indexes.hotels.lookup_days(destination_list, None, first_days, last_days)
+      nights = [max_nights[k] for k in rows]
+      # The default cost needs the maximum nights: let estimate_hotel_cost raise.
+      unknown = np.array([x is None for x in nights], dtype=bool) & ~found
+      nights = np.array([0 if x is None else x for x in nights], dtype=float)
+      hotel_cost[rows] = np.where(found, costs * travelers[rows],
+                                  DEFAULT_HOTEL_COST * travelers[rows] * nights)
+      slow = slow.copy()
+      slow[rows[unknown]] = True
+
+  for k in np.flatnonzero(slow):
+    trip = SimpleNamespace(origin=origins[k], destination=destinations[k],
+                           start_date=start_dates[k], end_date=end_dates[k],
+                           num_travelers=num_travelers[k], max_nights=max_nights[k])
+    response = {}
+    if flights:
+      estimate_flight_cost(trip, data, response)
+      flight_cost[k] = response["Flight Cost"]
+      return_cost[k] = response["Return Flight Cost"]
+    if hotels:
+      hotel_cost[k] = estimate_hotel_cost(trip, data, None)
+
+  total_cost = np.zeros(size)
+  for cost_type in cost_list:
+    if cost_type is estimate_flight_cost:
+      total_cost = total_cost + (flight_cost + return_cost)
+    else:
+      total_cost = total_cost + hotel_cost
+  return {"Flight Cost": flight_cost, "Return Flight Cost": return_cost,
+          "Hotel Cost": hotel_cost, "Trip Cost": total_cost}
+
+def candidate_costs(candidates, data, cost_list, cache=None) -> list:
+  """
+  Total cost of every candidate solution (a list of trips), pricing the trips of
+  all the candidates with one `calculate_trip_costs` call when it supports the
+  cost functions, else trip by trip with `CalculateTripCost.calculate_cost()`.
+  The trips are looked up in `cache` (a `TripCostCache`) when given: only the
+  ones missing are priced.
+  """
+  if not supports_batch(cost_list):
+    return [sum(CalculateTripCost(trip,data,cost_list,cache).calculate_cost() for trip in candidate)
+            for candidate in candidates]
+
+  def price(trips):
+    return calculate_trip_costs(data, [trip.origin for trip in trips],
+                                [trip.destination for trip in trips],
+                                [trip.start_date for trip in trips],
+                                [trip.end_date for trip in trips],
+                                [trip.num_travelers for trip in trips],
+                                [getattr(trip, "max_nights", None) for trip in trips],
+                                cost_list)["Trip Cost"].tolist()
+
+  trips = [trip for candidate in candidates for trip in candidate]
+  costs = price(trips) if cache is None else cache.get_costs(trips, price)
+  totals = []
+  start = 0
+  for candidate in candidates:
+    totals.append(sum(costs[start:start + len(candidate)]))
+    start += len(candidate)
+  return totals
+
 #Cost function Object
 class CalculateTripCost():
   """ 
   Calculate the total cost of a trip including flight and hotel costs.
 
+  `calculate_total_cost()` returns the trip details (the trip fields, and the
+  rates and costs of every cost function); `calculate_cost()` only returns the
+  total, for the candidates which may never be recommended.
+
   Args:
       trip (Trip): Trip object containing trip details.
       flight_history_data (pd.DataFrame): DataFrame containing historical flight data.
       hotel_history_data (pd.DataFrame): DataFrame containing historical hotel data.
+      cache (TripCostCache, optional): cache of the cost entries of the trips
+          already priced with the same data and cost functions.
 
   Returns:
       dict: Dictionary containing trip cost details.
@@ -127,26 +307,64 @@ class CalculateTripCost():
   Raises:
       TripCalculationError: If there is an error calculating trip cost.
   """
-  def __init__(self,trip,data,cost_list):
+  def __init__(self,trip,data,cost_list,cache=None):
       self.trip = trip
       self.data =data
       self.cost_list= cost_list
+      self.cache = cache
       self.total_cost = 0
       self.response={}
-      for field_name, field_value in trip.__dict__.items():
-        if field_value is not None:
-          if isinstance(field_value, (datetime, date)):
-            field_value = str(field_value)
-          self.response.update({f"{field_name}":field_value})
+
+  def trip_fields(self) -> dict:
+    """The fields of the trip set, dates as strings"""
+    fields = {}
+    for field_name, field_value in self.trip.__dict__.items():
+      if field_value is not None:
+        if isinstance(field_value, (datetime, date)):
+          field_value = str(field_value)
+        fields.update({f"{field_name}":field_value})
+    return fields
 
   def calculate_total_cost(self) -> dict:
     """Summing up return values for all cost functions and returning overall value for a solution"""
     try:
-      for cost_type in self.cost_list:
-        cost = cost_type(self.trip, self.data, self.response)
-        self.total_cost = self.total_cost + cost
-      self.response.update({"Trip Cost":self.total_cost})
+      if self.cache is None:
+        costs = self.trip_costs()
+      else:
+        costs = self.cache.get(self.trip, self.trip_costs)
+      self.total_cost = costs["Trip Cost"]
+      self.response = self.trip_fields()
+      self.response.update(costs)
       return self.response
 
     except (FlightEstimationError, HotelEstimationError,Exception) as err:
       raise TripCalculationError(f"Error occurred while calculating trip cost: {err}") from err
+
+  def calculate_cost(self):
+    """Total cost of the trip (the "Trip Cost" of `calculate_total_cost()`), without
+    the details: `estimate_flight_cost` and `estimate_hotel_cost` skip their rates.
+    Other cost functions get a response dict, through the cache when given."""
+    try:
+      if not supports_batch(self.cost_list) and self.cache is not None:
+        self.total_cost = self.cache.get(self.trip, self.trip_costs)["Trip Cost"]
+        return self.total_cost
+      total_cost = 0
+      for cost_type in self.cost_list:
+        response = None if any(cost_type is f for f in COST_ONLY_FUNCTIONS) else {}
+        cost = cost_type(self.trip, self.data, response)
+        total_cost = total_cost + cost
+      self.total_cost = total_cost
+      return total_cost
+
+    except (FlightEstimationError, HotelEstimationError,Exception) as err:
+      raise TripCalculationError(f"Error occurred while calculating trip cost: {err}") from err
+
+  def trip_costs(self) -> dict:
+    """The entries added by the cost functions, and the "Trip Cost" """
+    response = {}
+    total_cost = 0
+    for cost_type in self.cost_list:
+      cost = cost_type(self.trip, self.data, response)
+      total_cost = total_cost + cost
+    response.update({"Trip Cost":total_cost})
+    return response
@@ -1,8 +1,9 @@
 """Genetic Algorithm Module"""
+from copy import copy
 import random
 import numpy as np
 import logging
-from what_if.tne.cost_function import CalculateTripCost
+from what_if.tne.cost_function import CalculateTripCost, candidate_costs
 from what_if.tne.utilities import (generate_neighboring_solution_ga,
                         create_json_response)
 from what_if.tne.custom_exceptions import (GaFitnessError,
@@ -20,8 +21,9 @@ logger = logging.getLogger(__name__)
 class TravelOptimizerGA:
   """/"""
   def __init__(self,trips, potential_destinations,flex_days,cost_list,
-                data,population_size=5, generations=8, mutation_rate=0.1):
+                data,population_size=5, generations=8, mutation_rate=0.1,cache=None):
       self.data = data
+      self.cache = cache
       self.trips = trips
       self.potential_destinations = []
       self.potential_destinations =potential_destinations
@@ -40,26 +42,35 @@ class TravelOptimizerGA:
 
   def calculate_fitness(self, individual)  -> tuple:
     """The function calculates the total travel cost for given travel dates, 
-      flight prices, and hotel rates for each destination in the population."""
+      flight prices, and hotel rates for each destination in the population.
+      Returns the negated cost and the trips of the cheapest combination of dates
+      (None when there is none); see `solution_details()`."""
     try:
       best_aggregate_cost = float('inf')
-      best_aggregate_details = {}
+      best_solution = None
       solution = self.trips.copy()
 
       new_solutions =generate_neighboring_solution_ga(solution,individual,self.flex_days)
-      total_combination_cost = 0
-      combined_trip_list = []
-      for sol  in new_solutions:
-        combined_trip_list = [CalculateTripCost(route,self.data,self.cost_list).calculate_total_cost() for route in sol]
-        total_combination_cost=sum(detail["Trip Cost"] for detail in combined_trip_list)
+      # Every combination of dates is priced at once, costs only: the details are
+      # built for the recommended solutions.
+      totals = candidate_costs(new_solutions,self.data,self.cost_list,self.cache)
+      for sol, total_combination_cost in zip(new_solutions, totals):
         if total_combination_cost < best_aggregate_cost and total_combination_cost != 0:
             best_aggregate_cost = total_combination_cost
-            best_aggregate_details = combined_trip_list
+            # Copied: without flex days the next individual changes these trips.
+            best_solution = [copy(route) for route in sol]
 
-      return -best_aggregate_cost,best_aggregate_details if best_aggregate_details else {}
+      return -best_aggregate_cost,best_solution
     except (FlightEstimationError,HotelEstimationError,TripCalculationError,Exception) as err:
       raise GaFitnessError(f"Error occurred during calculating fitness part of GA optimization: {err}") from err
 
+  def solution_details(self, solution) -> tuple:
+    """Trip details and total cost of a solution of `calculate_fitness()`"""
+    if not solution:
+      return {}, float('inf')
+    details = [CalculateTripCost(route,self.data,self.cost_list,self.cache).calculate_total_cost() for route in solution]
+    return details, sum(detail["Trip Cost"] for detail in details)
+
   def evolve(self):
     """After fitness evaluation, the GA selects individuals to form a new generation. 
       This selection is based on their fitness scores. 
@@ -73,8 +84,8 @@ class TravelOptimizerGA:
       for _ in range(self.generations):
         current_gen_scores = []
         for individual in self.population:
-          cost, details = self.calculate_fitness(individual)
-          history.append((individual, -cost,details))
+          cost, solution = self.calculate_fitness(individual)
+          history.append((individual, -cost,solution))
           current_gen_scores.append((-cost, individual))
 
         current_gen_scores.sort(reverse=True)
@@ -94,18 +105,18 @@ class TravelOptimizerGA:
         self.population = new_population
 
       unique_solutions = {}
-      for individual, cost,details in sorted(history, key=lambda x: x[1]):
+      for individual, cost,solution in sorted(history, key=lambda x: x[1]):
         if individual not in unique_solutions:
           unique_solutions[individual] = cost
-          all_solutions.append((individual, cost,details))
+          all_solutions.append((individual, cost,solution))
         if len(unique_solutions) == len(self.potential_destinations):
           break
 
       top_3_solutions = sorted(all_solutions, key=lambda x: x[1])[:3]
       recommendation = 1
       response = []
-      for destination,cost,trip_details in top_3_solutions:
-        # for detail in trip_details:
+      for destination,cost,solution in top_3_solutions:
+        trip_details, cost = self.solution_details(solution)
         resp =create_json_response("Genetic Algorithm",recommendation,destination,cost,trip_details)
         response.append(resp)
         recommendation +=1
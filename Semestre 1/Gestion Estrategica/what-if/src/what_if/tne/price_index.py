@@ -0,0 +1,333 @@
+"""Price indexes built once per price data frame.
+
+The cost functions of `what_if.tne.cost_function` used to filter the whole
+price history with boolean masks (and group the hotels by day) for every trip
+they price.
+`register_price_data(data)` builds the indexes of a data frame once; while it
+is registered, the estimate functions look the prices up in its indexes
+instead. The registration is dropped when the data frame is garbage collected.
+A data frame changed in place must be registered again.
+"""
+
+# pylint: disable=bad-indentation
+
+import threading
+import weakref
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Indexes larger than this number of cells are not built (the estimate functions
+# keep filtering the data frame).
+MAX_CELLS = 50_000_000
+
+_REGISTRY = {}
+_LOCK = threading.Lock()
+
+
+def day_numbers(dates, start):
+  """Days elapsed since `start` for every date of `dates` (a datetime Series)."""
+  return ((dates - start) // pd.Timedelta(days=1)).to_numpy(dtype=np.int64)
+
+
+def midnight_dates(data):
+  """The `Date` column of `data` when it holds dates at midnight only (as the
+  trip dates are looked up), None otherwise."""
+  if "Date" not in data.columns or not pd.api.types.is_datetime64_dtype(data["Date"]):
+    return None
+  dates = data["Date"]
+  if dates.isna().any() or not (dates == dates.dt.normalize()).all():
+    return None
+  return dates
+
+
+def query_day(start, travel_date):
+  """Day number of `travel_date` for an index starting at `start`, None when the
+  date is not at midnight (it can only match the data frame exactly)."""
+  if type(travel_date) is date:  # pylint: disable=unidiomatic-typecheck
+    return (travel_date - start.date()).days
+  stamp = pd.Timestamp(travel_date)
+  if stamp.tz is not None or stamp != stamp.normalize():
+    return None
+  return (stamp - start).days
+
+
+class FlightPriceIndex:
+  """Minimum `Flight Price` per (origin, destination, day), as a dense array.
+
+  Attributes:
+    origins: pd.Index, the values of `Origin` (first axis).
+    cities: pd.Index, the values of `City` (second axis).
+    start: pd.Timestamp, the first day (third axis).
+    prices: np.ndarray, the minimum price of every cell, in the dtype of the
+        `Flight Price` column (NaN when every price of the cell is missing).
+    found: np.ndarray, whether the data holds a flight for every cell.
+  """
+
+  def __init__(self, data, dates):
+    """Class initializer.
+
+    Args:
+        data: pd.DataFrame, the price data (`Origin`, `City`, `Date`, `Flight Price`).
+        dates: pd.Series, the `Date` column, at midnight (see `midnight_dates()`).
+    """
+    self.origins = pd.Index(pd.unique(data["Origin"]))
+    self.cities = pd.Index(pd.unique(data["City"]))
+    self.start = dates.min()
+    days = day_numbers(dates, self.start)
+    shape = (len(self.origins), len(self.cities), int(days.max()) + 1)
+    origins = self.origins.get_indexer(data["Origin"])
+    cities = self.cities.get_indexer(data["City"])
+    prices = data["Flight Price"].groupby([origins, cities, days]).min()
+    cells = tuple(np.asarray(prices.index.get_level_values(i)) for i in range(3))
+    self.prices = np.zeros(shape, dtype=prices.dtype)
+    self.found = np.zeros(shape, dtype=bool)
+    self.prices[cells] = prices.to_numpy()
+    self.found[cells] = True
+    self._origins = {x: i for i, x in enumerate(self.origins)}
+    self._cities = {x: i for i, x in enumerate(self.cities)}
+
+  @staticmethod
+  def build(data):
+    """The index of `data`, or None when it lacks the columns, its dates are not
+    at midnight or the array would be too large."""
+    if not {"Origin", "City", "Flight Price"}.issubset(data.columns) or data.empty:
+      return None
+    dates = midnight_dates(data)
+    if dates is None:
+      return None
+    days = (dates.max() - dates.min()).days + 1
+    if data["Origin"].nunique() * data["City"].nunique() * days > MAX_CELLS:
+      return None
+    return FlightPriceIndex(data, dates)
+
+  def lookup(self, origin, destination, travel_date):
+    """Minimum price of the flights from `origin` to `destination` on
+    `travel_date`.
+
+    Returns:
+        A `(found, price)` tuple: whether the index can answer and the data holds
+        such a flight, and its price. `found` is None when the index cannot
+        answer (the date is not at midnight).
+    """
+    day = query_day(self.start, travel_date)
+    if day is None:
+      return None, None
+    i = self._origins.get(origin)
+    j = self._cities.get(destination)
+    if i is None or j is None or not 0 <= day < self.found.shape[2] or not self.found[i, j, day]:
+      return False, None
+    return True, self.prices[i, j, day]
+
+  def lookup_days(self, origins, destinations, days):
+    """Vectorized `lookup()` on day numbers (see `query_day()`).
+
+    Args:
+        origins: List, the origin of every flight (hashable).
+        destinations: List, the destination of every flight (hashable).
+        days: np.ndarray, the day number of every flight.
+
+    Returns:
+        A `(found, prices)` tuple of arrays: whether the data holds every flight,
+        and its price (0 when not found).
+    """
+    i = np.array([self._origins.get(x, -1) for x in origins], dtype=np.int64)
+    j = np.array([self._cities.get(x, -1) for x in destinations], dtype=np.int64)
+    days = np.asarray(days, dtype=np.int64)
+    valid = (i >= 0) & (j >= 0) & (days >= 0) & (days < self.found.shape[2])
+    cells = (i[valid], j[valid], days[valid])
+    found = np.zeros(len(days), dtype=bool)
+    prices = np.zeros(len(days), dtype=self.prices.dtype)
+    found[valid] = self.found[cells]
+    prices[valid] = np.where(found[valid], self.prices[cells], 0)
+    return found, prices
+
+
+class HotelRateIndex:
+  """Minimum `Night Price($)` per day, for every city (any stars) and every
+  (city, stars), with cumulative sums over the days.
+
+  A stay is the range of days `[start date, end date)`; its cost per person is
+  the sum of the minimum price of its days with a hotel. The prefix sums give it
+  with two lookups when they are exact (integer prices, or floats holding
+  integers), otherwise the minima of the stay are summed in order, like pandas.
+
+  Attributes:
+    start: pd.Timestamp, the first day.
+    minima: np.ndarray, the minimum price of every (row, day), in the dtype of
+        the `Night Price($)` column.
+    found: np.ndarray, whether the data holds a hotel for every (row, day).
+    counts: np.ndarray, the cumulative number of days found of every row (one
+        more column than `found`, starting at 0).
+    sums: np.ndarray or None, the cumulative sum of the minima of every row (0
+        for the days not found), None when not exact.
+  """
+
+  def __init__(self, data, dates):
+    """Class initializer.
+
+    Args:
+        data: pd.DataFrame, the price data (`City`, `Stars`, `Date`,
+            `Night Price($)`).
+        dates: pd.Series, the `Date` column, at midnight (see `midnight_dates()`).
+    """
+    self.start = dates.min()
+    days = day_numbers(dates, self.start)
+    n_days = int(days.max()) + 1
+    prices = data["Night Price($)"]
+    by_city = prices.groupby([data["City"].to_numpy(), days]).min()
+    stars = data["Stars"].notna().to_numpy()
+    by_stars = prices[stars].groupby(
+      [data["City"].to_numpy()[stars], data["Stars"].to_numpy()[stars], days[stars]]).min()
+    self._rows = {}
+    for key in by_city.index.droplevel(1).unique().tolist():
+      self._rows[(key, None)] = len(self._rows)
+    for key in by_stars.index.droplevel(2).unique().tolist():
+      self._rows[tuple(key)] = len(self._rows)
+    self.minima = np.zeros((len(self._rows), n_days), dtype=prices.dtype)
+    self.found = np.zeros((len(self._rows), n_days), dtype=bool)
+    for minima, keys in [(by_city, [(x, None) for x in by_city.index.get_level_values(0)]),
+                         (by_stars, list(zip(by_stars.index.get_level_values(0),
+                                             by_stars.index.get_level_values(1))))]:
+      cells = (np.array([self._rows[x] for x in keys], dtype=np.int64),
+               np.asarray(minima.index.get_level_values(-1), dtype=np.int64))
+      self.minima[cells] = minima.to_numpy()
+      self.found[cells] = True
+    self.counts = np.zeros((len(self._rows), n_days + 1), dtype=np.int64)
+    np.cumsum(self.found, axis=1, out=self.counts[:, 1:])
+    self.sums = None
+    if self.exact_sums():
+      self.sums = np.zeros((len(self._rows), n_days + 1), dtype=self.minima.dtype)
+      np.cumsum(np.where(self.found, self.minima, 0), axis=1, out=self.sums[:, 1:])
+    self.dates = list(np.datetime_as_string(
+      np.datetime64(self.start.date(), "D") + np.arange(n_days), unit="D"))
+
+  def exact_sums(self):
+    """Whether the prefix sums of the minima are exact (no rounding)."""
+    if np.issubdtype(self.minima.dtype, np.integer):
+      return True
+    if not np.issubdtype(self.minima.dtype, np.floating):
+      return False
+    values = self.minima[self.found]
+    return bool((values == np.round(values)).all()) and (
+      np.abs(values).sum(dtype=float) < 2 ** 53)
+
+  @staticmethod
+  def build(data):
+    """The index of `data`, or None when it lacks the columns, holds a missing
+    price, its dates are not at midnight or the arrays would be too large."""
+    if not {"City", "Stars", "Night Price($)"}.issubset(data.columns) or data.empty:
+      return None
+    if not pd.api.types.is_numeric_dtype(data["Night Price($)"]) or \
+       data["Night Price($)"].isna().any():
+      return None
+    dates = midnight_dates(data)
+    if dates is None:
+      return None
+    days = (dates.max() - dates.min()).days + 1
+    rows = data["City"].nunique() * (data["Stars"].nunique() + 1)
+    if rows * days > MAX_CELLS:
+      return None
+    return HotelRateIndex(data, dates)
+
+  def lookup(self, city, stars, start_date, end_date, rates=True):
+    """Cheapest hotel of every night of a stay in `city` (of `stars` stars, any
+    when None) from `start_date` to the night before `end_date`.
+
+    Returns:
+        A `(found, cost, rates)` tuple: whether the index can answer and the
+        data holds a hotel for one of the nights, the sum of the minimum prices
+        of the nights with a hotel (a zero when there is none), and these nights
+        as `{"Date": str, "Night Price($)": price}` records (None when `rates`
+        is false). `found` is None when the index cannot answer (a date is not
+        at midnight).
+    """
+    first = query_day(self.start, start_date)
+    last = query_day(self.start, end_date)
+    if first is None or last is None:
+      return None, None, None
+    zero = self.minima.dtype.type(0)
+    try:
+      row = self._rows.get((city, stars))
+    except TypeError:  # Unhashable, e.g. a list of destinations.
+      return None, None, None
+    first, last = max(first, 0), min(last, self.minima.shape[1])
+    if row is None or first >= last or self.counts[row, last] == self.counts[row, first]:
+      return False, zero, [] if rates else None
+    if self.sums is not None:
+      cost = self.sums[row, last] - self.sums[row, first]
+      days = np.flatnonzero(self.found[row, first:last]) + first if rates else None
+    else:
+      days = np.flatnonzero(self.found[row, first:last]) + first
+      cost = self.minima[row, days].sum()
+    if not rates:
+      return True, cost, None
+    return True, cost, [{"Date": self.dates[day], "Night Price($)": price}
+                        for day, price in zip(days.tolist(), self.minima[row, days].tolist())]
+
+  def lookup_days(self, cities, stars, first_days, last_days):
+    """Vectorized `lookup(rates=False)` on day numbers (see `query_day()`), for
+    the stays from `first_days` to the nights before `last_days`.
+
+    Args:
+        cities: List, the city of every stay (hashable).
+        stars: the stars of every stay, None for any.
+        first_days: np.ndarray, the day number of every start date.
+        last_days: np.ndarray, the day number of every end date.
+
+    Returns:
+        A `(found, costs)` tuple of arrays: whether the data holds a hotel for a
+        night of every stay, and the sum of the minimum prices of its nights.
+    """
+    rows = np.array([self._rows.get((x, stars), -1) for x in cities], dtype=np.int64)
+    first = np.maximum(np.asarray(first_days, dtype=np.int64), 0)
+    last = np.minimum(np.asarray(last_days, dtype=np.int64), self.minima.shape[1])
+    valid = (rows >= 0) & (first < last)
+    found = np.zeros(len(rows), dtype=bool)
+    costs = np.zeros(len(rows), dtype=self.minima.dtype)
+    found[valid] = self.counts[rows[valid], last[valid]] > self.counts[rows[valid], first[valid]]
+    if self.sums is not None:
+      costs[found] = self.sums[rows[found], last[found]] - self.sums[rows[found], first[found]]
+    else:
+      for k in np.flatnonzero(found):
+        days = np.flatnonzero(self.found[rows[k], first[k]:last[k]]) + first[k]
+        costs[k] = self.minima[rows[k], days].sum()
+    return found, costs
+
+
+class PriceIndexes:
+  """Indexes of a price data frame, see `register_price_data()`.
+
+  Attributes:
+    flights: FlightPriceIndex or None.
+    hotels: HotelRateIndex or None.
+  """
+
+  def __init__(self, data):
+    self.flights = FlightPriceIndex.build(data)
+    self.hotels = HotelRateIndex.build(data)
+
+
+def register_price_data(data) -> PriceIndexes:
+  """Builds the indexes of `data` and registers them, so that the estimate
+  functions called with `data` use them. Registering the same data frame again
+  rebuilds them (after an in-place change)."""
+  indexes = PriceIndexes(data)
+  key = id(data)
+  with _LOCK:
+    known = key in _REGISTRY
+    _REGISTRY[key] = indexes
+  if not known:
+    weakref.finalize(data, _unregister, key)
+  return indexes
+
+
+def _unregister(key):
+  with _LOCK:
+    _REGISTRY.pop(key, None)
+
+
+def price_indexes(data):
+  """The indexes registered for `data`, None when there are none."""
+  return _REGISTRY.get(id(data))
@@ -9,6 +9,11 @@ from what_if.tne.custom_exceptions import (DataError,
                                 ConcurrentOptimizationError)
 from what_if.tne.config import Config
 from what_if.tne.genetic_algorithm import TravelOptimizerGA
+from what_if.tne.cost_function import supports_batch
+from what_if.tne.utilities import trip_uses_rows, reprice_trip
+from what_if.tne.price_index import register_price_data
+from what_if.tne.trip_cache import TripCostCache
+from what_if.incremental import changed_rows
 
 # Setting up basic configuration for logging
 logging.basicConfig(
@@ -26,6 +31,11 @@ class Optimization(Config):
     self.cost_evaluation_list = cost_function
     self.flex_days = input_attr.number_days_before_after
     self.data=data
+    # Indexed once, and shared (not copied) by every algorithm.
+    register_price_data(data)
+    # Trips priced by one algorithm are not priced again by the others.
+    self.trip_cost_cache = TripCostCache(self.trip_cache_size)
+    self.candidates=[]
     '''
     Generate results out from different optimizers.
     Returns the best results
@@ -61,7 +71,7 @@ class Optimization(Config):
     tb_output =tabu_search_optimization(self.trips, self.potential_destinations,
                                       self.num_gen,self.iterations,
                                       self.cost_evaluation_list,self.flex_days,
-                                      data=deepcopy(self.data))
+                                      data=self.data,cache=self.trip_cost_cache)
     return tb_output
 
   def annealing_algorithm(self,_) -> list:
@@ -70,9 +80,10 @@ class Optimization(Config):
     # created separate function to modify hyperparemeter based on problem
     an_output = annealing_algorithm_optimization(self.trips,self.potential_destinations,
                                               self.cost_evaluation_list, self.flex_days,
-                                              data=deepcopy(self.data),
+                                              data=self.data,
                                               initial_temperature=self.initial_temperature,
-                                              cooling_rate=self.cooling_rate)
+                                              cooling_rate=self.cooling_rate,
+                                              cache=self.trip_cost_cache)
 
     return an_output
 
@@ -80,15 +91,18 @@ class Optimization(Config):
     """Initializing Genetic Optimization"""
     optimizer = TravelOptimizerGA(self.trips, self.potential_destinations,
                                   self.flex_days,self.cost_evaluation_list,
-                                  data=deepcopy(self.data),population_size=self.population_size,
-                                  generations=self.generations, mutation_rate=self.mutation_rate)
+                                  data=self.data,population_size=self.population_size,
+                                  generations=self.generations, mutation_rate=self.mutation_rate,
+                                  cache=self.trip_cost_cache)
 
     ga_output = optimizer.evolve()
     return ga_output
 
   def get_best_recommendations(self) -> list:
     """Using multiprocessing calling all the mentioned algorithm concurrently.
-      accumulating all the results and filtering out the top three best fit values"""
+      accumulating all the results and filtering out the top three best fit values.
+      Every recommendation reports the hits and misses of the trip cost cache
+      shared by the algorithms under "Trip Cost Cache"."""
     try:
       logger.info("starting multiple threading execution for algorithms: %s",self.algorithms)
       overall_response=[]
@@ -110,23 +124,74 @@ class Optimization(Config):
             overall_response.extend(ga_tasks)
 
         # Gather results
+        self.candidates=[]
         for future in concurrent.futures.as_completed(overall_response):
+          self.candidates.append(future.result())
           results.extend(future.result())
 
-      min_costs = {}
-
-      # return overall_response
-      for row in results:
-        recommendation = row['Recommendations']
-        overall_cost = row['Overall Cost']
-        if recommendation not in min_costs or overall_cost < min_costs[recommendation]:
-          min_costs[recommendation] = overall_cost
-
-      min_cost_rows =[row for row in results if row['Overall Cost'] == min_costs[row['Recommendations']]]
-      sorted_recommendations = sorted(min_cost_rows,key=lambda x: x["Recommendations"])
-      logger.info("Overall Scenario results: %s",sorted_recommendations)
-      return sorted_recommendations
+      report = self.trip_cost_cache.report()
+      logger.info("Trip cost cache: %d hits, %d misses (hit rate %.1f%%), %d trips kept",
+                  report["hits"], report["misses"], 100 * report["hit_rate"], report["trips"])
+      return [resp | {"Trip Cost Cache": report}
+              for resp in self.select_recommendations(results)]
 
     except Exception as err:
       logger.error("An unexpected error occurred during running optimization in concurrent: %s",err)
       raise ConcurrentOptimizationError(f"An unexpected error occurred during running optimization in concurrent: {err}") from err
+
+  def refresh(self,data) -> list:
+    """Reprices the recommendations of the last `get_best_recommendations()` call
+      against a new version of the price data, without running the algorithms again.
+      Only the recommendations with a trip using a record that changed are priced
+      again; every algorithm output is then ranked again before the best ones are
+      selected. The records a trip uses are those read by `estimate_flight_cost`
+      and `estimate_hotel_cost`: with other cost functions, every recommendation
+      is priced again."""
+    if not self.candidates:
+      raise DataError("No recommendations to refresh, call get_best_recommendations() first.")
+    removed, added = changed_rows(self.data, data)
+    changed = pd.concat([removed, added])
+    self.data = data
+    register_price_data(data)
+    self.trip_cost_cache.clear()
+    # The footprint of custom cost functions is unknown.
+    reprice_all = not supports_batch(self.cost_evaluation_list)
+    repriced = 0
+    results = []
+    candidates = []
+    for output in self.candidates:
+      refreshed = []
+      for resp in output:
+        if reprice_all or any(trip_uses_rows(detail, changed) for detail in resp["Details"]):
+          details = [reprice_trip(detail, data, self.cost_evaluation_list)
+                     for detail in resp["Details"]]
+          resp = resp | {"Overall Cost": sum(detail["Trip Cost"] for detail in details),
+                         "Details": details}
+          repriced += 1
+        refreshed.append(resp)
+      ranks = sorted(resp["Recommendations"] for resp in refreshed)
+      refreshed = [resp | {"Recommendations": rank} for rank, resp in
+                   zip(ranks, sorted(refreshed, key=lambda x: x["Overall Cost"]))]
+      candidates.append(refreshed)
+      results.extend(refreshed)
+    self.candidates = candidates
+    logger.info("%d price records changed, repriced %d of %d recommendations",
+                len(changed), repriced, len(results))
+    return self.select_recommendations(results)
+
+  def select_recommendations(self,results) -> list:
+    """Keeps the cheapest of the results sharing the same recommendation rank,
+      sorted by rank."""
+    min_costs = {}
+
+    # return overall_response
+    for row in results:
+      recommendation = row['Recommendations']
+      overall_cost = row['Overall Cost']
+      if recommendation not in min_costs or overall_cost < min_costs[recommendation]:
+        min_costs[recommendation] = overall_cost
+
+    min_cost_rows =[row for row in results if row['Overall Cost'] == min_costs[row['Recommendations']]]
+    sorted_recommendations = sorted(min_cost_rows,key=lambda x: x["Recommendations"])
+    logger.info("Overall Scenario results: %s",sorted_recommendations)
+    return sorted_recommendations
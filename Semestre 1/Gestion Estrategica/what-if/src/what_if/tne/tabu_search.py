@@ -9,7 +9,7 @@ from what_if.tne.custom_exceptions import (FlightEstimationError,
                                 HotelEstimationError)
 from what_if.tne.utilities import (generate_neighboring_solution,
                         create_json_response)
-from what_if.tne.cost_function import CalculateTripCost
+from what_if.tne.cost_function import CalculateTripCost, candidate_costs
 
 # Setting up basic configuration for logging
 logging.basicConfig(
@@ -18,7 +18,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def tabu_search_optimization(trips, destination_list,num_generations,iterations,
-                             cost_evaluation_list,flex_days,data) -> list:
+                             cost_evaluation_list,flex_days,data,cache=None) -> list:
   """
   Perform tabu search optimization to find the best trip itinerary.
 
@@ -27,6 +27,7 @@ def tabu_search_optimization(trips, destination_list,num_generations,iterations,
       destination_list (list): List of potential destinations.
       iterations (int, optional): Number of iterations for optimization. Default to 100.
       tabu_tenure (int, optional): Tabu tenure parameter. Default to 3.
+      cache (TripCostCache, optional): trip costs shared with the other algorithms.
 
   Returns:
       list: List of dict with optimized trip itineraries.
@@ -62,19 +63,21 @@ def tabu_search_optimization(trips, destination_list,num_generations,iterations,
         new_solution = [generate_neighboring_solution(sol, potential_destination,flex_days) for sol in trips]
         candidate_solutions.append(new_solution)
 
-      for candidate in candidate_solutions:
-        new_cost_list = [CalculateTripCost(cand,history_data,cost_evaluation_list).calculate_total_cost() for cand in candidate]
-        combined_new_cost = sum(detail["Trip Cost"] for detail in new_cost_list)
+      # The whole neighbourhood is priced at once, costs only: the details are
+      # built for the recommended candidates.
+      totals = candidate_costs(candidate_solutions,history_data,cost_evaluation_list,cache)
+      for candidate, combined_new_cost in zip(candidate_solutions, totals):
         existing_cost, _ = min_cost_trips.get(potential_destination, (float('inf'), None))
         if combined_new_cost < existing_cost:
-            min_cost_trips[potential_destination] = (combined_new_cost, new_cost_list)
+            min_cost_trips[potential_destination] = (combined_new_cost, candidate)
 
     response = []
 
     sorted_min_cost_trips = sorted(min_cost_trips.items(), key=lambda x: x[1][0])
     recommendation = 1
-    for destination, (total_cost, trip_details) in sorted_min_cost_trips[:3]:
-      # for detail in trip_details:
+    for destination, (total_cost, candidate) in sorted_min_cost_trips[:3]:
+      trip_details = [CalculateTripCost(cand,history_data,cost_evaluation_list,cache).calculate_total_cost() for cand in candidate]
+      total_cost = sum(detail["Trip Cost"] for detail in trip_details)
       resp = create_json_response("Tabu Search",recommendation,destination, total_cost,trip_details)
       response.append(resp)
       recommendation +=1
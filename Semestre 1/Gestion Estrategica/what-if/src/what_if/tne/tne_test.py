@@ -1,17 +1,24 @@
 """ Test cases for TNE code"""
+import gc
 from datetime import datetime , date
 import pandas as pd
 import pytest
 # Import your functions here
-from what_if.tne.schema import Trip
+from what_if.tne.schema import Trip, Validation
+from what_if.tne.scenario import Optimization
 from what_if.tne.tabu_search import tabu_search_optimization
 from what_if.tne.cost_function import (CalculateTripCost,
+                                           calculate_trip_costs,
+                                           candidate_costs,
                                            estimate_flight_cost,
                                            estimate_hotel_cost)
 from what_if.tne.utilities import (generate_neighboring_date,
                                        generate_neighboring_solution,
                                        create_json_response)
 from what_if.tne.genetic_algorithm import TravelOptimizerGA
+from what_if.tne import price_index
+from what_if.tne.price_index import price_indexes, register_price_data
+from what_if.tne.trip_cache import TripCostCache
 
 
 @pytest.fixture
@@ -159,3 +166,267 @@ def test_create_json_response():
   assert response["Optimal_Destination"] == location
   assert response["Overall Cost"] == cost
   assert response["Details"] == details
+
+def test_refresh_reprices_changed_trips(dummy_flight_data,
+                                        dummy_hotel_data):
+  """Only the recommendations using a changed price are repriced, then ranked again"""
+  dataset = pd.merge(dummy_flight_data,dummy_hotel_data,on=["Date","City"])
+  trips = [Trip(origin="Chicago",destination= "Seattle",
+                start_date= "2024-04-03",end_date= "2024-04-04",
+                num_travelers= 1)]
+  cost_list=[estimate_flight_cost,estimate_hotel_cost]
+  optimizer = Optimization(Validation(trips=trips,potential_destinations=["Seattle","NYC"]),
+                           dataset,cost_list)
+  outputs = []
+  for rank, destination in enumerate(["NYC", "Seattle"], start=1):
+    trip = trips[0].copy(update={"destination":destination})
+    details = [CalculateTripCost(trip,dataset,cost_list).calculate_total_cost()]
+    outputs.append(create_json_response("Tabu Search",rank,destination,
+                                        details[0]["Trip Cost"],details))
+  optimizer.candidates = [outputs]
+  new_data = dataset.copy()
+  seattle = (new_data["City"] == "Seattle") & (new_data["Date"] == datetime(2024, 4, 3))
+  new_data.loc[seattle, "Flight Price"] = 100
+
+  results = optimizer.refresh(new_data)
+
+  assert [x["Optimal_Destination"] for x in results] == ["Seattle", "NYC"]
+  assert results[0]["Overall Cost"] == outputs[1]["Overall Cost"] - 450
+  assert results[1] == outputs[0] | {"Recommendations": 2}
+  assert results[0]["Details"][0]["start_date"] == outputs[1]["Details"][0]["start_date"]
+
+def test_refresh_reprices_every_trip_with_custom_costs(dummy_flight_data,
+                                                       dummy_hotel_data):
+  """The records read by a custom cost function are unknown: every recommendation
+  is repriced"""
+  def seattle_fee(trip, data, response):
+    cost = data.loc[(data["City"] == "Seattle") & (data["Date"] == datetime(2024, 4, 2)),
+                    "Flight Price"].min()
+    if response is not None:
+      response["Seattle Fee"] = cost
+    return cost
+
+  dataset = pd.merge(dummy_flight_data,dummy_hotel_data,on=["Date","City"])
+  trips = [Trip(origin="Chicago",destination= "Seattle",
+                start_date= "2024-04-03",end_date= "2024-04-04",
+                num_travelers= 1)]
+  cost_list=[estimate_flight_cost,seattle_fee]
+  optimizer = Optimization(Validation(trips=trips,potential_destinations=["Seattle","NYC"]),
+                           dataset,cost_list)
+  outputs = []
+  for rank, destination in enumerate(["NYC", "Seattle"], start=1):
+    trip = trips[0].copy(update={"destination":destination})
+    details = [CalculateTripCost(trip,dataset,cost_list).calculate_total_cost()]
+    outputs.append(create_json_response("Tabu Search",rank,destination,
+                                        details[0]["Trip Cost"],details))
+  optimizer.candidates = [outputs]
+  new_data = dataset.copy()
+  fee = (new_data["City"] == "Seattle") & (new_data["Date"] == datetime(2024, 4, 2))
+  new_data.loc[fee, "Flight Price"] += 1000
+
+  results = optimizer.refresh(new_data)
+
+  assert [x["Optimal_Destination"] for x in results] == ["NYC", "Seattle"]
+  assert [x["Overall Cost"] for x in results] == [x["Overall Cost"] + 1000 for x in outputs]
+
+def test_flight_index_matches_the_data(dummy_flight_data):
+  """The registered flight index prices every trip like filtering the data"""
+  indexed = dummy_flight_data.copy()
+  register_price_data(indexed)
+  assert price_indexes(indexed).flights is not None
+  for origin in ["Chicago", "Seattle", "NYC", "Denver"]:
+    for destination in ["Seattle", "Chicago", "NYC"]:
+      for start, end in [("2024-04-01", "2024-04-05"), ("2024-04-03", "2024-04-08"),
+                         ("2024-03-30", "2024-04-09")]:
+        trip = Trip(origin=origin,destination=destination,start_date=start,end_date=end,
+                    num_travelers=2)
+        expected, response = {}, {}
+        cost = estimate_flight_cost(trip, indexed, response)
+        assert cost == estimate_flight_cost(trip, dummy_flight_data, expected)
+        assert response == expected
+
+def test_price_index_registration_follows_the_data(dummy_flight_data):
+  """Indexes are dropped with their data frame, and not built for dates with a time"""
+  data = dummy_flight_data.copy()
+  register_price_data(data)
+  key = id(data)
+  del data
+  gc.collect()
+  assert key not in price_index._REGISTRY  # pylint: disable=protected-access
+
+  timed = pd.DataFrame({"Origin": ["Chicago"], "City": ["Seattle"], "Flight Price": [10],
+                        "Date": [datetime(2024, 4, 1, 12)]})
+  assert register_price_data(timed).flights is None
+
+@pytest.mark.parametrize("scale", [1, 1.01])
+def test_hotel_index_matches_the_data(dummy_hotel_data, scale):
+  """The registered hotel index prices every stay like grouping the data by day"""
+  data = dummy_hotel_data.copy()
+  data.loc[::3, "Stars"] = 5
+  data["Night Price($)"] = data["Night Price($)"] * scale
+  indexed = data.copy()
+  assert register_price_data(indexed).hotels is not None
+  for destination in ["Seattle", "NYC", "Denver"]:
+    for stars in [None, 4, 5, 3]:
+      for start, end in [("2024-04-01", "2024-04-05"), ("2024-04-03", "2024-04-04"),
+                         ("2024-03-30", "2024-04-12"), ("2024-04-06", "2024-04-06")]:
+        trip = Trip(origin="Chicago",destination=destination,start_date=start,end_date=end,
+                    num_travelers=2,max_nights=3)
+        expected, response = {}, {}
+        cost = estimate_hotel_cost(trip, indexed, response, stars)
+        assert cost == estimate_hotel_cost(trip, data, expected, stars)
+        assert response == expected
+
+def test_trip_cost_cache_prices_every_trip_once(dummy_flight_data,
+                                                dummy_hotel_data):
+  """Cached trips get the same details, keyed on the fields the cost functions read"""
+  dataset = pd.merge(dummy_flight_data,dummy_hotel_data,on=["Date","City"])
+  cost_list=[estimate_flight_cost,estimate_hotel_cost]
+  cache = TripCostCache(max_entries=2)
+  trip = Trip(origin="Chicago",destination= "Seattle",start_date= "2024-04-03",
+              end_date= "2024-04-05",num_travelers= 1)
+  expected = CalculateTripCost(trip,dataset,cost_list).calculate_total_cost()
+
+  first = CalculateTripCost(trip,dataset,cost_list,cache).calculate_total_cost()
+  timestamped = trip.copy(update={"start_date":pd.Timestamp("2024-04-03"),"airline":"X"})
+  second = CalculateTripCost(timestamped,dataset,cost_list,cache).calculate_total_cost()
+
+  assert first == expected
+  assert second == expected | {"start_date":"2024-04-03 00:00:00","airline":"X"}
+  assert (cache.hits, cache.misses) == (1, 1)
+  for travelers in [2, 3]:
+    CalculateTripCost(trip.copy(update={"num_travelers":travelers}),dataset,cost_list,
+                      cache).calculate_total_cost()
+  assert len(cache) == 2 and cache.misses == 3
+  CalculateTripCost(trip,dataset,cost_list,cache).calculate_total_cost()
+  assert cache.misses == 4, "The least recently used trip was evicted"
+  with pytest.raises(ValueError):
+    TripCostCache(max_entries=0)
+
+def test_algorithms_share_the_trip_cost_cache(dummy_flight_data,
+                                              dummy_hotel_data):
+  """Every algorithm run by Optimization prices its trips through one cache
+  (custom cost functions, which the batch API does not support)"""
+  dataset = pd.merge(dummy_flight_data,dummy_hotel_data,on=["Date","City"])
+  trips = [Trip(origin="Chicago",destination= "Seattle",
+                start_date= "2024-04-03",end_date= "2024-04-04",
+                num_travelers= 1)]
+  hotel = lambda trip, data, response: estimate_hotel_cost(trip, data, response, stars=4)
+  cost_list=[estimate_flight_cost,hotel]
+  optimizer = Optimization(Validation(trips=trips,potential_destinations=["Seattle","NYC"],
+                                      number_days_before_after=1,
+                                      algorithms=["Tabu Search","Annealing",
+                                                  "Genetic Algorithm"]),
+                           dataset,cost_list)
+  optimizer.iterations = 10
+
+  results = optimizer.get_best_recommendations()
+
+  cache = optimizer.trip_cost_cache
+  assert results[0]["Optimal_Destination"] == "NYC"
+  assert cache.misses > 0 and cache.hits > cache.misses
+  assert all(x["Trip Cost Cache"] == cache.report() for x in results)
+
+def test_batch_pricing_goes_through_the_trip_cost_cache(dummy_flight_data,
+                                                        dummy_hotel_data):
+  """Only the trips missing from the cache are priced, once each"""
+  dataset = pd.merge(dummy_flight_data,dummy_hotel_data,on=["Date","City"])
+  cost_list=[estimate_flight_cost,estimate_hotel_cost]
+  trips = [Trip(origin="Chicago",destination=destination,start_date=start,
+                end_date="2024-04-05",num_travelers=1)
+           for destination in ["Seattle","NYC"] for start in ["2024-04-02","2024-04-03"]]
+  candidates = [trips[:2], trips[1:3], trips[2:], trips[:2]]
+  cache = TripCostCache()
+  priced = []
+  original = cache.get_costs
+  cache.get_costs = lambda trips, compute: original(
+    trips, lambda missing: priced.extend(missing) or compute(missing))
+
+  first = candidate_costs(candidates,dataset,cost_list,cache)
+  second = candidate_costs(candidates,dataset,cost_list,cache)
+
+  assert first == second == candidate_costs(candidates,dataset,cost_list)
+  assert priced == trips
+  assert cache.report() == {"hits": 8, "misses": 4, "hit_rate": 8 / 12, "trips": 4}
+
+def test_recommendations_report_the_trip_cost_cache(dummy_flight_data,
+                                                    dummy_hotel_data):
+  """The built-in cost functions are priced in batch, through the shared cache"""
+  dataset = pd.merge(dummy_flight_data,dummy_hotel_data,on=["Date","City"])
+  trips = [Trip(origin="Chicago",destination= "Seattle",
+                start_date= "2024-04-03",end_date= "2024-04-04",
+                num_travelers= 1)]
+  optimizer = Optimization(Validation(trips=trips,potential_destinations=["Seattle","NYC"],
+                                      number_days_before_after=1,
+                                      algorithms=["Tabu Search","Annealing",
+                                                  "Genetic Algorithm"]),
+                           dataset,[estimate_flight_cost,estimate_hotel_cost])
+  optimizer.iterations = 10
+
+  results = optimizer.get_best_recommendations()
+
+  report = results[0]["Trip Cost Cache"]
+  assert report == optimizer.trip_cost_cache.report()
+  assert report["misses"] > 0 and report["hits"] > report["misses"]
+
+@pytest.mark.parametrize("registered", [True, False])
+def test_calculate_trip_costs_matches_each_trip(dummy_flight_data,
+                                                dummy_hotel_data, registered):
+  """The batch API gives every trip the costs of CalculateTripCost"""
+  dataset = pd.merge(dummy_flight_data,dummy_hotel_data,on=["Date","City"])
+  if registered:
+    register_price_data(dataset)
+  trips = [Trip(origin=origin,destination=destination,start_date=start,end_date=end,
+                num_travelers=travelers,max_nights=2)
+           for origin, destination in [("Chicago","Seattle"),("Seattle","Chicago"),
+                                       ("Chicago","NYC"),("NYC","NYC"),("Denver","NYC")]
+           for start, end, travelers in [("2024-04-03","2024-04-05",1),
+                                         ("2024-03-30","2024-04-02",3),
+                                         ("2024-04-08","2024-04-11",2)]]
+  trips[0].start_date = pd.Timestamp("2024-04-03")
+  cost_list=[estimate_flight_cost,estimate_hotel_cost]
+
+  costs = calculate_trip_costs(dataset,[x.origin for x in trips],[x.destination for x in trips],
+                               [x.start_date for x in trips],[x.end_date for x in trips],
+                               [x.num_travelers for x in trips],[x.max_nights for x in trips])
+
+  for k, trip in enumerate(trips):
+    expected = CalculateTripCost(trip,dataset,cost_list).calculate_total_cost()
+    for name in ["Flight Cost","Return Flight Cost","Hotel Cost","Trip Cost"]:
+      assert costs[name][k] == expected[name]
+  with pytest.raises(ValueError):
+    calculate_trip_costs(dataset,["Chicago"],["NYC"],[date(2024,4,3)],[date(2024,4,5)],[1],
+                         cost_list=[lambda trip, data, response: 0])
+
+@pytest.mark.parametrize("registered", [True, False])
+def test_cost_only_mode_matches_the_details(dummy_flight_data,
+                                            dummy_hotel_data, registered):
+  """calculate_cost() returns the Trip Cost of calculate_total_cost(), and the
+  algorithms report the details of the trips they recommend"""
+  dataset = pd.merge(dummy_flight_data,dummy_hotel_data,on=["Date","City"])
+  if registered:
+    register_price_data(dataset)
+  custom = lambda trip, data, response: response.update({"Fee":10}) or 10
+  for cost_list in [[estimate_flight_cost,estimate_hotel_cost],[estimate_hotel_cost,custom]]:
+    for destination in ["Seattle","NYC","Chicago","Denver"]:
+      trip = Trip(origin="Chicago",destination=destination,start_date="2024-04-03",
+                  end_date="2024-04-05",num_travelers=2,max_nights=2)
+      cost = CalculateTripCost(trip,dataset,cost_list,TripCostCache()).calculate_cost()
+      assert cost == CalculateTripCost(trip,dataset,cost_list).calculate_total_cost()["Trip Cost"]
+  assert estimate_hotel_cost(trip,dataset,None) == 15000 * 2 * 2
+
+  trips = [Trip(origin="Chicago",destination= "Seattle",
+                start_date= "2024-04-03",end_date= "2024-04-04",
+                num_travelers= 1)]
+  cost_list=[estimate_flight_cost,estimate_hotel_cost]
+  results = tabu_search_optimization(trips,["Seattle","NYC"],5,20,cost_list,1,dataset)
+  results += TravelOptimizerGA(trips,["Seattle","NYC"],1,cost_list,dataset).evolve()
+  for result in results:
+    for detail in result["Details"]:
+      fields = {name: detail[name] for name in ["origin","destination","num_travelers"]}
+      fields["start_date"] = pd.Timestamp(detail["start_date"]).date()
+      fields["end_date"] = pd.Timestamp(detail["end_date"]).date()
+      expected = CalculateTripCost(Trip(**fields),dataset,cost_list).calculate_total_cost()
+      assert detail == expected | {"start_date":detail["start_date"],
+                                   "end_date":detail["end_date"]}
+    assert result["Overall Cost"] == sum(x["Trip Cost"] for x in result["Details"])
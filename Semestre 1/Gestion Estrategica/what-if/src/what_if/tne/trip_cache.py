@@ -0,0 +1,150 @@
+"""Cache of the trip costs shared by the TNE algorithms.
+
+Tabu Search, Annealing and the Genetic Algorithm keep pricing the same trips:
+the neighbours of a solution are drawn from a handful of date shifts and
+destinations. `Optimization` owns one `TripCostCache` and passes it to every
+algorithm it runs (concurrently), so that `CalculateTripCost` calls the cost
+functions once per distinct trip.
+
+The cache holds the entries the cost functions add to the trip details (and the
+"Trip Cost"), keyed on the trip fields they read, and evicts the least recently
+used trips beyond `max_entries`. The candidates priced in batch by
+`calculate_trip_costs()` (with `estimate_flight_cost` and `estimate_hotel_cost`)
+only need their total: `get_costs()` keeps those apart, with the same keys and
+bound. It is only valid for one data frame and one list of cost functions:
+`Optimization.refresh()` clears it.
+"""
+
+# pylint: disable=bad-indentation
+
+import threading
+from collections import OrderedDict
+from datetime import datetime, time
+
+DEFAULT_MAX_ENTRIES = 100_000
+
+# Fields of `Trip` read by `estimate_flight_cost` and `estimate_hotel_cost`.
+TRIP_FIELDS = ("origin", "destination", "start_date", "end_date", "num_travelers",
+               "max_nights")
+
+
+def key_value(value):
+  """Value of a trip field in a cache key: dates at midnight (`datetime`,
+  `pd.Timestamp`) as dates, so that every algorithm shares the same keys."""
+  if isinstance(value, datetime) and value.tzinfo is None and value.time() == time(0):
+    return value.date()
+  return value
+
+
+class TripCostCache:
+  """Thread-safe LRU cache of the cost entries of trips.
+
+  Attributes:
+    max_entries: int, the number of trips kept.
+    fields: Tuple[str], the trip fields the cost functions read (the key).
+    hits: int, the number of trips found in the cache.
+    misses: int, the number of trips priced.
+  """
+
+  def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, fields=TRIP_FIELDS):
+    """Class initializer.
+
+    Args:
+        max_entries: int, the number of trips kept (at least 1).
+        fields: Tuple[str], the trip fields the cost functions read; custom
+            cost functions reading other fields must list them.
+    """
+    if max_entries < 1:
+      raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+    self.max_entries = max_entries
+    self.fields = tuple(fields)
+    self.hits = 0
+    self.misses = 0
+    self._entries = OrderedDict()
+    self._costs = OrderedDict()  # Totals of the trips priced by `get_costs()`.
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._entries) + len(self._costs)
+
+  def key(self, trip):
+    """The cache key of `trip`, None when a field cannot be hashed (e.g. a list
+    of destinations)."""
+    key = tuple(key_value(getattr(trip, x, None)) for x in self.fields)
+    try:
+      hash(key)
+    except TypeError:
+      return None
+    return key
+
+  def get(self, trip, compute):
+    """The cost entries of `trip`, from the cache or computed by `compute()` (a
+    function returning them as a dictionary) and stored. The dictionary returned
+    is a copy; its values are shared with the cache and must not be changed.
+
+    `compute()` runs without holding the lock: two threads pricing the same new
+    trip both compute it."""
+    key = self.key(trip)
+    if key is not None:
+      with self._lock:
+        entries = self._entries.get(key)
+        if entries is not None:
+          self._entries.move_to_end(key)
+          self.hits += 1
+          return dict(entries)
+    entries = compute()
+    with self._lock:
+      self.misses += 1
+      if key is not None:
+        self._entries[key] = dict(entries)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+          self._entries.popitem(last=False)
+    return entries
+
+  def get_costs(self, trips, compute):
+    """The total cost of every trip of `trips`, from the cache or computed by one
+    `compute(missing)` call (a function returning the costs of a list of trips,
+    in order) and stored. A trip repeated in `trips` is computed once."""
+    keys = [self.key(trip) for trip in trips]
+    costs = [None] * len(trips)
+    missing = {}  # Key (or position, for trips without key) to positions.
+    with self._lock:
+      for position, key in enumerate(keys):
+        if key is not None and key in self._costs:
+          self._costs.move_to_end(key)
+          costs[position] = self._costs[key]
+          self.hits += 1
+        else:
+          missing.setdefault(position if key is None else key, []).append(position)
+    if not missing:
+      return costs
+    computed = compute([trips[positions[0]] for positions in missing.values()])
+    with self._lock:
+      self.misses += len(missing)
+      for (key, positions), cost in zip(missing.items(), computed):
+        for position in positions:
+          costs[position] = cost
+        if keys[positions[0]] is not None:
+          self._costs[key] = cost
+          self._costs.move_to_end(key)
+      while len(self._costs) > self.max_entries:
+        self._costs.popitem(last=False)
+    return costs
+
+  def clear(self):
+    """Drops every trip (after a change of the data), keeping the counts."""
+    with self._lock:
+      self._entries.clear()
+      self._costs.clear()
+
+  def hit_rate(self):
+    """Fraction of the trips found in the cache, 0 before any lookup."""
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
+
+  def report(self) -> dict:
+    """The hit and miss counts, as returned with the recommendations."""
+    with self._lock:
+      return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate(),
+              "trips": len(self)}
@@ -5,6 +5,8 @@ import random
 from copy import deepcopy
 import pandas as pd
 import numpy as np
+from what_if.tne.schema import Trip
+from what_if.tne.cost_function import CalculateTripCost
 
 
 def generate_neighboring_date(travel_date,number_days_before_after,return_flag=False)-> datetime.date:
@@ -101,6 +103,47 @@ def create_json_response(algorithm,rec,location,cost,details) -> dict:
             }
   return output
 
+def trip_uses_rows(detail, rows) -> bool:
+  """
+  Check whether the price records `rows` may be used to price a trip by
+  `estimate_flight_cost` and `estimate_hotel_cost` (the records other cost
+  functions read are unknown).
+
+  Args:
+      detail (dict): trip details, as returned by `CalculateTripCost`
+      rows (pd.DataFrame): price records with 'City' and 'Date' columns
+
+  Returns:
+      bool : True when a record is in the destination during the stay
+              (outbound flight, hotel nights) or in the origin on the return date.
+  """
+  if rows.empty or detail["origin"] == detail["destination"]:
+    return False
+  start_date = pd.Timestamp(detail["start_date"])
+  end_date = pd.Timestamp(detail["end_date"])
+  stay = (rows["City"] == detail["destination"]) & rows["Date"].between(start_date, end_date)
+  back = (rows["City"] == detail["origin"]) & (rows["Date"] == end_date)
+  return bool((stay | back).any())
+
+def reprice_trip(detail, data, cost_list) -> dict:
+  """
+  Price again a trip against new price data.
+
+  Args:
+      detail (dict): trip details, as returned by `CalculateTripCost`
+      data (pd.DataFrame): price data
+      cost_list (list): cost functions of the trip
+
+  Returns:
+      dict : new trip details, keeping the trip fields of `detail`.
+  """
+  fields = {name: detail[name] for name in Trip.__fields__ if name in detail}
+  for name in ("start_date", "end_date"):
+    fields[name] = pd.Timestamp(fields[name]).date()
+  response = CalculateTripCost(Trip(**fields),data,cost_list).calculate_total_cost()
+  response.update((name, detail[name]) for name in Trip.__fields__ if name in detail)
+  return response
+
 def create_detailed_response(resp_list) -> list:
   """to return detailed response in provide api response in excel"""
   resp=[]
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+"""Batch evaluation engine for the general optimization routine.
+
+Instead of merging every scenario against the data frame, the engine resolves
+the records of a whole block of scenarios with a single index lookup and lays them out
+as dense arrays indexed by `(policy record, scenario)`. A cost function declared
+with `what_if.cost_functions.vectorized` then scores the whole block with a few
+NumPy operations.
+
+"""
+
+# pylint: disable=bad-indentation
+
+import time
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from what_if.constraints import scenario_mask
+from what_if.key_index import KeyIndex
+from what_if.scenario_space import ScenarioSpace
+
+DEFAULT_BLOCK_SIZE = 4096
+
+
+def key_columns(df, parameters, policies):
+  """Columns of `df` used to tie a realized scenario to its records. These are
+  the columns the merge in `apply_cost_function()` joins on."""
+  keys = set(parameters).union(*[pol.keys() for pol in policies])
+  return [x for x in df.columns if x in keys]
+
+
+def resolve_positions(df, policies, parameters, scenarios, index=None):
+  """Finds the row of `df` used by every policy record in every scenario.
+
+  The scenarios are resolved on the integer codes of `index` (see
+  `what_if.key_index`): the codes of the parameter values of every scenario are
+  combined with the codes of the policy records, without building frames of
+  labels.
+
+  Args:
+    df: pandas.DataFrame, the (filtered) data.
+    policies: List[dict], the policy records.
+    parameters: List[str], the parameters explored by the scenarios.
+    scenarios: ScenarioSpace or List[dict], mapping every parameter to a value.
+    index: KeyIndex, optional. Index of `df` on its key columns, built when missing.
+
+  Returns:
+    An integer array of shape `(len(policies), len(scenarios))` holding row
+    positions in `df`. Pairs without a matching record are marked with -1.
+  """
+  if index is None:
+    index = KeyIndex(df, key_columns(df, parameters, policies))
+  if isinstance(scenarios, ScenarioSpace):
+    flat = np.asarray(scenarios.indices, dtype=np.int64)
+    grid = {}
+    for parameter, values, size in reversed(list(zip(scenarios.parameters, scenarios.values,
+                                                     scenarios.sizes))):
+      flat, codes = np.divmod(flat, size)
+      grid[parameter] = index.encode(parameter, values)[codes]
+  else:
+    frame = pd.DataFrame(list(scenarios), columns=list(parameters), index=range(len(scenarios)))
+    grid = {x: index.encode(x, frame[x].to_numpy()) for x in parameters}
+
+  # Scenario codes vary along the columns, the codes of the records along the rows.
+  codes = {}
+  for column in index.columns:
+    if column in grid:
+      codes[column] = grid[column][np.newaxis, :]
+    else:
+      codes[column] = index.encode(column, [pol.get(column) for pol in policies])[:, np.newaxis]
+  positions = index.find(codes)
+  return np.array(np.broadcast_to(positions, (len(policies), len(scenarios))))
+
+
+class ScenarioColumns(Mapping):
+  """Read-only mapping of a column name to its values over a block of scenarios.
+
+  Every value is an array of shape `(policy records, scenarios)`. Columns of the
+  data frame are gathered from the resolved rows while the columns that only
+  exist in the policy are broadcast over the scenarios. Arrays are built on
+  first access, so cost functions only pay for the columns they read.
+  """
+
+  def __init__(self, df, policies, positions):
+    self.df = df
+    self.policies = policies
+    self.positions = positions
+    self._columns = list(df.columns) + [
+      x for x in dict.fromkeys(k for pol in policies for k in pol) if x not in df.columns
+    ]
+    self._cache = {}
+
+  def __getitem__(self, column):
+    if column not in self._cache:
+      if column in self.df.columns:
+        self._cache[column] = self.df[column].to_numpy()[self.positions]
+      elif column in self._columns:
+        values = np.array([pol.get(column) for pol in self.policies])
+        self._cache[column] = np.broadcast_to(values[:, np.newaxis], self.positions.shape)
+      else:
+        raise KeyError(column)
+    return self._cache[column]
+
+  def __iter__(self):
+    return iter(self._columns)
+
+  def __len__(self):
+    return len(self._columns)
+
+
+# pylint: disable=too-many-arguments
+def evaluate_block(df, policies, parameters, scenarios, cost_function, index=None,
+                   constraints=(), stats=None, cache=None):
+  """Computes the cost of every scenario of a block.
+
+  Scenarios missing a record for at least one policy record, scenarios breaking
+  one of the `constraints` (see `what_if.constraints`) and scenarios the cost
+  function scores as NaN get an infinite cost, like in the row-wise path. Only
+  the feasible scenarios are passed to the cost function, and only the ones
+  missing from `cache` (a `what_if.cost_cache.CacheScope` of `df`) when given.
+  The outcomes are counted in `stats` (a `what_if.stats.OptimizationStats`) when
+  given.
+
+  Returns:
+    A float array with one cost per scenario.
+  """
+  positions = resolve_positions(df, policies, parameters, scenarios, index)
+  costs = np.full(positions.shape[1], np.inf)
+  complete = (positions >= 0).all(axis=0)
+  if stats is not None:
+    stats.missing_rows += int((~complete).sum())
+  if constraints and complete.any():
+    feasible = scenario_mask(
+      ScenarioColumns(df, policies, positions[:, complete]), constraints, int(complete.sum())
+    )
+    if stats is not None:
+      stats.rejected += int((~feasible).sum())
+    complete[complete] = feasible
+  if complete.any():
+    rows = positions[:, complete]
+    values = np.full(rows.shape[1], np.nan)
+    pending = np.ones(rows.shape[1], dtype=bool)
+    if cache is not None:
+      keys = cache.keys(rows)
+      cached, found = cache.get(keys)
+      values[found] = cached[found]
+      pending = ~found
+      if stats is not None:
+        stats.record_cached(np.where(np.isnan(cached[found]), np.inf, cached[found]))
+        stats.cache_misses += int(pending.sum())
+    if pending.any():
+      start = time.perf_counter()
+      computed = cost_function.evaluate(ScenarioColumns(df, policies, rows[:, pending]))
+      values[pending] = computed
+      if stats is not None:
+        stats.record_cost(time.perf_counter() - start,
+                          np.where(np.isnan(computed), np.inf, computed))
+      if cache is not None:
+        cache.put([key for key, x in zip(keys, pending) if x], computed)
+    costs[complete] = np.where(np.isnan(values), np.inf, values)
+  return costs
+
+
+def push_block(keep, costs, indices):
+  """Adds the relevant costs of a block to a `KeepN` structure.
+
+  Items are `(scenario index, cost)` tuples, `indices` holding the index of every
+  scenario of the block. Only the first occurrence of the `keep.n` lowest
+  distinct costs below `keep.threshold` can ever be kept (the `keep.n` first
+  items in order of cost when `keep.keep_ties` is set), so only those are
+  added, in enumeration order, which leaves `keep` in the same state as adding
+  every scenario one by one. When `keep` ranks ties with an `order`, the first
+  occurrences are those of that order, and costs equal to the threshold can
+  still be kept.
+  """
+  if keep.order is None:
+    candidates = np.flatnonzero(costs < keep.threshold)
+  else:
+    candidates = np.flatnonzero((costs <= keep.threshold) & (costs < np.inf))
+    ranks = [keep.order((int(indices[i]), float(costs[i]))) for i in candidates]
+    candidates = candidates[np.argsort(ranks, kind="stable")]
+  if candidates.size == 0:
+    return
+  if keep.keep_ties:
+    first = np.argsort(costs[candidates], kind="stable")
+  else:
+    _, first = np.unique(costs[candidates], return_index=True)
+  for i in np.sort(candidates[first[:keep.n]]):
+    keep.add_item((int(indices[i]), float(costs[i])))
+
+
+def optimize_in_blocks(df, policies, parameters, scenarios, cost_function, keep,
+                       block_size=DEFAULT_BLOCK_SIZE, index=None, constraints=(), stats=None,
+                       progress=None, cache=None):
+  """Evaluates `scenarios` block by block and accumulates the best ones in `keep`.
+  `progress` (a `what_if.stats.Progress`) is updated after every block; costs are
+  looked up in `cache` (see `evaluate_block()`) when given.
+
+  The items kept are `(scenario index, cost)` tuples. For a `ScenarioSpace`, the
+  index is the number of the scenario in the full product (see
+  `ScenarioSpace.scenario()`), otherwise it is the position in `scenarios`."""
+  if block_size <= 0:
+    raise ValueError("The block size should be a positive integer.")
+  if index is None:
+    index = KeyIndex(df, key_columns(df, parameters, policies))
+  for start in range(0, len(scenarios), block_size):
+    block = scenarios[start:start + block_size]
+    if isinstance(block, ScenarioSpace):
+      indices = np.asarray(block.indices)
+    else:
+      indices = np.arange(start, start + len(block))
+    push_block(keep, evaluate_block(df, policies, parameters, block, cost_function, index,
+                                    constraints, stats, cache), indices)
+    if progress is not None:
+      progress.update(len(block))